@@ -0,0 +1,345 @@
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+from collections import deque
+from datetime import date
+
+
+class Account:
+    """
+    功能描述: 一个签到账号及其选项
+    参数:
+        username: M-SEC 用户名
+        password: M-SEC 密码
+        enabled: 是否启用，False 时跳过
+        solver: 该账号使用的验证码识别后端，为空时使用 [CAPTCHA] 段的配置
+        priority: 优先级，数值越大越先执行（只有 sqlite 来源会按它排序）
+        cursor: 读完这个账号后数据源的位置，从这里继续可以跳过它及之前的账号
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        account = Account("user123", "password")
+    """
+
+    __slots__ = ("username", "password", "enabled", "solver", "priority", "cursor")
+
+    def __init__(self, username, password, enabled=True, solver=None, priority=0, cursor=None):
+        self.username = username
+        self.password = password
+        self.enabled = enabled
+        self.solver = solver or None
+        self.priority = priority
+        self.cursor = cursor
+
+
+def _parse_bool(value, default=True):
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ("0", "false", "no", "off", "n")
+
+
+def _parse_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _account_from_mapping(row, cursor):
+    return Account(
+        str(row.get("username", "")).strip(),
+        str(row.get("password", "")).strip(),
+        enabled=_parse_bool(row.get("enabled")),
+        solver=(row.get("solver") or "").strip() or None,
+        priority=_parse_int(row.get("priority")),
+        cursor=cursor,
+    )
+
+
+class AccountSource:
+    """
+    功能描述: 账号来源接口，按需逐个产出账号，内存占用与账号总数无关
+    参数: 无
+    返回值: 无
+    异常描述: 数据源格式错误时抛出 ValueError
+    调用演示:
+        for account in source.iter_from(cursor):
+            ...
+    """
+
+    name = "base"
+
+    def iter_from(self, cursor=None):
+        """从 cursor 之后开始产出账号，cursor 为空时从头开始"""
+        raise NotImplementedError
+
+    def __iter__(self):
+        return self.iter_from(None)
+
+
+class ConfigAccountSource(AccountSource):
+    """
+    功能描述: config.ini [EZ_WEB] 段中逗号分隔的 usernames / passwords
+    参数:
+        usernames: 逗号分隔的用户名
+        passwords: 逗号分隔的密码，数量必须与用户名一致
+    返回值: 无
+    异常描述: 用户名和密码数量不一致时抛出 ValueError
+    调用演示:
+        source = ConfigAccountSource(config.get('EZ_WEB', 'usernames'), config.get('EZ_WEB', 'passwords'))
+    """
+
+    name = "config"
+
+    def __init__(self, usernames, passwords):
+        self.usernames = usernames.split(',')
+        self.passwords = passwords.split(',')
+        if len(self.usernames) != len(self.passwords):
+            raise ValueError("用户名和密码数量不匹配，请检查配置文件。")
+
+    def iter_from(self, cursor=None):
+        start = int(cursor) if cursor else 0
+        for index in range(start, len(self.usernames)):
+            yield Account(self.usernames[index].strip(), self.passwords[index].strip(), cursor=str(index + 1))
+
+
+class _LineFileSource(AccountSource):
+    """按行读取的文件来源，游标是下一行的字节偏移量，续跑时直接 seek 过去"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _parse_line(self, line):
+        raise NotImplementedError
+
+    def _lines(self, cursor):
+        with open(self.path, 'rb') as f:
+            if cursor:
+                f.seek(int(cursor))
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                yield line.decode('utf-8-sig').strip(), str(f.tell())
+
+    def iter_from(self, cursor=None):
+        for line, position in self._lines(cursor):
+            if not line or line.startswith('#'):
+                continue
+            row = self._parse_line(line)
+            if row is None:
+                continue
+            account = _account_from_mapping(row, position)
+            if account.username:
+                yield account
+
+
+class CsvAccountSource(_LineFileSource):
+    """
+    功能描述: CSV 文件来源，第一行为表头：username,password[,enabled,solver,priority]
+              每个账号占一行（不支持字段内换行）
+    参数:
+        path: CSV 文件路径
+    返回值: 无
+    异常描述: 缺少 username / password 列时抛出 ValueError
+    调用演示:
+        source = CsvAccountSource("config/accounts.csv")
+    """
+
+    name = "csv"
+
+    def __init__(self, path):
+        super().__init__(path)
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            self.header = [column.strip().lower() for column in next(csv.reader([f.readline()]), [])]
+        if "username" not in self.header or "password" not in self.header:
+            raise ValueError(f"CSV 文件缺少 username / password 表头: {path}")
+
+    def _lines(self, cursor):
+        lines = super()._lines(cursor)
+        if not cursor:
+            next(lines, None)  # 跳过表头
+        return lines
+
+    def _parse_line(self, line):
+        values = next(csv.reader([line]), [])
+        return dict(zip(self.header, values))
+
+
+class JsonlAccountSource(_LineFileSource):
+    """
+    功能描述: JSONL 文件来源，每行一个账号：{"username": ..., "password": ..., "enabled": true, "solver": "local", "priority": 0}
+    参数:
+        path: JSONL 文件路径
+    返回值: 无
+    异常描述: 某行不是合法 JSON 时抛出 ValueError
+    调用演示:
+        source = JsonlAccountSource("config/accounts.jsonl")
+    """
+
+    name = "jsonl"
+
+    def _parse_line(self, line):
+        return json.loads(line)
+
+
+class SqliteAccountSource(AccountSource):
+    """
+    功能描述: SQLite 数据库来源，按 priority 从高到低、rowid 从小到大分批读取
+              表结构: accounts(username TEXT, password TEXT, enabled INTEGER, solver TEXT, priority INTEGER)
+              游标为 "priority:rowid"，续跑时用键集分页定位，不需要重新扫描已完成的账号
+    参数:
+        path: 数据库文件路径
+        table: 表名
+        batch_size: 每次从数据库取出的行数
+    返回值: 无
+    异常描述: 表不存在时抛出 sqlite3.OperationalError
+    调用演示:
+        source = SqliteAccountSource("data_/accounts.sqlite3")
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, table="accounts", batch_size=500):
+        self.path = path
+        self.table = table
+        self.batch_size = batch_size
+
+    def iter_from(self, cursor=None):
+        connection = sqlite3.connect(self.path)
+        try:
+            sql = (f"SELECT rowid, username, password, enabled, solver, priority FROM {self.table} "
+                   "WHERE COALESCE(enabled, 1) != 0")
+            params = ()
+            if cursor:
+                priority, rowid = (int(part) for part in cursor.split(':'))
+                sql += " AND (COALESCE(priority, 0) < ? OR (COALESCE(priority, 0) = ? AND rowid > ?))"
+                params = (priority, priority, rowid)
+            sql += " ORDER BY COALESCE(priority, 0) DESC, rowid"
+            rows = connection.execute(sql, params)
+            while True:
+                batch = rows.fetchmany(self.batch_size)
+                if not batch:
+                    break
+                for rowid, username, password, enabled, solver, priority in batch:
+                    priority = priority or 0
+                    yield Account(str(username).strip(), str(password or "").strip(), _parse_bool(enabled),
+                                  solver, priority, f"{priority}:{rowid}")
+        finally:
+            connection.close()
+
+
+def open_account_source(config):
+    """
+    功能描述: 根据 config.ini 的 [ACCOUNTS] 段创建账号来源，缺省使用 [EZ_WEB] 段的 usernames / passwords
+    参数:
+        config: 已读取配置文件的 ConfigParser
+    返回值: AccountSource 实例
+    异常描述: source 配置错误或数据源格式错误时抛出 ValueError
+    调用演示:
+        source = open_account_source(config)
+    """
+    kind = config.get('ACCOUNTS', 'source', fallback='config').strip().lower()
+    path = config.get('ACCOUNTS', 'path', fallback='').strip()
+    if kind == 'config':
+        return ConfigAccountSource(config.get('EZ_WEB', 'usernames'), config.get('EZ_WEB', 'passwords'))
+    if not path:
+        raise ValueError(f"账号来源 {kind} 需要配置 [ACCOUNTS] path")
+    if kind == 'csv':
+        return CsvAccountSource(path)
+    if kind == 'jsonl':
+        return JsonlAccountSource(path)
+    if kind == 'sqlite':
+        return SqliteAccountSource(path, config.get('ACCOUNTS', 'table', fallback='accounts'))
+    raise ValueError(f"未知的账号来源: {kind}")
+
+
+class ProgressCursor:
+    """
+    功能描述: 记录当天已连续完成到数据源的哪个位置，进程中断后从这里继续读取账号
+              账号并发执行、完成顺序不固定，只有前面的账号都完成后游标才会前进；
+              签到失败的账号挡住游标，游标停在它之前，续跑时重新读取它；此后读取的账号不再记录，内存占用不随账号数增长
+    参数:
+        path: 游标文件路径
+        source_name: 数据源名称，换了数据源时不续用旧游标
+        save_every: 游标每前进多少个账号写一次文件
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        progress = ProgressCursor("data_/account_cursor.json", source.name)
+        for account in source.iter_from(progress.position):
+            progress.started(account)
+            ...
+            progress.finished(account, done=True)
+        progress.close(completed=True)
+    """
+
+    def __init__(self, path, source_name, save_every=50):
+        self.path = path
+        self.source_name = source_name
+        self.save_every = save_every
+        self.position = None
+        self._pending = deque()  # 已开始、按读取顺序排列的 [账号, 是否完成]
+        self._entries = {}
+        self._unsaved = 0
+        self._blocked = False  # 已有账号签到失败，本次运行中游标不会越过它
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get("date") == date.today().isoformat() and saved.get("source") == source_name:
+                self.position = saved.get("cursor")
+        except (OSError, ValueError):
+            pass
+
+    def started(self, account):
+        if self._blocked:
+            return
+        entry = [account, False]
+        self._pending.append(entry)
+        self._entries[id(account)] = entry
+
+    def finished(self, account, done):
+        """账号结束，done 为 False（签到失败）时不算完成，游标不越过这个账号"""
+        entry = self._entries.pop(id(account), None)
+        if entry is None:
+            return
+        if not done:
+            # 游标最多前进到这个账号之前，之后读取的账号不再需要记录
+            self._blocked = True
+            while self._pending:
+                dropped = self._pending.pop()
+                self._entries.pop(id(dropped[0]), None)
+                if dropped is entry:
+                    break
+            return
+        entry[1] = True
+        while self._pending and self._pending[0][1]:
+            self.position = self._pending.popleft()[0].cursor
+            self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        if not self._unsaved:
+            return
+        self._unsaved = 0
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".cursor.", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"date": date.today().isoformat(), "source": self.source_name, "cursor": self.position}, f)
+        os.replace(tmp_path, self.path)
+
+    def close(self, completed):
+        """任务结束：全部完成时删除游标文件，否则保存当前位置供下次续跑"""
+        if completed and not self._pending and not self._blocked:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        else:
+            self.save()
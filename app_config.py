@@ -0,0 +1,275 @@
+import configparser
+import os
+import threading
+import time
+
+from dark_log import DarkLog
+
+CONFIG_PATH = "config/config.ini"
+
+# 两次检查配置文件是否修改的最短间隔（秒），通知等频繁读取配置的地方只取缓存
+CHECK_INTERVAL = 1.0
+
+# 需要类型转换的配置项：段 -> {字段: 类型}，其余字段按字符串处理
+SCHEMA = {
+    "EMAIL": {"smtp_port": int, "smtp_ssl": bool, "smtp_max_connections": int, "smtp_check_after": float,
+              "smtp_idle_timeout": float, "smtp_max_messages": int},
+    "NOTIFY": {"alert_failures": int, "dingding_max_bytes": int, "dingding_interval": float, "timeout": float,
+               "workers": int, "max_pending": int, "max_attempts": int, "retry_base_delay": float,
+               "retry_max_delay": float, "email_max_rows": int},
+    "REPORT": {"enabled": bool, "compress_over_kb": float, "max_attachment_mb": float, "keep_days": int},
+    "POINTS": {"enabled": bool, "batch_size": int},
+    "ACCOUNTS": {"resume": bool},
+    "ENGINE": {"workers": int, "concurrency": int, "host_rate_limit": float},
+    "HTTP": {"pool_connections": int, "pool_maxsize": int, "connect_timeout": float, "read_timeout": float},
+    "TOKEN_CACHE": {"enabled": bool, "ttl_hours": float},
+    "CAPTCHA": {"prefetch": int, "solver_workers": int, "ttl": float, "min_confidence": float},
+    "RETRY": {"max_attempts": int, "base_delay": float, "max_delay": float, "jitter": float,
+              "captcha_budget": int, "solve_budget": int, "login_budget": int, "check_in_budget": int,
+              "job_deadline": float},
+    "CHECKPOINT": {"enabled": bool, "fsync_every": int, "fsync_interval": float, "keep_days": int},
+    "LOG": {"file_diagnose": bool, "file_backtrace": bool, "console_diagnose": bool, "console_backtrace": bool,
+            "json_enabled": bool, "json_flush_interval": float, "json_buffer_size": int, "json_traceback": bool,
+            "max_size_mb": float, "retention_days": int, "retention_count": int},
+    "METRICS": {"enabled": bool, "http_port": int},
+}
+
+# 取值有限的配置项：(段, 字段) -> 允许的值
+CHOICES = {
+    ("NOTIFY", "mode"): ("digest", "account"),
+    ("REPORT", "format"): ("csv", "xlsx"),
+    ("ACCOUNTS", "source"): ("config", "csv", "jsonl", "sqlite"),
+    ("CAPTCHA", "backend"): ("jfbym", "local", "auto"),
+    ("LOG", "compression"): ("", "gz", "zst"),
+}
+
+TYPE_NAMES = {int: "整数", float: "数字", bool: "布尔值（true / false）"}
+
+# 至少为1的配置项，其余数值配置项不能为负数
+POSITIVE = {("ENGINE", "workers"), ("ENGINE", "concurrency"), ("RETRY", "max_attempts"),
+            ("NOTIFY", "dingding_max_bytes"), ("NOTIFY", "workers"), ("NOTIFY", "max_pending"),
+            ("NOTIFY", "max_attempts"), ("EMAIL", "smtp_max_connections"), ("EMAIL", "smtp_max_messages"),
+            ("POINTS", "batch_size")}
+
+
+class ConfigError(ValueError):
+    """配置文件无法读取，或配置项的类型、取值不正确"""
+
+
+class DingdingSettings:
+    """钉钉机器人配置，三项都填写后才发送通知"""
+
+    __slots__ = ("secret", "access_token", "userid", "base_url")
+
+    def __init__(self, secret, access_token, userid, base_url):
+        self.secret = secret
+        self.access_token = access_token
+        self.userid = userid
+        self.base_url = base_url
+
+    @property
+    def enabled(self):
+        return bool(self.secret and self.access_token and self.userid)
+
+
+class EmailSettings:
+    """邮件通知配置，发件人、授权码和收件人都填写后才发送通知"""
+
+    __slots__ = ("sender", "password", "receivers", "smtp_host", "smtp_port", "smtp_ssl")
+
+    def __init__(self, sender, password, receivers, smtp_host, smtp_port, smtp_ssl):
+        self.sender = sender
+        self.password = password
+        self.receivers = receivers
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.smtp_ssl = smtp_ssl
+
+    @property
+    def enabled(self):
+        return bool(self.sender and self.password and self.receivers)
+
+
+class AppConfig:
+    """
+    功能描述: 解析一次后的配置，按 SCHEMA 转换好类型，按 (段, 字段) 和字段名建立索引；
+              parser 保留原始的 ConfigParser，供各模块的 from_config 使用
+    参数:
+        parser: 已读取配置文件的 ConfigParser
+        path: 配置文件路径
+        stamp: 读取时配置文件的 (修改时间, 大小)，用于判断是否需要重新读取
+    返回值: 无
+    异常描述: 配置项的类型或取值不正确时抛出 ConfigError，列出所有有问题的配置项
+    调用演示:
+        config = load_config()
+        workers = config.value('ENGINE', 'workers', fallback=1)
+        http = HttpPool.from_config(config.parser)
+    """
+
+    def __init__(self, parser, path=CONFIG_PATH, stamp=None):
+        self.parser = parser
+        self.path = path
+        self.stamp = stamp
+        self._values = {}  # (段, 字段) -> 转换类型后的值
+        self._options = {}  # 字段 -> 值，字段名在多个段中重复时以第一个段为准
+        errors = []
+        for section in parser.sections():
+            types = SCHEMA.get(section, {})
+            for option in parser.options(section):
+                raw = parser.get(section, option, raw=True)
+                try:
+                    value = self._convert(raw, types.get(option, str))
+                except ValueError:
+                    errors.append(f"[{section}] {option} = {raw!r} 不是有效的{TYPE_NAMES[types[option]]}")
+                    continue
+                self._values[(section, option)] = value
+                self._options.setdefault(option, value)
+        errors += self._check_values()
+        if errors:
+            raise ConfigError(f"{path} 配置错误: " + "；".join(errors))
+
+        self.dingding = DingdingSettings(
+            self.value('dingding', 'dingding_secret', fallback=''),
+            self.value('dingding', 'dingding_access_token', fallback=''),
+            self.value('dingding', 'dingding_userid', fallback=''),
+            (self.value('dingding', 'dingding_base_url', fallback='') or "https://oapi.dingtalk.com").rstrip("/"),
+        )
+        receivers = self.value('EMAIL', 'receiver_email', fallback='')
+        self.email = EmailSettings(
+            self.value('EMAIL', 'email_sender', fallback=''),
+            self.value('EMAIL', 'email_pass', fallback=''),
+            [email.strip() for email in receivers.split(",") if email.strip()],
+            self.value('EMAIL', 'smtp_host', fallback='') or "smtp.163.com",
+            self.value('EMAIL', 'smtp_port', fallback=465),
+            self.value('EMAIL', 'smtp_ssl', fallback=True),
+        )
+
+    @staticmethod
+    def _convert(raw, kind):
+        if kind is bool:
+            if raw.strip().lower() not in configparser.ConfigParser.BOOLEAN_STATES:
+                raise ValueError(raw)
+            return configparser.ConfigParser.BOOLEAN_STATES[raw.strip().lower()]
+        if kind is str:
+            return raw
+        return kind(raw.strip())
+
+    def _check_values(self):
+        errors = []
+        for (section, option), choices in CHOICES.items():
+            value = self._values.get((section, option))
+            if value is not None and value.strip().lower() not in choices:
+                errors.append(f"[{section}] {option} = {value!r} 应为 {' / '.join(c or '空' for c in choices)} 之一")
+        for (section, option), value in self._values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if (section, option) in POSITIVE and value < 1:
+                errors.append(f"[{section}] {option} = {value} 应不小于1")
+            elif value < 0:
+                errors.append(f"[{section}] {option} = {value} 不能为负数")
+        return errors
+
+    def value(self, section, option, fallback=None):
+        """按 (段, 字段) 取转换类型后的值，没有配置时返回 fallback"""
+        return self._values.get((section, self.parser.optionxform(option)), fallback)
+
+    def option(self, name, fallback=None):
+        """不区分段，按字段名取值（兼容 Dingdingmail.get_config 的用法）"""
+        return self._options.get(self.parser.optionxform(name), fallback)
+
+    def warnings(self):
+        """
+        功能描述: 检查不影响启动、但会导致部分功能不可用的配置，用于启动时提示
+        参数: 无
+        返回值: 提示信息列表
+        异常描述: 无
+        调用演示:
+            for message in load_config().warnings():
+                logger.warning(message)
+        """
+        messages = []
+        backend = self.value('CAPTCHA', 'backend', fallback='jfbym').strip().lower()
+        token = self.value('jfbym', 'Token', fallback='').strip()
+        if backend != 'local' and (not token or token.startswith('#')):
+            messages.append("[jfbym] Token 未填写，云码平台验证码识别将失败")
+        dingding = (self.dingding.secret, self.dingding.access_token, self.dingding.userid)
+        if any(dingding) and not all(dingding):
+            messages.append("[dingding] 配置不完整，将跳过钉钉通知")
+        email = (self.email.sender, self.email.password, self.email.receivers)
+        if any(email) and not all(email):
+            messages.append("[EMAIL] 配置不完整，将跳过邮件通知")
+        if self.value('REPORT', 'format', fallback='csv').strip().lower() == 'xlsx' and not _has_openpyxl():
+            messages.append("[REPORT] format = xlsx 需要安装 openpyxl，将改为生成 csv")
+        if (self.value('HTTP', 'pool_maxsize', fallback=10) < self.value('ENGINE', 'concurrency', fallback=1)):
+            messages.append("[HTTP] pool_maxsize 小于 [ENGINE] concurrency，并发请求会等待空闲连接")
+        return messages
+
+
+def _has_openpyxl():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+_cache = {}  # 配置文件路径 -> [AppConfig, 上次检查修改的时间]
+_cache_lock = threading.Lock()
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _parse(path, stamp):
+    parser = configparser.ConfigParser()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            parser.read_file(f, path)
+    except (OSError, configparser.Error, UnicodeDecodeError) as e:
+        raise ConfigError(f"读取配置文件 {path} 失败: {e}") from e
+    return AppConfig(parser, path, stamp)
+
+
+def load_config(path=CONFIG_PATH):
+    """
+    功能描述: 返回解析好的配置，同一个文件只解析一次；配置文件修改后（按修改时间和大小判断，
+              每 CHECK_INTERVAL 秒最多检查一次）自动重新读取，定时任务无需重启即可使用新配置。
+              重新读取失败时记录错误并继续使用修改前的配置，避免编辑到一半的文件中断定时任务
+    参数:
+        path: 配置文件路径
+    返回值: AppConfig 实例
+    异常描述: 第一次读取失败或配置错误时抛出 ConfigError
+    调用演示:
+        config = load_config()
+        token = config.value('jfbym', 'Token')
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None and now - entry[1] < CHECK_INTERVAL:
+            return entry[0]
+        try:
+            stamp = _stamp(path)
+        except OSError as e:
+            if entry is None:
+                raise ConfigError(f"读取配置文件 {path} 失败: {e}") from e
+            stamp = entry[0].stamp
+        if entry is not None and stamp == entry[0].stamp:
+            entry[1] = now
+            return entry[0]
+        try:
+            config = _parse(path, stamp)
+        except ConfigError as e:
+            if entry is None:
+                raise
+            DarkLog('app_config').error(f"配置文件修改后读取失败，继续使用修改前的配置: {e}")
+            # 同一个错误的文件不重复解析，直到再次修改
+            entry[0].stamp = stamp
+            entry[1] = now
+            return entry[0]
+        if entry is not None:
+            DarkLog('app_config').info(f"配置文件已修改，重新读取: {path}")
+        _cache[path] = [config, now]
+        return config
@@ -0,0 +1,116 @@
+import argparse
+import configparser
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from captcha_solver import build_solver, load_corpus
+from http_pool import HttpPool
+
+
+def percentile(sorted_values, pct):
+    """最近秩法百分位数，sorted_values 需已升序排列"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _solve_one(solver, captcha_base64, answer):
+    started = time.perf_counter()
+    try:
+        result = solver.solve(captcha_base64)
+        elapsed = time.perf_counter() - started
+        return elapsed, result.answer == answer, result.backend, None
+    except Exception as e:
+        return time.perf_counter() - started, False, None, e
+
+
+def run_level(solver, samples, concurrency):
+    """
+    功能描述: 以指定并发数把全部样本交给识别后端，统计延迟、吞吐量和准确率
+    参数:
+        solver: CaptchaSolver 实例
+        samples: [(captcha_base64, answer)] 样本列表
+        concurrency: 并发数
+    返回值: 统计结果字典
+    异常描述: 单个样本的识别异常计入 errors，不中断测试
+    调用演示:
+        stats = run_level(solver, samples, 4)
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lambda sample: _solve_one(solver, *sample), samples))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(outcome[0] for outcome in outcomes)
+    backends = {}
+    for _, _, backend, _ in outcomes:
+        if backend:
+            backends[backend] = backends.get(backend, 0) + 1
+    return {
+        "concurrency": concurrency,
+        "samples": len(outcomes),
+        "correct": sum(1 for outcome in outcomes if outcome[1]),
+        "errors": sum(1 for outcome in outcomes if outcome[3] is not None),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "throughput": len(outcomes) / wall if wall > 0 else 0.0,
+        "backends": backends,
+    }
+
+
+def format_report(backend, results):
+    lines = [
+        f"识别后端: {backend}",
+        f"{'并发':>4} {'样本':>6} {'准确率':>8} {'错误':>5} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'吞吐(个/s)':>11}  实际后端",
+    ]
+    for stats in results:
+        accuracy = stats["correct"] / stats["samples"] * 100 if stats["samples"] else 0.0
+        backends = ", ".join(f"{name}={count}" for name, count in sorted(stats["backends"].items()))
+        lines.append(
+            f"{stats['concurrency']:>4} {stats['samples']:>6} {accuracy:>7.1f}% {stats['errors']:>5} "
+            f"{stats['p50'] * 1000:>9.2f} {stats['p95'] * 1000:>9.2f} {stats['p99'] * 1000:>9.2f} "
+            f"{stats['throughput']:>11.1f}  {backends}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="验证码识别后端的延迟、吞吐量和准确率测试")
+    parser.add_argument("corpus", help="JSONL 样本文件，每行 {\"image\": ..., \"answer\": ...}，image 与 get_captcha 返回格式相同")
+    parser.add_argument("--backend", help="jfbym / local / auto，缺省使用 config.ini 中 [CAPTCHA] backend")
+    parser.add_argument("--concurrency", default="1,4,16", help="逗号分隔的并发数列表，默认 1,4,16")
+    parser.add_argument("--limit", type=int, default=0, help="最多使用的样本数，0表示全部")
+    parser.add_argument("--warmup", type=int, default=5, help="正式测试前的预热识别次数")
+    parser.add_argument("--config", default="config/config.ini", help="配置文件路径")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    if not config.has_section('CAPTCHA'):
+        config.add_section('CAPTCHA')
+    if args.backend:
+        config.set('CAPTCHA', 'backend', args.backend)
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    samples = []
+    for sample in load_corpus(args.corpus):
+        samples.append(sample)
+        if args.limit and len(samples) >= args.limit:
+            break
+    if not samples:
+        raise SystemExit(f"样本文件为空: {args.corpus}")
+
+    http = HttpPool(pool_connections=2, pool_maxsize=max(levels),
+                    connect_timeout=config.getfloat('HTTP', 'connect_timeout', fallback=5.0),
+                    read_timeout=config.getfloat('HTTP', 'read_timeout', fallback=15.0))
+    solver = build_solver(config, http, config.get('jfbym', 'Token', fallback=''))
+    for captcha_base64, answer in samples[:args.warmup]:
+        _solve_one(solver, captcha_base64, answer)
+
+    try:
+        results = [run_level(solver, samples, level) for level in levels]
+    finally:
+        http.close()
+    print(format_report(config.get('CAPTCHA', 'backend', fallback='jfbym'), results))
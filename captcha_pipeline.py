@@ -0,0 +1,114 @@
+import asyncio
+import time
+from collections import deque
+
+
+class SolvedCaptcha:
+    """已识别的验证码：验证码ID、识别结果和识别完成的时间"""
+
+    __slots__ = ("captcha_id", "answer", "solved_at")
+
+    def __init__(self, captcha_id, answer, solved_at=None):
+        self.captcha_id = captcha_id
+        self.answer = answer
+        self.solved_at = time.monotonic() if solved_at is None else solved_at
+
+    def age(self):
+        return time.monotonic() - self.solved_at
+
+
+class CaptchaPipeline:
+    """
+    功能描述: 验证码预取流水线，提前为后续账号获取并识别验证码
+              同时识别的数量受 workers 限制，超过 ttl 秒未使用的结果会被丢弃
+    参数:
+        workers: 同时进行 获取+识别 的最大数量
+        ttl: 识别结果的有效期（秒），验证码在服务端过期后登录必然失败
+        lookahead: 提前预取的账号数，0表示不预取
+    返回值: 无
+    异常描述: 预取过程中的异常只记录为失败，不会影响账号本身的签到流程
+    调用演示:
+        pipeline = CaptchaPipeline(workers=4, ttl=60, lookahead=8)
+        pending = pipeline.prefetch(fetch, solve)   # 需在事件循环中调用
+        solved = await pipeline.take(pending)       # 过期或失败时返回None
+    """
+
+    def __init__(self, workers=4, ttl=60.0, lookahead=8):
+        self.workers = max(1, workers)
+        self.ttl = ttl
+        self.lookahead = max(0, lookahead)
+        self._semaphore = None
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        功能描述: 根据 config.ini 的 [CAPTCHA] 段创建流水线
+        参数:
+            config: 已读取配置文件的 ConfigParser
+        返回值: CaptchaPipeline 实例
+        异常描述: 配置值不是数字时抛出 ValueError
+        调用演示:
+            pipeline = CaptchaPipeline.from_config(config)
+        """
+        return cls(
+            workers=config.getint('CAPTCHA', 'solver_workers', fallback=4),
+            ttl=config.getfloat('CAPTCHA', 'ttl', fallback=60),
+            lookahead=config.getint('CAPTCHA', 'prefetch', fallback=8),
+        )
+
+    async def _fetch_and_solve(self, fetch, solve):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        async with self._semaphore:
+            captcha_id, captcha_base64 = await fetch()
+            if not (captcha_id and captcha_base64):
+                return None
+            answer = await solve(captcha_base64)
+            if not answer:
+                return None
+            return SolvedCaptcha(captcha_id, answer)
+
+    def prefetch(self, fetch, solve):
+        """
+        功能描述: 在后台开始获取并识别一个验证码
+        参数:
+            fetch: 协程函数，返回 (captcha_id, captcha_base64)
+            solve: 协程函数，参数为 captcha_base64，返回识别结果
+        返回值: asyncio.Task，交给 take() 取结果
+        异常描述: 无
+        调用演示:
+            pending = pipeline.prefetch(fetch, solve)
+        """
+        return asyncio.ensure_future(self._fetch_and_solve(fetch, solve))
+
+    async def take(self, pending):
+        """等待预取结果，失败或超过 ttl 时返回None"""
+        try:
+            solved = await pending
+        except Exception:
+            return None
+        if solved is None or solved.age() > self.ttl:
+            return None
+        return solved
+
+    def iterate(self, tasks, start):
+        """
+        功能描述: 包装账号任务迭代器，始终为后面 lookahead 个账号提前启动预取，内存占用只与 lookahead 有关
+        参数:
+            tasks: 账号任务迭代器
+            start: 对每个需要预取的任务调用的函数，返回False表示该任务不需要预取
+        返回值: 生成器，按原顺序产出任务
+        异常描述: 无
+        调用演示:
+            for task in pipeline.iterate(tasks, lambda task: task.start_prefetch(pipeline)):
+                ...
+        """
+        buffer = deque()
+        for task in tasks:
+            if self.lookahead:
+                start(task)
+            buffer.append(task)
+            if len(buffer) > self.lookahead:
+                yield buffer.popleft()
+        while buffer:
+            yield buffer.popleft()
@@ -0,0 +1,333 @@
+import argparse
+import base64
+import binascii
+import io
+import json
+import os
+import time
+
+try:
+    import numpy as np
+except ImportError:  # 本地识别是可选功能，只有用到时才需要 numpy / Pillow
+    np = None
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from dark_log import DarkLog
+from metrics import metrics
+
+
+class CaptchaSolveError(Exception):
+    """验证码识别失败（平台返回错误、图片无法切分等），不包括网络请求异常；backend 为识别失败的后端名称"""
+
+    def __init__(self, message, backend=None):
+        super().__init__(message)
+        self.backend = backend
+
+
+class SolveResult:
+    """验证码识别结果：答案、置信度（0~1）和识别后端名称"""
+
+    __slots__ = ("answer", "confidence", "backend")
+
+    def __init__(self, answer, confidence, backend):
+        self.answer = answer
+        self.confidence = confidence
+        self.backend = backend
+
+
+class CaptchaSolver:
+    """
+    功能描述: 验证码识别后端接口，子类实现 solve()
+    参数: 无
+    返回值: 无
+    异常描述:
+        识别失败抛出 CaptchaSolveError；网络请求异常原样抛出
+    调用演示:
+        result = solver.solve(captcha_base64)
+        print(result.answer, result.confidence, result.backend)
+    """
+
+    name = "base"
+
+    def solve(self, captcha_base64):
+        raise NotImplementedError
+
+
+class JfbymSolver(CaptchaSolver):
+    """
+    功能描述: 云码平台（api.jfbym.com）远程识别
+    参数:
+        http: HttpPool 实例
+        token: 云码平台 Token
+        url: 识别接口地址
+        captcha_type: 云码平台的验证码类型
+    返回值: 无
+    异常描述: 平台返回非 10000 时抛出 CaptchaSolveError
+    调用演示:
+        solver = JfbymSolver(http, YUNMA_TOKEN)
+    """
+
+    name = "jfbym"
+
+    def __init__(self, http, token, url="http://api.jfbym.com/api/YmServer/customApi", captcha_type="50103"):
+        self.http = http
+        self.token = token
+        self.url = url
+        self.captcha_type = captcha_type
+
+    def solve(self, captcha_base64):
+        payload = {"image": captcha_base64, "token": self.token, "type": self.captcha_type}
+        response = self.http.post(self.url, json=payload)
+        response.raise_for_status()
+        data = response.json()
+        if data.get("code") == 10000:
+            return SolveResult(data["data"]["data"], 1.0, self.name)
+        raise CaptchaSolveError(data.get('msg'), self.name)
+
+
+class LocalSolver(CaptchaSolver):
+    """
+    功能描述: 本地离线识别，只用CPU：解码base64图片，NumPy向量化二值化、去噪、按列投影切分字符，
+              再与模板库逐字符做余弦相似度匹配。置信度取各字符最佳匹配分数的最小值
+    参数:
+        templates_path: 模板库文件（.npz），用 build-templates 命令从已标注的验证码生成
+    返回值: 无
+    异常描述:
+        缺少 numpy / Pillow 或模板库不存在时抛出 RuntimeError；
+        图片无法解码或切不出字符时抛出 CaptchaSolveError
+    调用演示:
+        solver = LocalSolver("config/captcha_templates.npz")
+        result = solver.solve(captcha_base64)
+    """
+
+    name = "local"
+    GLYPH_SHAPE = (24, 16)  # 字符归一化后的 高, 宽
+    MIN_GLYPH_WIDTH = 2  # 更窄的列块视为噪点
+
+    def __init__(self, templates_path):
+        if np is None or Image is None:
+            raise RuntimeError("本地识别需要安装 numpy 和 Pillow")
+        if not os.path.exists(templates_path):
+            raise RuntimeError(f"找不到验证码模板库: {templates_path}")
+        with np.load(templates_path) as data:
+            self.templates = self._normalize(data["glyphs"].reshape(len(data["glyphs"]), -1))
+            self.labels = data["labels"]
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = vectors.astype(np.float32)
+        vectors -= vectors.mean(axis=1, keepdims=True)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @staticmethod
+    def _binarize(gray):
+        """Otsu阈值二值化，返回字符像素为True的布尔矩阵"""
+        hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+        levels = np.arange(256)
+        w0 = np.cumsum(hist)
+        w1 = w0[-1] - w0
+        m0 = np.cumsum(hist * levels)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mu0 = m0 / w0
+            mu1 = (m0[-1] - m0) / w1
+            between = w0 * w1 * (mu0 - mu1) ** 2
+        threshold = int(np.nanargmax(between)) if np.isfinite(between).any() else 127
+        ink = gray <= threshold
+        # 背景占多数，如果深色像素更多说明是深底浅字
+        if ink.mean() > 0.5:
+            ink = ~ink
+        # 去掉相邻字符像素少于2个的孤立噪点
+        padded = np.pad(ink, 1).astype(np.uint8)
+        h, w = ink.shape
+        neighbors = sum(
+            padded[1 + dy:1 + dy + h, 1 + dx:1 + dx + w]
+            for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx
+        )
+        return ink & (neighbors >= 2)
+
+    @classmethod
+    def segment(cls, captcha_base64):
+        """
+        功能描述: 解码验证码图片并按列投影切分为归一化尺寸的字符矩阵
+        参数:
+            captcha_base64: 不带 data: 前缀的 base64 图片
+        返回值: 形状为 (字符数, 高, 宽) 的 uint8 数组
+        异常描述: 图片无法解码时抛出 CaptchaSolveError
+        调用演示:
+            glyphs = LocalSolver.segment(captcha_base64)
+        """
+        try:
+            image = Image.open(io.BytesIO(base64.b64decode(captcha_base64))).convert('L')
+        except (binascii.Error, Image.UnidentifiedImageError) as e:
+            raise CaptchaSolveError(f"验证码图片无法解码: {e}", cls.name) from e
+        ink = cls._binarize(np.asarray(image, dtype=np.uint8))
+
+        columns = np.concatenate(([0], ink.any(axis=0).astype(np.int8), [0]))
+        edges = np.diff(columns)
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+
+        # 所有字符共用整行文字的上下边界，保留字符的竖直位置（"-" 和 "=" 等扁平字符靠它区分）
+        rows = np.flatnonzero(ink.any(axis=1))
+        if len(rows):
+            ink = ink[rows[0]:rows[-1] + 1]
+
+        out_h, out_w = cls.GLYPH_SHAPE
+        glyphs = []
+        for start, end in zip(starts, ends):
+            if end - start < cls.MIN_GLYPH_WIDTH:
+                continue
+            block = ink[:, start:end]
+            h, w = block.shape
+            # 最近邻缩放到固定尺寸
+            row_idx = (np.arange(out_h) * h // out_h).clip(0, h - 1)
+            col_idx = (np.arange(out_w) * w // out_w).clip(0, w - 1)
+            glyphs.append(block[np.ix_(row_idx, col_idx)])
+        if not glyphs:
+            return np.zeros((0, out_h, out_w), dtype=np.uint8)
+        return np.stack(glyphs).astype(np.uint8)
+
+    def solve(self, captcha_base64):
+        glyphs = self.segment(captcha_base64)
+        if not len(glyphs):
+            raise CaptchaSolveError("图片中未切分出字符", self.name)
+        scores = self._normalize(glyphs.reshape(len(glyphs), -1)) @ self.templates.T
+        best = scores.argmax(axis=1)
+        confidence = float(scores[np.arange(len(best)), best].min())
+        answer = "".join(str(label) for label in self.labels[best])
+        return SolveResult(answer, confidence, self.name)
+
+    @classmethod
+    def build_templates(cls, samples, output_path, max_per_label=20):
+        """
+        功能描述: 用已标注的验证码生成模板库，只采用切分出的字符数与答案长度一致的样本
+        参数:
+            samples: 可迭代的 (captcha_base64, answer)
+            output_path: 输出的 .npz 文件路径
+            max_per_label: 每个字符最多保留的模板数
+        返回值: (采用的样本数, 模板数)
+        异常描述: 缺少 numpy / Pillow 时抛出 RuntimeError
+        调用演示:
+            LocalSolver.build_templates(load_corpus("captchas.jsonl"), "config/captcha_templates.npz")
+        """
+        if np is None or Image is None:
+            raise RuntimeError("本地识别需要安装 numpy 和 Pillow")
+        glyphs, labels, counts, used = [], [], {}, 0
+        for captcha_base64, answer in samples:
+            segmented = cls.segment(captcha_base64)
+            if len(segmented) != len(answer):
+                continue
+            used += 1
+            for glyph, label in zip(segmented, answer):
+                if counts.get(label, 0) < max_per_label:
+                    counts[label] = counts.get(label, 0) + 1
+                    glyphs.append(glyph)
+                    labels.append(label)
+        np.savez_compressed(output_path, glyphs=np.array(glyphs, dtype=np.uint8), labels=np.array(labels))
+        return used, len(labels)
+
+
+class FallbackSolver(CaptchaSolver):
+    """
+    功能描述: 先用本地识别，失败或置信度低于阈值时改用远程识别
+    参数:
+        local: 本地识别后端
+        remote: 远程识别后端
+        min_confidence: 本地结果可直接采用的最低置信度
+    返回值: 无
+    异常描述: 与远程后端相同
+    调用演示:
+        solver = FallbackSolver(LocalSolver(path), JfbymSolver(http, token), 0.85)
+    """
+
+    name = "fallback"
+
+    def __init__(self, local, remote, min_confidence=0.85):
+        self.local = local
+        self.remote = remote
+        self.min_confidence = min_confidence
+        self.logger = DarkLog('captcha_solver')
+
+    def solve(self, captcha_base64):
+        try:
+            result = self.local.solve(captcha_base64)
+        except Exception as e:
+            self.logger.warning(f"本地识别失败，改用 {self.remote.name}: {e}")
+            metrics.inc("qiandao_captcha_fallbacks_total", reason="error")
+        else:
+            if result.confidence >= self.min_confidence:
+                return result
+            metrics.inc("qiandao_captcha_fallbacks_total", reason="low_confidence")
+        return self.remote.solve(captcha_base64)
+
+
+def build_solver(config, http, token, backend=None):
+    """
+    功能描述: 根据 config.ini 的 [CAPTCHA] 段创建识别后端
+              backend = jfbym（默认）| local | auto（本地优先，置信度低时用云码平台）
+    参数:
+        config: 已读取配置文件的 ConfigParser
+        http: HttpPool 实例
+        token: 云码平台 Token
+        backend: 指定后端，为空时使用配置中的 backend
+    返回值: CaptchaSolver 实例
+    异常描述: 本地识别不可用时抛出 RuntimeError；backend 配置错误时抛出 ValueError
+    调用演示:
+        solver = build_solver(config, http, YUNMA_TOKEN)
+        local_solver = build_solver(config, http, YUNMA_TOKEN, backend="local")
+    """
+    backend = (backend or config.get('CAPTCHA', 'backend', fallback='jfbym')).strip().lower()
+    url = config.get('jfbym', 'api_url', fallback='').strip()
+    remote = JfbymSolver(http, token, url) if url else JfbymSolver(http, token)
+    if backend == 'jfbym':
+        return remote
+    templates = config.get('CAPTCHA', 'templates', fallback='config/captcha_templates.npz')
+    if backend == 'local':
+        return LocalSolver(templates)
+    if backend == 'auto':
+        min_confidence = config.getfloat('CAPTCHA', 'min_confidence', fallback=0.85)
+        return FallbackSolver(LocalSolver(templates), remote, min_confidence)
+    raise ValueError(f"未知的验证码识别后端: {backend}")
+
+
+def load_corpus(path):
+    """
+    功能描述: 逐行读取验证码样本，每行一个JSON：{"image": base64, "answer": "答案"}
+              image 可以带 get_captcha 接口返回的 data:image/...;base64, 前缀
+    参数:
+        path: JSONL 文件路径
+    返回值: 生成器，产出 (captcha_base64, answer)
+    异常描述: 文件不存在时抛出 OSError
+    调用演示:
+        for captcha_base64, answer in load_corpus("captchas.jsonl"):
+            ...
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            sample = json.loads(line)
+            image = sample["image"]
+            if image.startswith("data:"):
+                image = image.split(",", 1)[1]
+            yield image, str(sample.get("answer", ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地验证码识别工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build-templates", help="用已标注的验证码生成模板库")
+    build.add_argument("corpus", help="JSONL 样本文件，每行 {\"image\": ..., \"answer\": ...}")
+    build.add_argument("output", nargs="?", default="config/captcha_templates.npz", help="模板库输出路径")
+    build.add_argument("--max-per-label", type=int, default=20, help="每个字符最多保留的模板数")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    used, template_count = LocalSolver.build_templates(load_corpus(args.corpus), args.output, args.max_per_label)
+    print(f"采用样本 {used} 个，生成模板 {template_count} 个，耗时 {time.perf_counter() - started:.2f}s -> {args.output}")
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+
+class CheckpointJournal:
+    """
+    功能描述: 按天记录每个账号签到最终状态的追加写日志（data_/checkpoint/YYYY-MM-DD.jsonl）
+              每条记录立即写入文件，fsync 按条数或时间间隔批量执行；
+              进程重启或任务再次触发时，当天已签到的账号直接跳过
+    参数:
+        directory: 检查点文件目录
+        done_states: 视为已完成的签到状态
+        fsync_every: 累计多少条记录执行一次 fsync
+        fsync_interval: 距上次 fsync 超过多少秒时执行 fsync
+        keep_days: 保留最近几天的检查点文件
+    返回值: 无
+    异常描述: 目录无法创建或写入时抛出 OSError
+    调用演示:
+        journal = CheckpointJournal("data_/checkpoint", done_states={"success", "already"})
+        if not journal.is_done("user123"):
+            ...
+            journal.record("user123", "success")
+        journal.close()
+    """
+
+    def __init__(self, directory="data_/checkpoint", done_states=("success", "already"), fsync_every=20,
+                 fsync_interval=1.0, keep_days=7):
+        self.directory = directory
+        self.done_states = frozenset(done_states)
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self.day = date.today()
+        self.path = os.path.join(directory, f"{self.day.isoformat()}.jsonl")
+        self._done = set()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._remove_expired(keep_days)
+        self._load()
+        # O_APPEND：多个分片进程同时追加同一个文件，每条记录一次 write 写完，不会互相覆盖
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    @classmethod
+    def from_config(cls, config, done_states):
+        """
+        功能描述: 根据 config.ini 的 [CHECKPOINT] 段创建检查点日志，未启用时返回None
+        参数:
+            config: 已读取配置文件的 ConfigParser
+            done_states: 视为已完成的签到状态
+        返回值: CheckpointJournal 实例或 None
+        异常描述: 配置值不是数字时抛出 ValueError
+        调用演示:
+            journal = CheckpointJournal.from_config(config, (CHECKIN_SUCCESS, CHECKIN_ALREADY))
+        """
+        if not config.getboolean('CHECKPOINT', 'enabled', fallback=True):
+            return None
+        return cls(
+            directory=config.get('CHECKPOINT', 'directory', fallback="data_/checkpoint"),
+            done_states=done_states,
+            fsync_every=config.getint('CHECKPOINT', 'fsync_every', fallback=20),
+            fsync_interval=config.getfloat('CHECKPOINT', 'fsync_interval', fallback=1.0),
+            keep_days=config.getint('CHECKPOINT', 'keep_days', fallback=7),
+        )
+
+    def _remove_expired(self, keep_days):
+        oldest = (self.day - timedelta(days=keep_days)).isoformat()
+        for name in os.listdir(self.directory):
+            if name.endswith(".jsonl") and name[:-len(".jsonl")] < oldest:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _load(self):
+        """逐行读取当天的记录，同一账号以最后一条为准；进程被杀时写了一半的行直接忽略"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("state") in self.done_states:
+                        self._done.add(record.get("username"))
+                    else:
+                        self._done.discard(record.get("username"))
+        except OSError:
+            pass
+
+    def is_done(self, username):
+        return username in self._done
+
+    def record(self, username, state, message=""):
+        """
+        功能描述: 追加一条账号的最终状态
+        参数:
+            username: 用户名
+            state: check_in 返回的状态，没有执行到签到时为 None
+            message: 附加说明
+        返回值: 无
+        异常描述: 写入失败时抛出 OSError
+        调用演示:
+            journal.record("user123", "already")
+        """
+        line = json.dumps({"username": username, "state": state, "message": message, "time": time.time()},
+                          ensure_ascii=False) + "\n"
+        with self._lock:
+            os.write(self._fd, line.encode('utf-8'))
+            if state in self.done_states:
+                self._done.add(username)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._fd)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            if self._unsynced:
+                self._sync()
+            os.close(self._fd)
+            self._fd = None
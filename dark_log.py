@@ -1,14 +1,352 @@
 from loguru import logger
+import configparser
+import json
 import os
 import sys
+import threading
 from datetime import datetime
 import traceback
-import inspect
+
+from log_archive import LogArchiver
+
+
+# 代码对象 -> (是否为本模块, 脚本名, 函数名)。代码对象数量有限，缓存后每次只需比较一次字典
+_CODE_INFO = {}
+
+
+def _caller_info():
+    """
+    功能描述: 沿调用栈向上找到第一个不在 dark_log.py 中的帧，返回其脚本名、函数名和行号
+              只访问 f_back / f_code / f_lineno，不像 inspect.getouterframes 那样构造整栈的 FrameInfo、读取源码行
+    参数: 无
+    返回值: (user_script, user_function, user_line)，找不到时为 ("unknown", "unknown", 0)
+    异常描述: 无
+    调用演示:
+        user_script, user_function, user_line = _caller_info()
+    """
+    frame = sys._getframe(1)
+    try:
+        while frame is not None:
+            code = frame.f_code
+            info = _CODE_INFO.get(code)
+            if info is None:
+                filename = code.co_filename
+                info = _CODE_INFO[code] = (filename.endswith('dark_log.py'), os.path.basename(filename), code.co_name)
+            if not info[0]:
+                return info[1], info[2], frame.f_lineno
+            frame = frame.f_back
+        return "unknown", "unknown", 0
+    finally:
+        del frame
+
+
+_LOG_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <cyan>{extra[user_script]}</cyan>:<cyan>{extra[user_function]}</cyan>:<cyan>{extra[user_line]}</cyan> | <magenta>ID: {extra[id]}</magenta> - <level>{message}</level>"
+
+# 进程内共享的日志处理器："console" / "file" / "json" -> loguru 处理器ID
+_sinks = {}
+_file_suffix = None
+_sinks_lock = threading.Lock()
+_settings = None
+_archiver = None
+
+# extra 中由 DarkLog 内部使用的键，不作为结构化字段输出
+_INTERNAL_EXTRA = frozenset(("id", "user_script", "user_function", "user_line", "console"))
+
+
+class LogSettings:
+    """
+    功能描述: config.ini [LOG] 段的日志选项
+    参数:
+        file_diagnose / file_backtrace: 文本日志文件记录异常时是否输出变量值和完整调用栈
+        console_diagnose / console_backtrace: 控制台记录异常时是否输出变量值和完整调用栈
+        json_enabled: 是否同时写入结构化日志 log_/日期.jsonl
+        json_flush_interval: 结构化日志后台线程的写入间隔（秒）
+        json_buffer_size: 结构化日志缓冲多少条记录后立即写入
+        json_traceback: 结构化日志是否包含异常调用栈
+        max_size_mb: 单个日志文件超过多少MB时提前轮换，0表示只按天轮换
+        compression: 轮换后的日志文件压缩格式 gz / zst，为空时不压缩
+        retention_days: 保留最近几天的日志，0表示不按时间清理
+        retention_count: 最多保留多少个已轮换的日志文件，0表示不限
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        settings = LogSettings.from_config(config)
+    """
+
+    def __init__(self, file_diagnose=True, file_backtrace=True, console_diagnose=True, console_backtrace=True,
+                 json_enabled=False, json_flush_interval=1.0, json_buffer_size=1000, json_traceback=True,
+                 max_size_mb=0, compression="", retention_days=0, retention_count=0):
+        self.file_diagnose = file_diagnose
+        self.file_backtrace = file_backtrace
+        self.console_diagnose = console_diagnose
+        self.console_backtrace = console_backtrace
+        self.json_enabled = json_enabled
+        self.json_flush_interval = json_flush_interval
+        self.json_buffer_size = json_buffer_size
+        self.json_traceback = json_traceback
+        self.max_size_mb = max_size_mb
+        self.compression = compression
+        self.retention_days = retention_days
+        self.retention_count = retention_count
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            file_diagnose=config.getboolean('LOG', 'file_diagnose', fallback=True),
+            file_backtrace=config.getboolean('LOG', 'file_backtrace', fallback=True),
+            console_diagnose=config.getboolean('LOG', 'console_diagnose', fallback=True),
+            console_backtrace=config.getboolean('LOG', 'console_backtrace', fallback=True),
+            json_enabled=config.getboolean('LOG', 'json_enabled', fallback=False),
+            json_flush_interval=config.getfloat('LOG', 'json_flush_interval', fallback=1.0),
+            json_buffer_size=config.getint('LOG', 'json_buffer_size', fallback=1000),
+            json_traceback=config.getboolean('LOG', 'json_traceback', fallback=True),
+            max_size_mb=config.getfloat('LOG', 'max_size_mb', fallback=0),
+            compression=config.get('LOG', 'compression', fallback=''),
+            retention_days=config.getint('LOG', 'retention_days', fallback=0),
+            retention_count=config.getint('LOG', 'retention_count', fallback=0),
+        )
+
+    @classmethod
+    def load(cls, path="config/config.ini"):
+        """读取配置文件中的 [LOG] 段，文件不存在或格式错误时使用默认值"""
+        config = configparser.ConfigParser()
+        try:
+            config.read(path, encoding='utf-8')
+            return cls.from_config(config)
+        except (configparser.Error, ValueError):
+            return cls()
+
+
+class DailySizeRotation:
+    """
+    功能描述: 文本日志的轮换条件：日期变化时轮换，文件超过 max_bytes 时也提前轮换
+              （当天的旧文件由 loguru 改名为 日期.轮换时间.log）
+    参数:
+        max_bytes: 单个文件的最大字节数，0表示只按天轮换
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        logger.add("log_/{time:YYYY-MM-DD}.log", rotation=DailySizeRotation(100 * 1024 * 1024))
+    """
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self._day = None
+
+    def __call__(self, message, file):
+        day = message.record["time"].date()
+        if self._day is None:
+            self._day = day
+        if day != self._day:
+            self._day = day
+            return True
+        return bool(self.max_bytes) and file.tell() + len(message) > self.max_bytes
+
+
+class JsonlSink:
+    """
+    功能描述: 结构化日志处理器，每条记录一行JSON，按记录日期写入 log_/YYYY-MM-DD{后缀}.jsonl
+              记录日志的线程只把记录放进缓冲区，由后台线程按时间间隔或缓冲条数批量写入文件
+    参数:
+        directory: 日志目录
+        file_suffix: 文件名后缀，如 ".shard0"
+        flush_interval: 后台线程的写入间隔（秒）
+        buffer_size: 缓冲多少条记录后立即写入
+        include_traceback: 是否包含异常调用栈
+        max_bytes: 单个文件超过多少字节时改名为 日期.轮换时间.jsonl 另起新文件，0表示只按天分文件
+        archiver: LogArchiver 实例，写完的文件交给它压缩和清理，为空时不处理
+    返回值: 无
+    异常描述: 写入失败时输出到 stderr，不影响记录日志的线程
+    调用演示:
+        logger.add(JsonlSink("log_"), format="{message}", diagnose=False, backtrace=False)
+    """
+
+    def __init__(self, directory="log_", file_suffix="", flush_interval=1.0, buffer_size=1000,
+                 include_traceback=True, max_bytes=0, archiver=None):
+        self.directory = directory
+        self.file_suffix = file_suffix
+        self.flush_interval = flush_interval
+        self.buffer_size = max(1, buffer_size)
+        self.include_traceback = include_traceback
+        self.max_bytes = max_bytes
+        self.archiver = archiver
+        self._current_day = None
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="dark_log-jsonl", daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        record = message.record
+        entry = {
+            "time": record["time"].isoformat(),
+            "level": record["level"].name,
+            "account": record["extra"].get("id"),
+            "message": record["message"],
+            "script": record["extra"].get("user_script"),
+            "function": record["extra"].get("user_function"),
+            "line": record["extra"].get("user_line"),
+        }
+        for key, value in record["extra"].items():
+            if key not in _INTERNAL_EXTRA:
+                entry[key] = value
+        exception = record["exception"]
+        if exception is not None and exception.type is not None:
+            entry["exception"] = (
+                ''.join(traceback.format_exception(exception.type, exception.value, exception.traceback))
+                if self.include_traceback else ''.join(traceback.format_exception_only(exception.type, exception.value))
+            ).rstrip()
+        with self._lock:
+            self._buffer.append((record["time"].strftime("%Y-%m-%d"), entry))
+            if len(self._buffer) >= self.buffer_size:
+                self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        # 同一批次按日期分组，每个文件只打开、写入一次
+        lines = {}
+        for day, entry in batch:
+            lines.setdefault(day, []).append(json.dumps(entry, ensure_ascii=False, default=str))
+        for day, day_lines in lines.items():
+            path = os.path.join(self.directory, day + self.file_suffix + ".jsonl")
+            try:
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write("\n".join(day_lines) + "\n")
+                    size = f.tell()
+            except OSError as e:
+                sys.stderr.write(f"写入结构化日志失败: {path}: {e}\n")
+                continue
+            if self._current_day is not None and day > self._current_day:
+                # 进入新的一天，前一天的文件不会再写入
+                self._archive(os.path.join(self.directory, self._current_day + self.file_suffix + ".jsonl"))
+            if self._current_day is None or day > self._current_day:
+                self._current_day = day
+            if self.max_bytes and size > self.max_bytes:
+                rotated = os.path.join(self.directory, f"{day}{self.file_suffix}.{datetime.now():%Y-%m-%d_%H-%M-%S_%f}.jsonl")
+                try:
+                    os.rename(path, rotated)
+                except OSError:
+                    continue
+                self._archive(rotated)
+
+    def _archive(self, path):
+        if self.archiver is not None:
+            self.archiver.submit(path)
+
+    def stop(self):
+        """loguru 移除处理器或进程退出时调用：停止后台线程并写入剩余的记录"""
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join()
+        self._flush()
+
+
+def configure_sinks(file_suffix=None):
+    """
+    功能描述: 创建当前进程共享的控制台、文件和结构化日志处理器，每个进程只创建一次；
+              所有 DarkLog 实例都写入这些处理器，file_suffix 变化时只替换文件和结构化日志处理器。
+              各处理器的 diagnose/backtrace 以及是否启用结构化日志在 config.ini 的 [LOG] 段配置
+    参数:
+        file_suffix: 日志文件名后缀，如 ".shard0"；为None时沿用当前后缀（首次创建时为空）
+    返回值: 无
+    异常描述: 无法创建日志目录时抛出 OSError
+    调用演示:
+        configure_sinks(".shard0")  # 之后的日志写入 log_/2025-06-04.shard0.log
+    """
+    global _file_suffix, _settings, _archiver
+    with _sinks_lock:
+        if not _sinks:
+            _settings = LogSettings.load()
+            if _settings.compression or _settings.retention_days or _settings.retention_count:
+                # 压缩和清理在后台线程中执行；启动时先处理上次退出前遗留的文件
+                _archiver = LogArchiver("log_", _settings.compression, _settings.retention_days,
+                                        _settings.retention_count)
+                _archiver.sweep()
+            # 移除loguru默认的stderr处理器，避免重复输出；只在首次创建时执行
+            logger.remove()
+            # 是否输出由每条日志的 extra[console] 决定
+            _sinks["console"] = logger.add(
+                sys.stderr,
+                format=_LOG_FORMAT,
+                filter=_console_filter,
+                enqueue=True,
+                diagnose=_settings.console_diagnose,
+                backtrace=_settings.console_backtrace,
+                level="INFO"
+            )
+        if file_suffix is None:
+            file_suffix = _file_suffix or ""
+        if "file" in _sinks and file_suffix == _file_suffix:
+            return
+
+        # 确保文件夹存在
+        os.makedirs("log_", exist_ok=True)
+        max_bytes = int(_settings.max_size_mb * 1024 * 1024)
+        for name in ("file", "json"):
+            if name in _sinks:
+                logger.remove(_sinks.pop(name))
+        # 添加文件处理器，按天轮换
+        _sinks["file"] = logger.add(
+            os.path.join("log_", "{time:YYYY-MM-DD}" + file_suffix + ".log"),
+            rotation=DailySizeRotation(max_bytes),  # 每天午夜轮换，超过大小上限时提前轮换
+            compression=_archiver.submit if _archiver is not None else None,
+            format=_LOG_FORMAT,
+            enqueue=True,
+            diagnose=_settings.file_diagnose,
+            backtrace=_settings.file_backtrace,
+            level="INFO"
+        )
+        if _settings.json_enabled:
+            # 自带后台线程批量写入，不需要 enqueue；异常调用栈由 JsonlSink 自己格式化
+            _sinks["json"] = logger.add(
+                JsonlSink("log_", file_suffix, _settings.json_flush_interval, _settings.json_buffer_size,
+                          _settings.json_traceback, max_bytes, _archiver),
+                format="{message}",
+                diagnose=False,
+                backtrace=False,
+                level="INFO"
+            )
+        _file_suffix = file_suffix
+
+
+def close_sinks():
+    """
+    功能描述: 移除当前进程的所有日志处理器，等待队列和结构化日志缓冲区中的记录写完；
+              multiprocessing 子进程退出时不执行 atexit，分片进程结束前需要调用
+    参数: 无
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        close_sinks()
+    """
+    global _file_suffix
+    with _sinks_lock:
+        for handler_id in _sinks.values():
+            logger.remove(handler_id)
+        _sinks.clear()
+        _file_suffix = None
+
+
+def _console_filter(record):
+    """控制台处理器的过滤器：每条日志自带是否输出到控制台的标记"""
+    return record["extra"].get("console", True)
 
 
 class DarkLog:
     """
     功能描述: 基于loguru的增强日志记录器，支持多实例、ID绑定和控制台输出控制
+              日志处理器由进程内所有实例共享，实例本身只是 bind(id=...) 的视图，可以按账号大量创建
     参数: 无
     返回值: 无
     异常描述: 无
@@ -25,6 +363,9 @@ class DarkLog:
         logger1.set_console_output(False)
         logger1.info("此消息不会显示在控制台")
 
+        # 附带结构化字段，写入 log_/日期.jsonl（[LOG] json_enabled = true 时）
+        logger1.info("签到完成", stage="check_in", duration_ms=215.3, outcome="success")
+
 
         # 在控制台打印错误
         logger.exception(f"索引越界错误: {str(e)}")
@@ -37,76 +378,32 @@ class DarkLog:
         logger.log_exception(message=f"索引越界错误: {str(e)}", show_console=False)
     """
 
-    def __init__(self, id_value):
+    def __init__(self, id_value, file_suffix=None):
         """
         功能描述: 初始化自定义日志记录器
         参数:
             id_value: 日志实例的唯一标识符，将显示在每条日志记录中
+            file_suffix: 日志文件名后缀，多进程运行时每个进程写自己的文件，如 ".shard0"；
+                         为None时沿用当前进程已配置的日志文件
         返回值: 无
         异常描述: 无
         调用演示:
             logger = CustomLogger("user123")
+            logger = CustomLogger("user123", file_suffix=".shard0")  # 写入 log_/2025-06-04.shard0.log
         """
         self.id = id_value
         self.console_output = True
 
-        # 确保文件夹存在
-        os.makedirs("log_", exist_ok=True)
-
-
-        # 移除所有已存在的处理器，避免重复输出
-        # 这一步非常关键，确保每次创建CustomLogger实例时，都从一个干净的logger状态开始
-        logger.remove()
-
-        # 添加文件处理器，按天轮换
-        log_file = os.path.join("log_", "{time:YYYY-MM-DD}.log")
-        self.file_handler_id = logger.add(
-            log_file,
-            rotation="00:00",  # 每天午夜轮换
-            format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <cyan>{extra[user_script]}</cyan>:<cyan>{extra[user_function]}</cyan>:<cyan>{extra[user_line]}</cyan> | <magenta>ID: {extra[id]}</magenta> - <level>{message}</level>",
-            enqueue=True,
-            diagnose=True,
-            backtrace=True,
-            level="INFO"
-        )
-
-        # 添加控制台处理器
-        self.console_handler_id = None
-        if self.console_output:
-            self._add_console_handler()
+        # 日志处理器由整个进程共享，创建实例只做一次 bind，不增删处理器
+        if file_suffix is not None or not _sinks:
+            configure_sinks(file_suffix)
 
         # 创建带有id的上下文logger
         self.logger = logger.bind(id=self.id)
 
-    def _add_console_handler(self):
-        """添加控制台处理器"""
-        # 只有当console_handler_id为None时才添加，避免重复添加
-        if self.console_handler_id is not None:
-            return
-
-        self.console_handler_id = logger.add(
-            sys.stderr,
-            format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <cyan>{extra[user_script]}</cyan>:<cyan>{extra[user_function]}</cyan>:<cyan>{extra[user_line]}</cyan> | <magenta>ID: {extra[id]}</magenta> - <level>{message}</level>",
-            enqueue=True,
-            diagnose=True,
-            backtrace=True,
-            level="INFO"
-        )
-
-    def _remove_console_handler(self):
-        """移除控制台处理器"""
-        if self.console_handler_id is not None:
-            try:
-                logger.remove(self.console_handler_id)
-            except ValueError:
-                # 如果处理器已经被移除，忽略错误
-                pass
-            finally:
-                self.console_handler_id = None
-
     def set_console_output(self, enabled):
         """
-        功能描述: 控制是否在控制台输出日志
+        功能描述: 控制本实例的日志默认是否在控制台输出，只影响本实例，不增删全局的日志处理器
         参数:
             enabled: 布尔值，True表示启用控制台输出，False表示禁用
         返回值: 无
@@ -115,93 +412,71 @@ class DarkLog:
             logger.set_console_output(False)  # 禁用控制台输出
             logger.set_console_output(True)   # 启用控制台输出
         """
-        if enabled and not self.console_output:
-            self._add_console_handler()
-            self.console_output = True
-        elif not enabled and self.console_output:
-            self._remove_console_handler()
-            self.console_output = False
-
-    def _log_with_console_control(self, level_method, message, show_console=None):
+        self.console_output = bool(enabled)
+
+    def _context_logger(self, show_console=None, fields=None):
         """
-        功能描述: 使用控制台控制选项记录日志
+        功能描述: 绑定调用位置和本条日志是否输出到控制台，多线程同时调用互不影响
         参数:
-            level_method: 日志级别方法（如 logger.info, logger.error 等）
-            message: 要记录的日志消息
-            show_console: 是否在控制台显示此条日志
-        返回值: 无
+            show_console: 是否在控制台显示此条日志，None表示使用实例的默认设置
+            fields: 结构化字段（如 stage、duration_ms、outcome），只写入结构化日志
+        返回值: 绑定了额外信息的 loguru logger
         异常描述: 无
         调用演示: 内部方法，不直接调用
         """
         # 获取当前运行的脚本名、函数名和行号
-        frame = inspect.currentframe()
-        user_script = "unknown"
-        user_function = "unknown"
-        user_line = 0
-
-        try:
-            frames = inspect.getouterframes(frame)
-            for f in frames:
-                if not f.filename.endswith('dark_log.py'):
-                    user_script = os.path.basename(f.filename)
-                    user_function = f.function
-                    user_line = f.lineno
-                    break
-        finally:
-            del frame
-
-        # 绑定额外的上下文信息
-        context_logger = self.logger.bind(
+        user_script, user_function, user_line = _caller_info()
+        return self.logger.bind(
             user_script=user_script,
             user_function=user_function,
-            user_line=user_line
+            user_line=user_line,
+            console=self.console_output if show_console is None else show_console,
+            **(fields or {})
         )
 
-        # 原有的控制台输出控制逻辑
-        original_state = self.console_output
-        temp_change = False
-
-        if show_console is not None and show_console != self.console_output:
-            # 临时改变控制台输出状态
-            self.set_console_output(show_console)
-            temp_change = True
-
-        # 记录日志
+    def _log_with_console_control(self, level_method, message, show_console=None, fields=None):
+        """
+        功能描述: 使用控制台控制选项记录日志
+        参数:
+            level_method: 日志级别方法（如 logger.info, logger.error 等）
+            message: 要记录的日志消息
+            show_console: 是否在控制台显示此条日志
+            fields: 结构化字段
+        返回值: 无
+        异常描述: 无
+        调用演示: 内部方法，不直接调用
+        """
         # 使用getattr来动态调用绑定了额外信息的logger的相应级别方法
-        # 这里不需要再通过level_method.__name__来获取方法名，直接调用即可
-        getattr(context_logger, level_method.__name__)(message)
-
-        # 如果临时改变了状态，恢复原来的状态
-        if temp_change:
-            self.set_console_output(original_state)
+        getattr(self._context_logger(show_console, fields), level_method.__name__)(message)
 
-    def debug(self, message, show_console=None):
+    def debug(self, message, show_console=None, **fields):
         # 传递原始的logger方法，而不是绑定后的方法
-        self._log_with_console_control(self.logger.debug, message, show_console)
+        self._log_with_console_control(self.logger.debug, message, show_console, fields)
 
-    def info(self, message, show_console=None):
+    def info(self, message, show_console=None, **fields):
         # 传递原始的logger方法，而不是绑定后的方法
-        self._log_with_console_control(self.logger.info, message, show_console)
+        self._log_with_console_control(self.logger.info, message, show_console, fields)
 
-    def warning(self, message, show_console=None):
+    def warning(self, message, show_console=None, **fields):
         # 传递原始的logger方法，而不是绑定后的方法
-        self._log_with_console_control(self.logger.warning, message, show_console)
+        self._log_with_console_control(self.logger.warning, message, show_console, fields)
 
-    def error(self, message, show_console=None):
+    def error(self, message, show_console=None, **fields):
         # 传递原始的logger方法，而不是绑定后的方法
-        self._log_with_console_control(self.logger.error, message, show_console)
+        self._log_with_console_control(self.logger.error, message, show_console, fields)
 
-    def critical(self, message, show_console=None):
+    def critical(self, message, show_console=None, **fields):
         # 传递原始的logger方法，而不是绑定后的方法
-        self._log_with_console_control(self.logger.critical, message, show_console)
+        self._log_with_console_control(self.logger.critical, message, show_console, fields)
 
-    def exception(self, message, exc_info=True, show_console=None):
+    def exception(self, message, exc_info=True, show_console=None, **fields):
         """
         功能描述: 记录异常详细信息，包括堆栈跟踪
         参数:
             message: 异常信息描述
             exc_info: 是否包含异常详细信息，默认为True
             show_console: 是否在控制台显示，None表示使用当前设置
+            fields: 结构化字段，只写入结构化日志
         返回值: 无
         异常描述: 无
         调用演示:
@@ -211,70 +486,14 @@ class DarkLog:
                 logger.exception(f"除零错误: {str(e)}")
                 logger.exception(f"不在控制台显示的错误", True, False)
         """
-        # 保存原始状态
-        original_state = self.console_output
-        temp_change = False
-
-        if show_console is not None and show_console != self.console_output:
-            # 临时改变控制台输出状态
-            self.set_console_output(show_console)
-            temp_change = True
-
-        # 记录异常信息
+        context_logger = self._context_logger(show_console, fields)
         if exc_info:
-            # 同样需要绑定额外信息
-            frame = inspect.currentframe()
-            user_script = "unknown"
-            user_function = "unknown"
-            user_line = 0
-            try:
-                frames = inspect.getouterframes(frame)
-                for f in frames:
-                    if not f.filename.endswith('dark_log.py'):
-                        user_script = os.path.basename(f.filename)
-                        user_function = f.function
-                        user_line = f.lineno
-                        break
-            finally:
-                del frame
-
-            context_logger = self.logger.bind(
-                user_script=user_script,
-                user_function=user_function,
-                user_line=user_line
-            )
             context_logger.exception(message)
         else:
-            # 这里也应该使用绑定了额外信息的logger，或者确保extra信息被传递
-            # 如果不使用context_logger，那么extra信息将不会被添加到日志中
-            # 考虑到exception方法通常用于记录异常，我们应该确保它也包含user_script等信息
-            frame = inspect.currentframe()
-            user_script = "unknown"
-            user_function = "unknown"
-            user_line = 0
-            try:
-                frames = inspect.getouterframes(frame)
-                for f in frames:
-                    if not f.filename.endswith('dark_log.py'):
-                        user_script = os.path.basename(f.filename)
-                        user_function = f.function
-                        user_line = f.lineno
-                        break
-            finally:
-                del frame
-
-            context_logger = self.logger.bind(
-                user_script=user_script,
-                user_function=user_function,
-                user_line=user_line
-            )
             context_logger.error(message)
 
-        # 恢复原始状态
-        if temp_change:
-            self.set_console_output(original_state)
-
-    def log_exception(self, message="发生异常", show_console=None, exc_type=None, exc_value=None, exc_traceback=None):
+    def log_exception(self, message="发生异常", show_console=None, exc_type=None, exc_value=None, exc_traceback=None,
+                      **fields):
         """记录自定义异常详细信息
 
         Args:
@@ -283,16 +502,8 @@ class DarkLog:
             exc_traceback: 异常堆栈，默认为None（使用sys.exc_info获取）
             message: 异常信息描述
             show_console: 是否在控制台显示，None表示使用当前设置
+            fields: 结构化字段，只写入结构化日志
         """
-        # 保存原始状态
-        original_state = self.console_output
-        temp_change = False
-
-        if show_console is not None and show_console != self.console_output:
-            # 临时改变控制台输出状态
-            self.set_console_output(show_console)
-            temp_change = True
-
         # 如果没有提供异常信息，则使用sys.exc_info获取当前异常
         if exc_type is None or exc_value is None or exc_traceback is None:
             exc_info = sys.exc_info()
@@ -303,56 +514,10 @@ class DarkLog:
             if exc_traceback is None:
                 exc_traceback = exc_info[2]
 
+        context_logger = self._context_logger(show_console, fields)
         # 格式化异常信息
         if exc_type and exc_value and exc_traceback:
             exception_details = ''.join(traceback.format_exception(exc_type, exc_value, exc_traceback))
-            full_message = f"{message}\n{exception_details}"
-            # 同样需要绑定额外信息
-            frame = inspect.currentframe()
-            user_script = "unknown"
-            user_function = "unknown"
-            user_line = 0
-            try:
-                frames = inspect.getouterframes(frame)
-                for f in frames:
-                    if not f.filename.endswith('dark_log.py'):
-                        user_script = os.path.basename(f.filename)
-                        user_function = f.function
-                        user_line = f.lineno
-                        break
-            finally:
-                del frame
-
-            context_logger = self.logger.bind(
-                user_script=user_script,
-                user_function=user_function,
-                user_line=user_line
-            )
-            context_logger.error(full_message)
+            context_logger.error(f"{message}\n{exception_details}")
         else:
-            # 同样，这里也应该使用绑定了额外信息的logger
-            frame = inspect.currentframe()
-            user_script = "unknown"
-            user_function = "unknown"
-            user_line = 0
-            try:
-                frames = inspect.getouterframes(frame)
-                for f in frames:
-                    if not f.filename.endswith('dark_log.py'):
-                        user_script = os.path.basename(f.filename)
-                        user_function = f.function
-                        user_line = f.lineno
-                        break
-            finally:
-                del frame
-
-            context_logger = self.logger.bind(
-                user_script=user_script,
-                user_function=user_function,
-                user_line=user_line
-            )
             context_logger.error(message)
-
-        # 恢复原始状态
-        if temp_change:
-            self.set_console_output(original_state)
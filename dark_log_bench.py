@@ -0,0 +1,65 @@
+import argparse
+import inspect
+import os
+import time
+
+from loguru import logger
+
+import dark_log
+from dark_log import DarkLog
+
+
+def legacy_caller_info():
+    """优化前的实现：inspect.getouterframes 构造整栈 FrameInfo 并读取源码行"""
+    frame = inspect.currentframe().f_back
+    try:
+        for f in inspect.getouterframes(frame):
+            if not f.filename.endswith('dark_log.py'):
+                return os.path.basename(f.filename), f.function, f.lineno
+        return "unknown", "unknown", 0
+    finally:
+        del frame
+
+
+def _nested(depth, func):
+    """在 depth 层调用栈之下执行 func，模拟业务代码中的调用深度"""
+    if depth <= 0:
+        return func()
+    return _nested(depth - 1, func)
+
+
+def measure(log, seconds, depth):
+    """在指定调用深度下循环调用 log.info，返回每秒调用次数"""
+    def loop():
+        calls = 0
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            for _ in range(100):
+                log.info("benchmark message")
+            calls += 100
+        return calls
+
+    started = time.perf_counter()
+    calls = _nested(depth, loop)
+    return calls / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DarkLog 调用位置解析的微基准测试")
+    parser.add_argument("--seconds", type=float, default=2.0, help="每项测试的时长（秒）")
+    parser.add_argument("--depth", default="0,20", help="逗号分隔的额外调用栈深度")
+    args = parser.parse_args()
+
+    log = DarkLog("bench")
+    # 换成空输出，只测日志调用本身的CPU开销，格式化仍然执行
+    logger.remove()
+    logger.add(lambda message: None, format="{extra[user_script]}:{extra[user_function]}:{extra[user_line]} {message}")
+
+    optimized = dark_log._caller_info
+    print(f"{'调用深度':>8} {'优化前(次/s)':>14} {'优化后(次/s)':>14} {'提升':>8}")
+    for depth in (int(value) for value in args.depth.split(",")):
+        dark_log._caller_info = legacy_caller_info
+        before = measure(log, args.seconds, depth)
+        dark_log._caller_info = optimized
+        after = measure(log, args.seconds, depth)
+        print(f"{depth:>8} {before:>14.0f} {after:>14.0f} {after / before:>7.1f}x")
@@ -0,0 +1,79 @@
+import threading
+import urllib.parse
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HttpPool:
+    """
+    功能描述: 按目标主机复用 requests.Session 的HTTP连接池，统一设置连接池大小和超时
+              同一主机的请求复用 keep-alive 连接，省去每次请求的 TCP+TLS 握手
+    参数:
+        pool_connections: 每个Session缓存的连接池数量
+        pool_maxsize: 每个连接池保持的最大连接数，建议不小于并发账号数
+        connect_timeout: 建立连接的超时时间（秒）
+        read_timeout: 等待响应的超时时间（秒）
+    返回值: 无
+    异常描述: 请求超时抛出 requests.exceptions.Timeout，由调用方按请求失败处理
+    调用演示:
+        http = HttpPool(pool_maxsize=20, connect_timeout=5, read_timeout=15)
+        response = http.post("https://msec.nsfocus.com/backend_api/account/captcha", json={})
+        http.close()
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, connect_timeout=5.0, read_timeout=15.0):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+        self._sessions = {}  # scheme://host -> Session
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        功能描述: 根据 config.ini 的 [HTTP] 段创建连接池，缺省项使用默认值
+        参数:
+            config: 已读取配置文件的 ConfigParser
+        返回值: HttpPool 实例
+        异常描述: 配置值不是数字时抛出 ValueError
+        调用演示:
+            http = HttpPool.from_config(config)
+        """
+        return cls(
+            pool_connections=config.getint('HTTP', 'pool_connections', fallback=10),
+            pool_maxsize=config.getint('HTTP', 'pool_maxsize', fallback=10),
+            connect_timeout=config.getfloat('HTTP', 'connect_timeout', fallback=5.0),
+            read_timeout=config.getfloat('HTTP', 'read_timeout', fallback=15.0),
+        )
+
+    def session(self, url):
+        """返回目标主机对应的 Session，不存在时创建"""
+        parts = urllib.parse.urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                # 多个账号共用同一个Session，禁止保存Cookie，避免账号之间串号
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+                session.mount(f"{parts.scheme}://", adapter)
+                self._sessions[key] = session
+            return session
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session(url).post(url, **kwargs)
+
+    def close(self):
+        """关闭所有Session及其连接"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
@@ -0,0 +1,192 @@
+import argparse
+import configparser
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from mock_servers import MockSuite, add_settings_arguments, settings_from_args
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("captcha", "solve", "login", "check_in", "points", "account")
+
+
+def _serve_mocks(connection, settings):
+    """模拟服务单独运行在一个进程中，不和签到脚本争用同一个GIL"""
+    suite = MockSuite(settings)
+    suite.start()
+    connection.send(suite.config_overrides())
+    # 等待压测结束
+    connection.recv()
+    connection.send(suite.stats())
+    suite.stop()
+
+
+def percentile(values, fraction):
+    """最近秩法计算分位数，values 需已排序"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+def write_workdir(workdir, args, overrides):
+    """
+    功能描述: 在压测目录中生成账号文件和 config/config.ini；以仓库的配置为基础，
+              服务地址指向模拟服务，关闭凭证缓存和检查点（每次压测都完整执行），开启结构化日志用于统计延迟；
+              重复使用的压测目录先清空上次留下的 log_/ 和 data_/，统计中只包含本次压测
+    参数:
+        workdir: 压测目录，签到脚本的相对路径（config/、log_/、data_/）都在这里
+        args: 命令行参数
+        overrides: MockSuite.config_overrides() 的返回值
+    返回值: 无
+    异常描述: 写入失败时抛出 OSError
+    调用演示:
+        write_workdir("/tmp/qiandao-load", args, overrides)
+    """
+    for name in ("log_", "data_"):
+        shutil.rmtree(os.path.join(workdir, name), ignore_errors=True)
+    os.makedirs(os.path.join(workdir, "config"), exist_ok=True)
+    with open(os.path.join(workdir, "accounts.jsonl"), 'w', encoding='utf-8') as f:
+        for index in range(args.accounts):
+            f.write(json.dumps({"username": f"load{index:06d}", "password": "mock"}) + "\n")
+
+    config = configparser.ConfigParser(interpolation=None)
+    config.read(os.path.join(ROOT, "config", "config.ini"), encoding='utf-8')
+    settings = {
+        "ACCOUNTS": {"source": "jsonl", "path": "accounts.jsonl", "resume": "false"},
+        "ENGINE": {"workers": str(args.workers), "concurrency": str(args.concurrency),
+                   "host_rate_limit": str(args.host_rate_limit)},
+        "HTTP": {"pool_connections": str(args.concurrency * 2), "pool_maxsize": str(args.concurrency * 2)},
+        "TOKEN_CACHE": {"enabled": "false"},
+        "CHECKPOINT": {"enabled": "false"},
+        "CAPTCHA": {"backend": "jfbym", "prefetch": str(args.prefetch)},
+        "RETRY": {"base_delay": str(args.retry_delay), "job_deadline": "0"},
+        "LOG": {"json_enabled": "true", "compression": "", "retention_days": "0", "retention_count": "0"},
+        "METRICS": {"enabled": "true", "textfile": "data_/metrics.prom", "http_port": "0"},
+        "jfbym": {"Token": "mock-token"},
+        "dingding": {"dingding_secret": "mock" if args.notify else "", "dingding_access_token": "mock" if args.notify else "",
+                     "dingding_userid": "mock" if args.notify else ""},
+        "EMAIL": {"email_sender": "load@example.com" if args.notify else "", "email_pass": "mock" if args.notify else "",
+                  "receiver_email": "ops@example.com" if args.notify else ""},
+    }
+    for source in (settings, overrides):
+        for section, options in source.items():
+            if not config.has_section(section):
+                config.add_section(section)
+            for option, value in options.items():
+                config.set(section, option, value)
+    with open(os.path.join(workdir, "config", "config.ini"), 'w', encoding='utf-8') as f:
+        config.write(f)
+
+
+def collect_latencies(workdir):
+    """从结构化日志中读取每个阶段和每个账号的耗时（毫秒）以及各阶段的结果"""
+    durations = {stage: [] for stage in STAGES}
+    outcomes = {}
+    for path in glob.glob(os.path.join(workdir, "log_", "*.jsonl")):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                stage = record.get("stage")
+                if stage not in durations:
+                    continue
+                durations[stage].append(record["duration_ms"])
+                key = f"{stage}:{record.get('outcome')}"
+                outcomes[key] = outcomes.get(key, 0) + 1
+    for values in durations.values():
+        values.sort()
+    return durations, outcomes
+
+
+def report(args, elapsed, summaries, durations, outcomes, mock_stats):
+    accounts = len(summaries)
+    lines = [
+        f"账号数: {accounts}，进程数: {args.workers}，并发数: {args.concurrency}，"
+        f"模拟延迟: {args.latency:.0f} ms，错误率: {args.error_rate:.1%}，限流: {args.rate_limit or '不限'}",
+        f"总耗时: {elapsed:.2f} 秒，吞吐量: {accounts / elapsed if elapsed else 0:.1f} 账号/秒",
+        "",
+        f"{'阶段':<10} {'次数':>8} {'p50(ms)':>10} {'p95(ms)':>10} {'p99(ms)':>10} {'最大(ms)':>10}",
+    ]
+    for stage in STAGES:
+        values = durations[stage]
+        if values:
+            lines.append(f"{stage:<10} {len(values):>8} {percentile(values, 0.5):>10.1f} {percentile(values, 0.95):>10.1f} "
+                         f"{percentile(values, 0.99):>10.1f} {values[-1]:>10.1f}")
+    lines += ["", "各阶段结果:"]
+    lines += [f"  {key}: {count}" for key, count in sorted(outcomes.items())]
+    lines += ["", "模拟服务请求数:"]
+    lines += [f"  {endpoint}: 请求 {entry['requests']}，注入错误 {entry['errors']}，限流 {entry['throttled']}"
+              for endpoint, entry in mock_stats.items()]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用本地模拟服务对签到任务做压测，统计端到端吞吐量和长尾延迟")
+    parser.add_argument("--accounts", type=int, default=200, help="模拟账号数")
+    parser.add_argument("--workers", type=int, default=1, help="签到进程数（[ENGINE] workers）")
+    parser.add_argument("--concurrency", type=int, default=10, help="每个进程的并发账号数（[ENGINE] concurrency）")
+    parser.add_argument("--host-rate-limit", type=float, default=0, help="客户端每主机每秒请求数，0表示不限")
+    parser.add_argument("--prefetch", type=int, default=8, help="验证码预取数（[CAPTCHA] prefetch）")
+    parser.add_argument("--retry-delay", type=float, default=0.2, help="重试的初始等待秒数（[RETRY] base_delay）")
+    parser.add_argument("--notify", action="store_true", help="同时压测钉钉和邮件通知")
+    parser.add_argument("--workdir", help="压测目录，默认使用临时目录")
+    parser.add_argument("--output", help="把结果另存为JSON，便于和之前的结果比较")
+    add_settings_arguments(parser)
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe()
+    mock_process = context.Process(target=_serve_mocks, args=(child, settings_from_args(args)), daemon=True)
+    mock_process.start()
+    overrides = parent.recv()
+
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="qiandao-load-")
+    write_workdir(workdir, args, overrides)
+    # 签到脚本的配置、日志、数据文件都是相对路径，导入前先切换到压测目录
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    import sign_in
+    from dark_log import close_sinks
+
+    started = time.perf_counter()
+    summaries = sign_in.job()
+    elapsed = time.perf_counter() - started
+    # 通知由后台线程发送，等发送完再统计模拟服务收到的请求
+    sign_in.get_outbox().flush()
+    # 写完结构化日志缓冲区中的记录再统计
+    close_sinks()
+
+    parent.send("stop")
+    mock_stats = parent.recv()
+    mock_process.join()
+
+    durations, outcomes = collect_latencies(workdir)
+    print(report(args, elapsed, summaries, durations, outcomes, mock_stats))
+    print(f"\n压测目录: {workdir}")
+    if output:
+        result = {
+            "arguments": vars(args),
+            "elapsed": elapsed,
+            "accounts": len(summaries),
+            "throughput": len(summaries) / elapsed if elapsed else 0,
+            "latency_ms": {stage: {"count": len(values), "p50": percentile(values, 0.5),
+                                   "p95": percentile(values, 0.95), "p99": percentile(values, 0.99),
+                                   "max": values[-1] if values else 0}
+                           for stage, values in durations.items()},
+            "outcomes": outcomes,
+            "mock": mock_stats,
+        }
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
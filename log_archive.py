@@ -0,0 +1,281 @@
+import argparse
+import gzip
+import io
+import json
+import os
+import queue
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+try:
+    import zstandard
+except ImportError:  # 没有安装 zstandard 时只支持 gzip
+    zstandard = None
+
+# 日志目录中由 DarkLog 产生的文件：日期开头，.log / .jsonl，可能已压缩
+_LOG_NAME = re.compile(r"^(\d{4}-\d{2}-\d{2}).*\.(log|jsonl)(\.gz|\.zst)?$")
+# 当天正在写入的文件：日期 + 可选的分片后缀，没有轮换时间戳
+_ACTIVE_NAME = re.compile(r"^\d{4}-\d{2}-\d{2}(\.shard\d+)?\.(log|jsonl)$")
+# 文本日志中每条记录的第一行
+_TEXT_RECORD = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3} \| (\w+)\s*\|.*? \| ID: (.*?) - ")
+
+COMPRESSED_SUFFIXES = {"gz": ".gz", "zst": ".zst"}
+
+
+def open_log(path):
+    """
+    功能描述: 以文本方式打开日志文件，.gz / .zst 压缩文件边读边解压，不在磁盘上生成解压后的文件
+    参数:
+        path: 日志文件路径
+    返回值: 文本文件对象，按行迭代
+    异常描述: .zst 文件且未安装 zstandard 时抛出 RuntimeError
+    调用演示:
+        with open_log("log_/2025-06-04.log.gz") as f:
+            for line in f:
+                ...
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("读取 .zst 日志需要先安装 zstandard: pip install zstandard")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+class LogArchiver:
+    """
+    功能描述: 在后台线程中压缩轮换下来的日志文件，并按保留天数、保留个数清理日志目录，
+              写日志的线程只负责把文件路径放进队列，不会被压缩阻塞
+    参数:
+        directory: 日志目录
+        compression: 压缩格式 gz / zst，为空时不压缩
+        retention_days: 保留最近几天的日志，0表示不按时间清理
+        retention_count: 最多保留多少个日志文件，0表示不限
+    返回值: 无
+    异常描述: compression 为 zst 但未安装 zstandard 时抛出 RuntimeError
+    调用演示:
+        archiver = LogArchiver("log_", compression="gz", retention_days=30)
+        archiver.submit("log_/2025-06-03.log")
+    """
+
+    def __init__(self, directory="log_", compression="gz", retention_days=30, retention_count=0):
+        compression = (compression or "").strip().lower()
+        if compression and compression not in COMPRESSED_SUFFIXES:
+            raise ValueError(f"不支持的日志压缩格式: {compression}")
+        if compression == "zst" and zstandard is None:
+            raise RuntimeError("日志压缩格式 zst 需要先安装 zstandard: pip install zstandard")
+        self.directory = directory
+        self.compression = compression
+        self.retention_days = retention_days
+        self.retention_count = retention_count
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="dark_log-archiver", daemon=True)
+        self._thread.start()
+
+    def submit(self, path):
+        """loguru 的 compression 回调：把轮换下来的文件交给后台线程处理"""
+        self._queue.put(path)
+
+    def sweep(self):
+        """压缩上次进程退出前没来得及压缩的文件，并按保留策略清理一次"""
+        self._queue.put(None)
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            try:
+                if path is None:
+                    self._sweep()
+                else:
+                    self._compress(path)
+                self._apply_retention()
+            except Exception as e:
+                sys.stderr.write(f"日志归档失败: {path}: {e}\n")
+
+    def _compress(self, path):
+        if not self.compression or not os.path.exists(path):
+            return
+        target = path + COMPRESSED_SUFFIXES[self.compression]
+        if os.path.exists(target):
+            # 其他进程（分片子进程、上次运行）已经压缩过这个文件
+            return
+        # 每个进程使用自己的临时文件，多个进程同时压缩同一个文件时不会互相覆盖
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f".{os.path.basename(path)}.",
+                                        suffix=".tmp")
+        try:
+            with open(path, 'rb') as source, os.fdopen(fd, 'wb') as output:
+                if self.compression == "gz":
+                    with gzip.GzipFile(fileobj=output, mode='wb', filename=os.path.basename(path)) as compressed:
+                        shutil.copyfileobj(source, compressed, 1024 * 1024)
+                else:
+                    zstandard.ZstdCompressor().copy_stream(source, output)
+            os.replace(tmp_path, target)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _log_files(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return [name for name in names if _LOG_NAME.match(name)]
+
+    def _sweep(self):
+        # 一天内修改过的文件可能仍被其他进程打开，留给它们自己轮换时处理
+        cutoff = time.time() - 24 * 3600
+        for name in self._log_files():
+            path = os.path.join(self.directory, name)
+            if name.endswith((".gz", ".zst")) or (_ACTIVE_NAME.match(name) and name.startswith(date.today().isoformat())):
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    self._compress(path)
+            except OSError:
+                pass
+
+    def _apply_retention(self):
+        if not self.retention_days and not self.retention_count:
+            return
+        today = date.today().isoformat()
+        files = []
+        for name in self._log_files():
+            # 当天正在写入的文件不清理
+            if _ACTIVE_NAME.match(name) and name.startswith(today):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                files.append((os.path.getmtime(path), name, path))
+            except OSError:
+                pass
+        files.sort()
+        expired = []
+        if self.retention_days:
+            oldest = (date.today() - timedelta(days=self.retention_days)).isoformat()
+            expired = [entry for entry in files if _LOG_NAME.match(entry[1]).group(1) < oldest]
+            files = [entry for entry in files if entry not in expired]
+        if self.retention_count and len(files) > self.retention_count:
+            expired += files[:len(files) - self.retention_count]
+        for _, _, path in expired:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _date_range(directory, since, until, structured):
+    """按日期顺序列出日期范围内的日志文件"""
+    extension = "jsonl" if structured else "log"
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        match = _LOG_NAME.match(name)
+        if not match or match.group(2) != extension:
+            continue
+        if since and match.group(1) < since or until and match.group(1) > until:
+            continue
+        paths.append(os.path.join(directory, name))
+    return paths
+
+
+def iter_text_records(path, account=None, level=None):
+    """
+    功能描述: 逐条读取文本日志，异常调用栈等多行内容归入同一条记录，按账号ID和级别过滤
+    参数:
+        path: 日志文件路径，可以是 .gz / .zst
+        account: 账号ID（日志中的 ID 字段），为空时不过滤
+        level: 日志级别，为空时不过滤
+    返回值: 生成器，每次产出一条记录的完整文本
+    异常描述: 文件无法读取时抛出 OSError
+    调用演示:
+        for record in iter_text_records("log_/2025-06-04.log.gz", account="user123"):
+            print(record, end="")
+    """
+    with open_log(path) as f:
+        lines = []
+        matched = False
+        for line in f:
+            header = _TEXT_RECORD.match(line)
+            if header:
+                if matched:
+                    yield "".join(lines)
+                lines = [line]
+                matched = (account is None or header.group(2) == account) and (level is None or header.group(1) == level)
+            elif matched:
+                lines.append(line)
+        if matched:
+            yield "".join(lines)
+
+
+def iter_json_records(path, account=None, level=None, stage=None):
+    """
+    功能描述: 逐行读取结构化日志，按账号、级别和阶段过滤，损坏的行直接跳过
+    参数:
+        path: 日志文件路径，可以是 .gz / .zst
+        account: 账号ID，为空时不过滤
+        level: 日志级别，为空时不过滤
+        stage: 阶段（captcha/solve/login/check_in/points/account），为空时不过滤
+    返回值: 生成器，每次产出一条记录的 dict
+    异常描述: 文件无法读取时抛出 OSError
+    调用演示:
+        for record in iter_json_records("log_/2025-06-04.jsonl.gz", account="user123", stage="login"):
+            print(record["duration_ms"])
+    """
+    with open_log(path) as f:
+        for line in f:
+            # 先按字符串粗筛，不匹配的行不做JSON解析
+            if account is not None and account not in line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if account is not None and record.get("account") != account:
+                continue
+            if level is not None and record.get("level") != level:
+                continue
+            if stage is not None and record.get("stage") != stage:
+                continue
+            yield record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按账号检索日志，压缩的归档文件边读边解压")
+    parser.add_argument("--account", help="账号ID（用户名）")
+    parser.add_argument("--since", help="起始日期，如 2025-06-01")
+    parser.add_argument("--until", help="结束日期，如 2025-06-30")
+    parser.add_argument("--level", help="日志级别，如 ERROR")
+    parser.add_argument("--stage", help="阶段，只对结构化日志有效")
+    parser.add_argument("--json", action="store_true", help="读取结构化日志（.jsonl），每行输出一条JSON")
+    parser.add_argument("--directory", default="log_", help="日志目录")
+    args = parser.parse_args(argv)
+
+    level = args.level.upper() if args.level else None
+    try:
+        for path in _date_range(args.directory, args.since, args.until, args.json):
+            if args.json:
+                for record in iter_json_records(path, args.account, level, args.stage):
+                    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                for record in iter_text_records(path, args.account, level):
+                    sys.stdout.write(record)
+    except BrokenPipeError:
+        # 输出通过管道交给 head 等命令时提前关闭
+        pass
+
+
+if __name__ == "__main__":
+    main()
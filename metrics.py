@@ -0,0 +1,264 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 耗时直方图的分桶上限（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 指标名 -> (类型, 说明)
+METRICS = {
+    "qiandao_stage_duration_seconds": ("histogram", "签到各阶段的耗时"),
+    "qiandao_stage_outcomes_total": ("counter", "签到各阶段按结果统计的次数"),
+    "qiandao_retries_total": ("counter", "各阶段失败后重试的次数"),
+    "qiandao_captcha_solves_total": ("counter", "验证码识别次数，按识别后端和是否成功统计"),
+    "qiandao_captcha_solver_success_ratio": ("gauge", "验证码识别成功率，按识别后端统计"),
+    "qiandao_captcha_fallbacks_total": ("counter", "本地识别失败或置信度不足、改用远程识别的次数，按原因统计"),
+    "qiandao_notify_duration_seconds": ("histogram", "钉钉和邮件通知的耗时"),
+    "qiandao_notify_outcomes_total": ("counter", "钉钉和邮件通知按结果统计的次数"),
+    "qiandao_notify_pending": ("gauge", "等待发送（含等待重试）的通知数"),
+    "qiandao_smtp_connections_total": ("counter", "新建并登录的SMTP连接数"),
+    "qiandao_accounts_total": ("counter", "已执行签到的账号数，按最终状态统计"),
+    "qiandao_job_duration_seconds": ("gauge", "最近一次签到任务的总耗时"),
+    "qiandao_job_last_run_timestamp_seconds": ("gauge", "最近一次签到任务结束的时间"),
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    功能描述: 进程内的指标登记表，计数器、直方图和仪表盘都按 名称 + 标签 分别累计，多线程安全；
+              可以导出 Prometheus 文本格式，分片子进程的指标通过 snapshot / merge 汇总到主进程
+    参数:
+        buckets: 直方图的分桶上限（秒）
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        metrics.inc("qiandao_retries_total", stage="login")
+        metrics.observe("qiandao_stage_duration_seconds", 0.35, stage="login")
+        with metrics.timer("qiandao_notify_duration_seconds", channel="dingding"):
+            ...
+        text = metrics.render()
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}  # (名称, 标签) -> 数值
+        self._gauges = {}
+        self._histograms = {}  # (名称, 标签) -> [各分桶计数..., 总次数, 总和]
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[index] += 1
+            histogram[-2] += 1
+            histogram[-1] += value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """记录 with 代码块的耗时（秒）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def count_solve(self, backend, success):
+        """记录一次验证码识别结果，用于计算各识别后端的成功率"""
+        self.inc("qiandao_captcha_solves_total", backend=backend, result="success" if success else "failure")
+
+    def snapshot(self):
+        """返回可以在进程间传递的指标副本"""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": {key: list(value) for key, value in self._histograms.items()},
+            }
+
+    def merge(self, snapshot):
+        """合并分片子进程的指标：计数器和直方图相加，仪表盘以子进程的值为准"""
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            self._gauges.update(snapshot["gauges"])
+            for key, value in snapshot["histograms"].items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    self._histograms[key] = list(value)
+                else:
+                    for index, count in enumerate(value):
+                        histogram[index] += count
+
+    def _success_ratios(self):
+        totals = {}
+        for (name, labels), value in self._counters.items():
+            if name != "qiandao_captcha_solves_total":
+                continue
+            labels = dict(labels)
+            success, total = totals.get(labels["backend"], (0, 0))
+            if labels["result"] == "success":
+                success += value
+            totals[labels["backend"]] = (success, total + value)
+        return {(("backend", backend),): success / total for backend, (success, total) in totals.items() if total}
+
+    def render(self):
+        """
+        功能描述: 导出 Prometheus 文本格式
+        参数: 无
+        返回值: 字符串
+        异常描述: 无
+        调用演示:
+            print(metrics.render())
+        """
+        with self._lock:
+            series = {}
+            for (name, labels), value in self._counters.items():
+                series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for (name, labels), value in self._gauges.items():
+                series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for labels, ratio in self._success_ratios().items():
+                name = "qiandao_captcha_solver_success_ratio"
+                series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {ratio!r}")
+            for (name, labels), histogram in self._histograms.items():
+                lines = series.setdefault(name, [])
+                for bound, count in zip(self.buckets, histogram):
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram[-2]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram[-2]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-1]!r}")
+
+        output = []
+        for name in sorted(series):
+            kind, description = METRICS.get(name, ("untyped", name))
+            output.append(f"# HELP {name} {description}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(sorted(series[name]))
+        return "\n".join(output) + "\n"
+
+
+# 进程内共享的指标登记表
+metrics = MetricsRegistry()
+
+
+class MetricsExporter:
+    """
+    功能描述: 把指标导出为 Prometheus 文本文件（供 node_exporter textfile 采集），
+              或在本机端口上提供 /metrics 接口，调度进程存活期间随时可以抓取
+    参数:
+        registry: MetricsRegistry 实例
+        textfile: 文本文件路径，为空时不写文件
+        http_host: HTTP 接口监听地址
+        http_port: HTTP 接口端口，0表示不启动
+    返回值: 无
+    异常描述: 端口被占用时 start() 抛出 OSError
+    调用演示:
+        exporter = MetricsExporter(metrics, "data_/metrics.prom", http_port=9108)
+        exporter.start()
+        exporter.write_textfile()  # 每次任务结束后调用
+    """
+
+    def __init__(self, registry, textfile="data_/metrics.prom", http_host="127.0.0.1", http_port=0):
+        self.registry = registry
+        self.textfile = textfile
+        self.http_host = http_host
+        self.http_port = http_port
+        self._server = None
+
+    @classmethod
+    def from_config(cls, config, registry=None):
+        """
+        功能描述: 根据 config.ini 的 [METRICS] 段创建导出器，未启用时返回None
+        参数:
+            config: 已读取配置文件的 ConfigParser
+            registry: MetricsRegistry 实例，缺省为进程内共享的 metrics
+        返回值: MetricsExporter 实例或 None
+        异常描述: 端口不是数字时抛出 ValueError
+        调用演示:
+            exporter = MetricsExporter.from_config(config)
+        """
+        if not config.getboolean('METRICS', 'enabled', fallback=False):
+            return None
+        return cls(
+            registry or metrics,
+            textfile=config.get('METRICS', 'textfile', fallback="data_/metrics.prom").strip(),
+            http_host=config.get('METRICS', 'http_host', fallback="127.0.0.1").strip(),
+            http_port=config.getint('METRICS', 'http_port', fallback=0),
+        )
+
+    def write_textfile(self):
+        """写入同目录下的临时文件后原子替换，采集方不会读到写了一半的文件"""
+        if not self.textfile:
+            return
+        directory = os.path.dirname(self.textfile) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".metrics.", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self.registry.render())
+        os.replace(tmp_path, self.textfile)
+
+    def start(self):
+        """启动 /metrics HTTP 接口（后台线程）"""
+        if not self.http_port or self._server is not None:
+            return
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.http_host, self.http_port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,400 @@
+import argparse
+import base64
+import itertools
+import json
+import random
+import socketserver
+import threading
+import time
+import urllib.parse
+from collections import deque
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockSettings:
+    """
+    功能描述: 模拟服务的行为参数，各服务共用
+    参数:
+        latency: 每个请求的平均处理时间（秒）
+        jitter: 处理时间的随机浮动比例，0.5 表示在 0.5~1.5 倍之间
+        slow_rate: 请求变慢的概率，用于模拟长尾延迟
+        slow_latency: 变慢的请求额外增加的时间（秒）
+        error_rate: 返回 503 的概率
+        rate_limit: 每个服务每秒最多处理的请求数，超出时返回 429，0表示不限
+        captcha_error_rate: 模拟云码平台识别错误的概率（登录时返回验证码错误）
+        already_rate: 模拟账号今天已经签到过的概率
+        dingtalk_per_minute: 钉钉机器人每分钟最多接收的消息数，超出时返回 410100，0表示不限
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        settings = MockSettings(latency=0.05, error_rate=0.01, rate_limit=200)
+    """
+
+    def __init__(self, latency=0.05, jitter=0.5, slow_rate=0.0, slow_latency=1.0, error_rate=0.0, rate_limit=0,
+                 captcha_error_rate=0.0, already_rate=0.0, dingtalk_per_minute=20):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.captcha_error_rate = captcha_error_rate
+        self.already_rate = already_rate
+        self.dingtalk_per_minute = dingtalk_per_minute
+
+    def delay(self):
+        delay = self.latency * random.uniform(1 - self.jitter, 1 + self.jitter)
+        if self.slow_rate and random.random() < self.slow_rate:
+            delay += self.slow_latency
+        return max(0.0, delay)
+
+
+class _RateWindow:
+    """按秒计数的简单限流窗口"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._second = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        if not self.limit:
+            return True
+        now = int(time.monotonic())
+        with self._lock:
+            if now != self._second:
+                self._second, self._count = now, 0
+            self._count += 1
+            return self._count <= self.limit
+
+
+class MockState:
+    """
+    功能描述: 模拟服务共享的状态和统计：验证码答案、登录凭证、当天已签到的账号、各接口的请求数
+    参数: 无
+    返回值: 无
+    异常描述: 无
+    调用演示: 由 MockSuite 创建
+    """
+
+    def __init__(self):
+        self.captchas = {}  # 验证码ID -> 答案
+        self.tokens = {}  # 登录凭证 -> 用户名
+        self.checked_in = set()
+        self.points = {}
+        self.stats = {}  # 服务/接口 -> {"requests": n, "errors": n, "throttled": n}
+        self.dingtalk_sent = deque()  # 最近一分钟内钉钉消息的接收时间
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def count(self, endpoint, field):
+        with self._lock:
+            entry = self.stats.setdefault(endpoint, {"requests": 0, "errors": 0, "throttled": 0})
+            entry[field] += 1
+
+    def next_id(self):
+        return next(self._ids)
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    """按路径分发到服务的处理函数，统一注入延迟、错误和限流"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        path = urllib.parse.urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        route = server.routes.get(path)
+        endpoint = f"{server.name}{path}"
+        if route is None:
+            self._reply(404, {"message": "not found"})
+            return
+        server.state.count(endpoint, "requests")
+        settings = server.settings
+        time.sleep(settings.delay())
+        if not server.window.allow():
+            server.state.count(endpoint, "throttled")
+            self._reply(429, {"message": "too many requests"})
+            return
+        if settings.error_rate and random.random() < settings.error_rate:
+            server.state.count(endpoint, "errors")
+            self._reply(503, {"message": "service unavailable"})
+            return
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            payload = {}
+        self._reply(200, route(server, self, payload))
+
+    def _reply(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _msec_captcha(server, handler, payload):
+    state = server.state
+    captcha_id = str(state.next_id())
+    answer = str(random.randint(1000, 9999))
+    with state._lock:
+        state.captchas[captcha_id] = answer
+    # 图片内容直接带上答案，模拟的云码平台据此“识别”
+    image = base64.b64encode(f"mock-captcha:{answer}".encode()).decode()
+    return {"status": 200, "data": {"id": captcha_id, "captcha": f"data:image/png;base64,{image}"}}
+
+
+def _msec_login(server, handler, payload):
+    state = server.state
+    with state._lock:
+        answer = state.captchas.pop(str(payload.get("captcha_id")), None)
+    if answer is None or answer != payload.get("captcha_answer"):
+        return {"status": 400, "message": "验证码错误"}
+    token = f"mock-{payload.get('username')}-{state.next_id()}"
+    with state._lock:
+        state.tokens[token] = payload.get("username")
+    return {"status": 200, "data": {"token": token}}
+
+
+def _authorized_user(server, handler):
+    with server.state._lock:
+        return server.state.tokens.get(handler.headers.get("Authorization"))
+
+
+def _msec_checkin(server, handler, payload):
+    state = server.state
+    username = _authorized_user(server, handler)
+    if username is None:
+        return {"status": 401, "message": "登录已过期"}
+    key = (username, date.today())
+    with state._lock:
+        already = key in state.checked_in or random.random() < server.settings.already_rate
+        state.checked_in.add(key)
+        if not already:
+            state.points[username] = state.points.get(username, 0) + 10
+    if already:
+        return {"status": 400, "message": "签到失败", "data": "今天已经签到过了"}
+    return {"status": 200, "message": "签到成功"}
+
+
+def _msec_points(server, handler, payload):
+    username = _authorized_user(server, handler)
+    if username is None:
+        return {"status": 401, "message": "登录已过期"}
+    with server.state._lock:
+        total = server.state.points.get(username, 0)
+    return {"status": 200, "data": {"accrued": total, "total": total}}
+
+
+def _jfbym_solve(server, handler, payload):
+    try:
+        answer = base64.b64decode(payload.get("image", "")).decode().split(":", 1)[1]
+    except (ValueError, IndexError, UnicodeDecodeError):
+        return {"code": 10002, "msg": "识别失败"}
+    if random.random() < server.settings.captcha_error_rate:
+        answer = str(random.randint(1000, 9999))
+    return {"code": 10000, "msg": "识别成功", "data": {"data": answer}}
+
+
+def _dingtalk_send(server, handler, payload):
+    # 与钉钉机器人一致：markdown 正文不超过 20000 字节，每分钟最多 dingtalk_per_minute 条
+    endpoint = f"{server.name}/robot/send"
+    text = payload.get("markdown", {}).get("text", "")
+    if len(text.encode("utf-8")) > 20000:
+        server.state.count(endpoint, "errors")
+        return {"errcode": 460101, "errmsg": "message too long, exceed 20000 bytes"}
+    limit = server.settings.dingtalk_per_minute
+    if limit:
+        now = time.monotonic()
+        with server.state._lock:
+            sent = server.state.dingtalk_sent
+            while sent and now - sent[0] >= 60:
+                sent.popleft()
+            allowed = len(sent) < limit
+            if allowed:
+                sent.append(now)
+        if not allowed:
+            server.state.count(endpoint, "throttled")
+            return {"errcode": 410100, "errmsg": "send too fast, exceed 20 times per minute"}
+    return {"errcode": 0, "errmsg": "ok"}
+
+
+MSEC_ROUTES = {
+    "/backend_api/account/captcha": _msec_captcha,
+    "/backend_api/account/login": _msec_login,
+    "/backend_api/checkin/checkin": _msec_checkin,
+    "/backend_api/point/common/get": _msec_points,
+}
+JFBYM_ROUTES = {"/api/YmServer/customApi": _jfbym_solve}
+DINGTALK_ROUTES = {"/robot/send": _dingtalk_send}
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """只实现 smtplib 发信用到的命令，收到的邮件只计数不保存"""
+
+    def _send(self, line):
+        self.wfile.write(line.encode("utf-8") + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.state.count("smtp/connect", "requests")
+        self._send("220 mock smtp ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.wfile.write(b"250-mock smtp\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == "AUTH":
+                server.state.count("smtp/auth", "requests")
+                parts = command.split()
+                if len(parts) == 2 and parts[1].upper() == "LOGIN":
+                    # AUTH LOGIN 依次询问用户名和密码
+                    self._send("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self._send("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                elif len(parts) == 2:
+                    self._send("334 ")
+                    self.rfile.readline()
+                self._send("235 authentication successful")
+            elif verb == "DATA":
+                self._send("354 end data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                server.state.count("smtp/data", "requests")
+                time.sleep(server.settings.delay())
+                if server.settings.error_rate and random.random() < server.settings.error_rate:
+                    server.state.count("smtp/data", "errors")
+                    self._send("451 temporary failure")
+                else:
+                    self._send("250 ok")
+            elif verb == "QUIT":
+                self._send("221 bye")
+                return
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self._send("250 ok")
+            else:
+                self._send("502 command not implemented")
+
+
+class _SmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MockSuite:
+    """
+    功能描述: 在本机启动模拟的 M-SEC、云码平台、钉钉机器人 HTTP 服务和 SMTP 收信服务，
+              各服务的延迟、错误率、限流可配置，用于压测和性能回归测试，不访问真实的外部服务
+    参数:
+        settings: MockSettings 实例
+        host: 监听地址
+    返回值: 无
+    异常描述: 端口被占用时 start() 抛出 OSError
+    调用演示:
+        suite = MockSuite(MockSettings(latency=0.05))
+        suite.start()
+        print(suite.config_overrides())
+        ...
+        print(suite.stats())
+        suite.stop()
+    """
+
+    def __init__(self, settings=None, host="127.0.0.1"):
+        self.settings = settings or MockSettings()
+        self.host = host
+        self.state = MockState()
+        self._servers = {}
+
+    def _http_server(self, name, routes):
+        server = ThreadingHTTPServer((self.host, 0), _JsonHandler)
+        server.daemon_threads = True
+        server.name = name
+        server.routes = routes
+        server.settings = self.settings
+        server.state = self.state
+        server.window = _RateWindow(self.settings.rate_limit)
+        return server
+
+    def start(self):
+        self._servers = {
+            "msec": self._http_server("msec", MSEC_ROUTES),
+            "jfbym": self._http_server("jfbym", JFBYM_ROUTES),
+            "dingtalk": self._http_server("dingtalk", DINGTALK_ROUTES),
+            "smtp": _SmtpServer((self.host, 0), _SmtpHandler),
+        }
+        self._servers["smtp"].settings = self.settings
+        self._servers["smtp"].state = self.state
+        for name, server in self._servers.items():
+            threading.Thread(target=server.serve_forever, name=f"mock-{name}", daemon=True).start()
+
+    def port(self, name):
+        return self._servers[name].server_address[1]
+
+    def config_overrides(self):
+        """返回让签到脚本改用模拟服务的配置项：{段: {配置项: 值}}"""
+        return {
+            "EZ_WEB": {"msec_base_url": f"http://{self.host}:{self.port('msec')}"},
+            "jfbym": {"api_url": f"http://{self.host}:{self.port('jfbym')}/api/YmServer/customApi"},
+            "dingding": {"dingding_base_url": f"http://{self.host}:{self.port('dingtalk')}"},
+            "EMAIL": {"smtp_host": self.host, "smtp_port": str(self.port('smtp')), "smtp_ssl": "false"},
+        }
+
+    def stats(self):
+        with self.state._lock:
+            return {endpoint: dict(entry) for endpoint, entry in sorted(self.state.stats.items())}
+
+    def stop(self):
+        for server in self._servers.values():
+            server.shutdown()
+            server.server_close()
+        self._servers = {}
+
+
+def add_settings_arguments(parser):
+    parser.add_argument("--latency", type=float, default=50, help="每个请求的平均处理时间（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.5, help="处理时间的随机浮动比例")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="请求变慢的概率（模拟长尾）")
+    parser.add_argument("--slow-latency", type=float, default=1000, help="变慢的请求额外增加的时间（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的概率")
+    parser.add_argument("--rate-limit", type=int, default=0, help="每个服务每秒最多处理的请求数，0表示不限")
+    parser.add_argument("--captcha-error-rate", type=float, default=0.0, help="验证码识别错误的概率")
+    parser.add_argument("--already-rate", type=float, default=0.0, help="账号今天已签到过的概率")
+    parser.add_argument("--dingtalk-per-minute", type=int, default=20, help="钉钉机器人每分钟最多接收的消息数，0表示不限")
+
+
+def settings_from_args(args):
+    return MockSettings(args.latency / 1000, args.jitter, args.slow_rate, args.slow_latency / 1000, args.error_rate,
+                        args.rate_limit, args.captcha_error_rate, args.already_rate, args.dingtalk_per_minute)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="启动本地模拟的 M-SEC、云码平台、钉钉和 SMTP 服务")
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    suite = MockSuite(settings_from_args(args))
+    suite.start()
+    print("模拟服务已启动，将以下配置写入 config/config.ini 即可改用模拟服务：")
+    for section, options in suite.config_overrides().items():
+        print(f"[{section}]")
+        for option, value in options.items():
+            print(f"{option} = {value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(json.dumps(suite.stats(), ensure_ascii=False, indent=2))
+        suite.stop()
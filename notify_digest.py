@@ -0,0 +1,243 @@
+import html
+import operator
+import os
+import threading
+from datetime import datetime
+
+# 账号在汇总中的状态，按这个顺序分组列出，失败的排在最前面
+STATUS_FAILED = "failed"
+STATUS_SUCCESS = "success"
+STATUS_ALREADY = "already"
+STATUS_SKIPPED = "skipped"
+STATUS_LABELS = {
+    STATUS_FAILED: "失败",
+    STATUS_SUCCESS: "签到成功",
+    STATUS_ALREADY: "今天已签到",
+    STATUS_SKIPPED: "已跳过",
+}
+
+# 钉钉机器人 markdown 消息正文的上限约 20000 字节，留出标题和 @ 用户的余量
+DINGDING_MAX_BYTES = 18000
+
+# 附带运行报表时，邮件正文最多列出的失败账号数，其余见附件
+EMAIL_MAX_ROWS = 200
+
+_by_username = operator.attrgetter("username")
+
+
+class NotificationDigest:
+    """
+    功能描述: 收集一次签到任务中每个账号的结果，任务结束后只发送一条汇总通知（钉钉按消息长度上限分段），
+              失败的账号排在最前面；失败账号数达到 alert_failures 时立即发送一次告警，不等任务结束；
+              通知交给发送队列，分段之间的间隔由发送队列控制；附带运行报表时邮件正文只列出失败的账号
+    参数:
+        outbox: NotificationDispatcher 实例
+        max_bytes: 每段钉钉消息正文的最大字节数
+        alert_failures: 失败多少个账号时立即告警，0表示不告警
+        email_max_rows: 附带运行报表的汇总邮件和失败告警邮件正文最多列出的失败账号数
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        digest = NotificationDigest(outbox, alert_failures=10)
+        alert = digest.add(result)
+        if alert:
+            digest.send_alert(alert)
+        digest.send(elapsed=35.2)
+    """
+
+    def __init__(self, outbox, max_bytes=DINGDING_MAX_BYTES, alert_failures=0, email_max_rows=EMAIL_MAX_ROWS):
+        self.outbox = outbox
+        self.max_bytes = max_bytes
+        self.alert_failures = alert_failures
+        self.email_max_rows = email_max_rows
+        self.entries = []  # AccountResult，发送时才生成每个账号的一行说明；可在进程间传递
+        self._failures = 0
+        self._alerted = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, outbox, shard_count=1):
+        """
+        功能描述: 根据 config.ini 的 [NOTIFY] 段创建汇总；mode 为 account（每个账号单独通知）时返回None
+        参数:
+            config: 已读取配置文件的 ConfigParser
+            outbox: NotificationDispatcher 实例
+            shard_count: 分片进程数，各进程分别统计失败数，告警阈值按进程数平均分配
+        返回值: NotificationDigest 实例或 None
+        异常描述: 数值配置格式错误时抛出 ValueError
+        调用演示:
+            digest = NotificationDigest.from_config(config, outbox)
+        """
+        if config.get('NOTIFY', 'mode', fallback='digest').strip().lower() == 'account':
+            return None
+        alert_failures = config.getint('NOTIFY', 'alert_failures', fallback=0)
+        if alert_failures > 0 and shard_count > 1:
+            alert_failures = max(1, -(-alert_failures // shard_count))
+        return cls(
+            outbox,
+            max_bytes=config.getint('NOTIFY', 'dingding_max_bytes', fallback=DINGDING_MAX_BYTES),
+            alert_failures=alert_failures,
+            email_max_rows=config.getint('NOTIFY', 'email_max_rows', fallback=EMAIL_MAX_ROWS),
+        )
+
+    def add(self, result):
+        """
+        功能描述: 记录一个账号的结果
+        参数:
+            result: AccountResult 实例，status 为 STATUS_* 常量
+        返回值: 失败账号数刚好达到告警阈值时返回需要立即发送的 (标题, 钉钉 markdown, 邮件 HTML)，否则返回None
+        异常描述: 无
+        调用演示:
+            alert = digest.add(result)
+        """
+        with self._lock:
+            self.entries.append(result)
+            if result.status != STATUS_FAILED:
+                return None
+            self._failures += 1
+            if self._alerted or not self.alert_failures or self._failures < self.alert_failures:
+                return None
+            self._alerted = True
+            failed = [entry for entry in self.entries if entry.status == STATUS_FAILED]
+        summary = f"签到任务尚未结束，已有 {len(failed)} 个账号签到失败："
+        lines = ["### M-SEC 签到告警", summary, ""]
+        lines += [f"- **{entry.username}**: {entry.detail()}" for entry in failed]
+        parts = ["<h3>M-SEC 签到告警</h3>", f"<p>{html.escape(summary)}</p><ul>"]
+        parts += [f"<li><b>{html.escape(entry.username)}</b>: {html.escape(entry.detail())}</li>"
+                  for entry in failed[:self.email_max_rows]]
+        if len(failed) > self.email_max_rows:
+            parts.append(f"<li>……另有 {len(failed) - self.email_max_rows} 个失败账号</li>")
+        parts.append("</ul>")
+        title = f"M-SEC 签到告警：已有 {len(failed)} 个账号失败"
+        return title, self._truncate("\n".join(lines)), "".join(parts)
+
+    def merge(self, entries):
+        """合并分片子进程收集的结果"""
+        with self._lock:
+            self.entries.extend(entries)
+
+    def _truncate(self, text):
+        data = text.encode('utf-8')
+        if len(data) <= self.max_bytes:
+            return text
+        return data[:self.max_bytes].decode('utf-8', errors='ignore').rsplit("\n", 1)[0] + "\n\n……"
+
+    def counts(self):
+        counts = dict.fromkeys(STATUS_LABELS, 0)
+        for entry in self.entries:
+            counts[entry.status] = counts.get(entry.status, 0) + 1
+        return counts
+
+    def _headline(self, elapsed):
+        counts = self.counts()
+        parts = [f"{STATUS_LABELS[status]} {counts[status]}" for status in STATUS_LABELS if counts[status]]
+        headline = f"共 {len(self.entries)} 个账号：" + "，".join(parts)
+        if elapsed is not None:
+            headline += f"，耗时 {elapsed:.1f} 秒"
+        return headline
+
+    def _sections(self):
+        """按状态分组，失败在前，每组内按用户名排序"""
+        for status in STATUS_LABELS:
+            entries = sorted((entry for entry in self.entries if entry.status == status), key=_by_username)
+            if entries:
+                yield status, entries
+
+    def render_markdown(self, elapsed=None):
+        """
+        功能描述: 生成钉钉 markdown 汇总，超过 max_bytes 时按行分成多段，每段都带上标题
+        参数:
+            elapsed: 任务耗时（秒），为空时不显示
+        返回值: [(标题, 内容), ...]
+        异常描述: 无
+        调用演示:
+            for title, text in digest.render_markdown(35.2):
+                outbox.dingding(title, text)
+        """
+        counts = self.counts()
+        title = f"M-SEC 签到汇总 {datetime.now():%Y-%m-%d}：失败 {counts[STATUS_FAILED]} / 共 {len(self.entries)}"
+        lines = [f"### M-SEC 签到汇总（{datetime.now():%Y-%m-%d %H:%M}）", self._headline(elapsed)]
+        for status, entries in self._sections():
+            lines.append(f"#### {STATUS_LABELS[status]}（{len(entries)}）")
+            for entry in entries:
+                name, detail = entry.username, entry.detail()
+                name = f"**{name}**" if status == STATUS_FAILED else name
+                lines.append(f"- {name}: {detail}" if detail else f"- {name}")
+
+        chunks = []
+        current, size = [], 0
+        for line in lines:
+            # 单行超长时截断，保证每段都不超过上限
+            line = self._truncate(line)
+            line_size = len(line.encode('utf-8')) + 2
+            if current and size + line_size > self.max_bytes:
+                chunks.append(current)
+                current, size = [], 0
+            current.append(line)
+            size += line_size
+        if current:
+            chunks.append(current)
+        if len(chunks) == 1:
+            return [(title, "\n\n".join(chunks[0]))]
+        return [(f"{title}（{index}/{len(chunks)}）", "\n\n".join(chunk)) for index, chunk in enumerate(chunks, 1)]
+
+    def render_html(self, elapsed=None, report=None, attach=False):
+        """
+        功能描述: 生成邮件汇总；没有运行报表时所有账号放在一封邮件中，
+                  有运行报表时只列出前 email_max_rows 个失败账号，完整明细见报表
+        参数:
+            elapsed: 任务耗时（秒），为空时不显示
+            report: 运行报表路径
+            attach: 运行报表是否作为附件发送，False 时正文中给出报表在服务器上的路径
+        返回值: (主题, HTML 正文)
+        异常描述: 无
+        调用演示:
+            subject, content = digest.render_html(35.2, "data_/reports/report_20250101_090000.zip", True)
+        """
+        counts = self.counts()
+        subject = f"M-SEC 签到汇总 {datetime.now():%Y-%m-%d}：失败 {counts[STATUS_FAILED]} / 共 {len(self.entries)}"
+        parts = [f"<h3>M-SEC 签到汇总（{datetime.now():%Y-%m-%d %H:%M}）</h3>", f"<p>{html.escape(self._headline(elapsed))}</p>"]
+        if report:
+            where = f"附件 {os.path.basename(report)}" if attach else f"服务器上的 {report}（超过附件大小上限）"
+            parts.append(f"<p>每个账号的结果、各阶段耗时和积分见{html.escape(where)}。</p>")
+            failed = sorted((entry for entry in self.entries if entry.status == STATUS_FAILED), key=_by_username)
+            if failed:
+                parts.append(f"<h4>{STATUS_LABELS[STATUS_FAILED]}（{len(failed)}）</h4><ul>")
+                for entry in failed[:self.email_max_rows]:
+                    parts.append(f"<li><b>{html.escape(entry.username)}</b>: {html.escape(entry.detail())}</li>")
+                if len(failed) > self.email_max_rows:
+                    parts.append(f"<li>……另有 {len(failed) - self.email_max_rows} 个失败账号</li>")
+                parts.append("</ul>")
+            return subject, "".join(parts)
+        for status, entries in self._sections():
+            parts.append(f"<h4>{STATUS_LABELS[status]}（{len(entries)}）</h4><ul>")
+            for entry in entries:
+                name, detail = html.escape(entry.username), entry.detail()
+                name = f"<b>{name}</b>" if status == STATUS_FAILED else name
+                parts.append(f"<li>{name}: {html.escape(detail)}</li>" if detail else f"<li>{name}</li>")
+            parts.append("</ul>")
+        return subject, "".join(parts)
+
+    def send_alert(self, alert):
+        """提交 add() 返回的告警，立即返回"""
+        title, text, content = alert
+        self.outbox.dingding(title, text)
+        self.outbox.mail(title, content)
+
+    def send(self, elapsed=None, report=None, attach=False):
+        """
+        功能描述: 提交汇总：钉钉按段提交（发送队列按最短间隔依次发送，避免触发机器人限流），邮件只发一封
+        参数:
+            elapsed: 任务耗时（秒）
+            report: 运行报表路径，为空时邮件正文列出所有账号
+            attach: 是否把运行报表作为邮件附件
+        返回值: 无
+        异常描述: 无
+        调用演示:
+            digest.send(elapsed=35.2)
+        """
+        if not self.entries:
+            return
+        for title, text in self.render_markdown(elapsed):
+            self.outbox.dingding(title, text)
+        self.outbox.mail(*self.render_html(elapsed, report, attach), report if attach else None)
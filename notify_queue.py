@@ -0,0 +1,388 @@
+import atexit
+import heapq
+import itertools
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+from dark_log import DarkLog
+from metrics import metrics
+
+CHANNEL_DINGDING = "dingding"
+CHANNEL_MAIL = "mail"
+
+# 发送结果：200 成功，404 未配置该通知方式（直接丢弃，不重试），其余按退避策略重试
+_DONE_CODES = (200, 404)
+
+# 停止后台线程的标记
+_STOP = object()
+
+# 发送前把消息文件改名为 <文件名>.sending.<进程号> 领取，同一目录的多个发送进程不会重复发送
+_CLAIM_NAME = re.compile(r"^(.+\.json)\.sending\.(\d+)$")
+# 无法检查进程是否存在的系统（Windows）上，领取超过这么多秒的消息视为所属进程已退出
+_STALE_CLAIM_SECONDS = 600
+
+
+class NotificationDispatcher:
+    """
+    功能描述: 异步发送钉钉和邮件通知：submit 只把消息放进内存队列就返回，由后台线程写入磁盘上的待发送目录，
+              再由发送线程投递；发送失败按指数退避重试，进程重启后继续发送目录中未送达的消息。
+              发送前先把消息文件改名领取，多个进程（调度进程、手动执行）共用一个待发送目录时每条消息只发送一次；
+              内存中只保留待发送消息的文件名和下次发送时间，消息正文都在磁盘上；
+              内存队列满时 submit 直接写入磁盘，不会阻塞在网络请求上
+    参数:
+        notifier: Dingdingmail 实例，实际发送通知
+        spool_dir: 待发送消息的目录，每条消息一个JSON文件；多次重试仍失败的移到其中的 failed/ 目录
+        workers: 发送线程数
+        max_pending: 内存队列的容量
+        max_attempts: 每条消息最多发送几次
+        base_delay / max_delay: 重试等待的初始秒数和最长秒数，每次翻倍
+        dingding_interval: 两条钉钉消息之间的最短间隔（秒），钉钉机器人每分钟最多约20条
+        deliver: False 时只写入待发送目录、不启动发送线程，由其他进程（如分片的主进程）发送
+    返回值: 无
+    异常描述: 待发送目录无法创建时抛出 OSError
+    调用演示:
+        outbox = NotificationDispatcher(Dingdingmail("sign_in"))
+        outbox.start()
+        outbox.dingding("签到汇总", text)
+        outbox.mail("签到汇总", html)
+        outbox.flush(30)
+    """
+
+    def __init__(self, notifier, spool_dir="data_/notify_spool", workers=2, max_pending=1000, max_attempts=8,
+                 base_delay=5.0, max_delay=600.0, dingding_interval=3.0, deliver=True):
+        self.notifier = notifier
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, "failed")
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deliver = deliver
+        self.logger = DarkLog('notify_queue')
+        self._intervals = {CHANNEL_DINGDING: dingding_interval}
+        self._last_sent = {}  # 渠道 -> 上一条消息的发送时间
+        self._channel_locks = {CHANNEL_DINGDING: threading.Lock(), CHANNEL_MAIL: threading.Lock()}
+        self._inbox = queue.Queue(maxsize=max(1, max_pending))
+        self._ready = queue.Queue()
+        self._heap = []  # (下次发送时间, 文件名)
+        self._known = set()  # 已登记的文件名（等待中或发送中），重新扫描目录时跳过
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._threads = []
+        self._next_rescan = 0.0
+        os.makedirs(self.failed_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config, notifier, deliver=True):
+        """
+        功能描述: 根据 config.ini 的 [NOTIFY] 段创建发送队列
+        参数:
+            config: 已读取配置文件的 ConfigParser
+            notifier: Dingdingmail 实例
+            deliver: 是否在本进程中发送
+        返回值: NotificationDispatcher 实例
+        异常描述: 数值配置格式错误时抛出 ValueError
+        调用演示:
+            outbox = NotificationDispatcher.from_config(config, notifier)
+        """
+        return cls(
+            notifier,
+            spool_dir=config.get('NOTIFY', 'spool_dir', fallback="data_/notify_spool"),
+            workers=config.getint('NOTIFY', 'workers', fallback=2),
+            max_pending=config.getint('NOTIFY', 'max_pending', fallback=1000),
+            max_attempts=config.getint('NOTIFY', 'max_attempts', fallback=8),
+            base_delay=config.getfloat('NOTIFY', 'retry_base_delay', fallback=5.0),
+            max_delay=config.getfloat('NOTIFY', 'retry_max_delay', fallback=600.0),
+            dingding_interval=config.getfloat('NOTIFY', 'dingding_interval', fallback=3.0),
+            deliver=deliver,
+        )
+
+    def dingding(self, title, text):
+        """提交一条钉钉通知，立即返回"""
+        self.submit(CHANNEL_DINGDING, title, text)
+
+    def mail(self, subject, content, attachment=None):
+        """提交一封邮件通知，立即返回；attachment 为附件路径，发送时文件需仍然存在"""
+        self.submit(CHANNEL_MAIL, subject, content, attachment)
+
+    def submit(self, channel, title, text, attachment=None):
+        """
+        功能描述: 提交一条通知，只放进内存队列就返回；未启动发送线程或队列已满时直接写入待发送目录
+        参数:
+            channel: CHANNEL_DINGDING / CHANNEL_MAIL
+            title: 标题（邮件主题）
+            text: 内容
+            attachment: 邮件附件路径
+        返回值: 无
+        异常描述: 直接写入待发送目录失败时抛出 OSError
+        调用演示:
+            outbox.submit(CHANNEL_DINGDING, "签到汇总", text)
+        """
+        message = {"channel": channel, "title": title, "text": text, "attachment": attachment,
+                   "attempts": 0, "next_attempt": 0, "created": time.time()}
+        if self._threads:
+            try:
+                self._inbox.put_nowait(message)
+                return
+            except queue.Full:
+                pass
+        name = self._write(self._new_name(), message)
+        if self._threads:
+            self._schedule(0, name)
+
+    def _new_name(self):
+        # 按创建时间排序；进程号区分同时写入同一目录的分片进程
+        return f"{time.time_ns()}-{os.getpid()}-{next(self._seq)}.json"
+
+    def _write(self, name, message):
+        """写入临时文件后原子替换，扫描目录时不会读到写了一半的消息"""
+        path = os.path.join(self.spool_dir, name)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(message, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        return name
+
+    def _schedule(self, due, name):
+        # 推迟发送的消息重新入队时文件名一直留在 _known 中，重新扫描目录不会再登记一次
+        with self._lock:
+            heapq.heappush(self._heap, (due, name))
+            self._known.add(name)
+            metrics.set("qiandao_notify_pending", len(self._known))
+
+    def start(self):
+        """启动后台线程，并登记待发送目录中上次没有送达的消息"""
+        if not self.deliver or self._threads:
+            return
+        self._recover_claims()
+        self._rescan()
+        self._threads.append(threading.Thread(target=self._spool_loop, name="notify-spool", daemon=True))
+        for index in range(self.workers):
+            self._threads.append(threading.Thread(target=self._worker, name=f"notify-worker_{index}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        atexit.register(self.stop)
+
+    @staticmethod
+    def _owner_alive(pid, path):
+        if pid == os.getpid():
+            # 启动时本进程还没有领取任何消息，是上次运行的进程号恰好相同
+            return False
+        if os.name != "posix":
+            try:
+                return time.time() - os.path.getmtime(path) < _STALE_CLAIM_SECONDS
+            except OSError:
+                return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _recover_claims(self):
+        """把已退出的进程领取后没有发送完的消息改回原名，重新排队发送"""
+        try:
+            names = os.listdir(self.spool_dir)
+        except OSError:
+            return
+        for name in names:
+            match = _CLAIM_NAME.match(name)
+            if not match:
+                continue
+            path = os.path.join(self.spool_dir, name)
+            if self._owner_alive(int(match.group(2)), path):
+                continue
+            try:
+                os.replace(path, os.path.join(self.spool_dir, match.group(1)))
+            except OSError:
+                pass
+
+    def _rescan(self):
+        """登记其他进程（分片子进程、上次运行）写入的消息，发送时再按文件中的下次发送时间决定是否推迟；
+        已被领取（正在发送）的消息文件名不以 .json 结尾，不会登记"""
+        try:
+            names = sorted(os.listdir(self.spool_dir))
+        except OSError:
+            return
+        # 检查和登记在同一次加锁中完成，避免与正在推迟重发的消息重复登记
+        with self._lock:
+            for name in names:
+                if name.endswith(".json") and name not in self._known:
+                    heapq.heappush(self._heap, (0, name))
+                    self._known.add(name)
+            metrics.set("qiandao_notify_pending", len(self._known))
+
+    def _spool_loop(self):
+        while True:
+            with self._lock:
+                wait = self._heap[0][0] - time.time() if self._heap else 1.0
+            try:
+                message = self._inbox.get(timeout=min(max(wait, 0.01), 1.0))
+            except queue.Empty:
+                message = None
+            if message is _STOP:
+                break
+            if message is not None:
+                try:
+                    self._schedule(0, self._write(self._new_name(), message))
+                except OSError as e:
+                    self.logger.error(f"通知写入待发送目录失败，已丢弃: {message['title']}: {e}")
+            self._release_due()
+            if time.monotonic() >= self._next_rescan:
+                self._next_rescan = time.monotonic() + 5.0
+                self._rescan()
+        # 停止时把内存队列中剩余的消息写入磁盘，下次启动后发送
+        while True:
+            try:
+                message = self._inbox.get_nowait()
+            except queue.Empty:
+                break
+            if message is not _STOP:
+                self._write(self._new_name(), message)
+
+    def _release_due(self):
+        now = time.time()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, name = heapq.heappop(self._heap)
+                self._in_flight += 1
+                self._ready.put(name)
+
+    def _worker(self):
+        while True:
+            name = self._ready.get()
+            if name is _STOP:
+                break
+            try:
+                self._deliver(name)
+            except Exception as e:
+                self.logger.exception(f"发送通知时发生错误: {name}: {e}")
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+    def _deliver(self, name):
+        path = os.path.join(self.spool_dir, name)
+        claim_name = f"{name}.sending.{os.getpid()}"
+        claimed = os.path.join(self.spool_dir, claim_name)
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            # 已被其他进程领取或发送完毕
+            self._forget(name)
+            return
+        try:
+            # 记录领取时间，无法检查进程是否存在时据此判断领取是否已失效
+            os.utime(claimed)
+        except OSError:
+            pass
+        try:
+            with open(claimed, 'r', encoding='utf-8') as f:
+                message = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"通知文件无法读取，移到 {self.failed_dir}: {name}: {e}")
+            os.replace(claimed, os.path.join(self.failed_dir, name))
+            self._forget(name)
+            return
+        if message.get("next_attempt", 0) > time.time():
+            os.rename(claimed, path)
+            self._schedule(message["next_attempt"], name)
+            return
+
+        try:
+            code = self._send(message)
+        except Exception as e:
+            # 按发送失败处理，领取的文件改回原名等待重试，不留在领取状态
+            self.logger.exception(f"发送通知时发生错误: {message['title']}: {e}")
+            code = None
+        if code in _DONE_CODES:
+            try:
+                os.remove(claimed)
+            except OSError:
+                pass
+            self._forget(name)
+            return
+
+        message["attempts"] += 1
+        if message["attempts"] >= self.max_attempts:
+            self.logger.error(f"通知发送 {message['attempts']} 次仍失败，移到 {self.failed_dir}: {message['title']}")
+            os.replace(claimed, os.path.join(self.failed_dir, name))
+            self._forget(name)
+            return
+        delay = min(self.max_delay, self.base_delay * (2 ** (message["attempts"] - 1)))
+        delay *= random.uniform(0.5, 1.0)
+        message["next_attempt"] = time.time() + delay
+        self.logger.warning(f"通知发送失败（{code}），{delay:.1f} 秒后第 {message['attempts'] + 1} 次发送: {message['title']}")
+        # 先更新领取的文件再改回原名，其他进程看到的始终是完整的消息
+        self._write(claim_name, message)
+        os.rename(claimed, path)
+        self._schedule(message["next_attempt"], name)
+
+    def _forget(self, name):
+        with self._lock:
+            self._known.discard(name)
+            metrics.set("qiandao_notify_pending", len(self._known))
+
+    def _send(self, message):
+        channel = message["channel"]
+        with self._channel_locks[channel]:
+            # 同一渠道的消息按最短间隔依次发送
+            interval = self._intervals.get(channel, 0)
+            wait = self._last_sent.get(channel, 0) + interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            with metrics.timer("qiandao_notify_duration_seconds", channel=channel):
+                if channel == CHANNEL_DINGDING:
+                    response = self.notifier.get_dingding(message["title"], message["text"])
+                else:
+                    response = self.notifier.get_mail(message["title"], message["text"], message.get("attachment"))
+            self._last_sent[channel] = time.monotonic()
+        code = response.get("code")
+        metrics.inc("qiandao_notify_outcomes_total", channel=channel, code=code)
+        return code
+
+    def _idle(self):
+        with self._lock:
+            due = bool(self._heap) and self._heap[0][0] <= time.time()
+            return self._inbox.empty() and not due and self._in_flight == 0
+
+    def flush(self, timeout=30.0):
+        """
+        功能描述: 等待已提交的通知发送完毕（等待重试的消息不计在内），用于只执行一次任务就退出的场景
+        参数:
+            timeout: 最长等待秒数
+        返回值: 全部发送完毕返回 True，超时返回 False（未发送的消息仍在待发送目录中）
+        异常描述: 无
+        调用演示:
+            outbox.flush(30)
+        """
+        if not self._threads:
+            return True
+        deadline = time.monotonic() + timeout
+        # 内存队列刚取出、尚未登记的消息短暂不在任何计数中，连续两次空闲才算发送完毕
+        idle_checks = 0
+        while time.monotonic() < deadline:
+            idle_checks = idle_checks + 1 if self._idle() else 0
+            if idle_checks >= 2:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def stop(self, timeout=5.0):
+        """等待正在发送的通知（最多 timeout 秒）后停止后台线程，未发送的消息留在待发送目录中"""
+        if not self._threads:
+            return
+        self.flush(timeout)
+        self._inbox.put(_STOP)
+        for _ in range(self.workers):
+            self._ready.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
@@ -0,0 +1,347 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:  # 写入历史不需要 numpy，只有查询统计时才需要
+    np = None
+
+# 日期按 date.toordinal() 保存为整数，查询时可以直接做数组运算
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS points (
+    account_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    accrued INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    PRIMARY KEY (account_id, day)
+) WITHOUT ROWID;
+"""
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _day(value):
+    """date / 'YYYY-MM-DD' / 序数 -> 序数，None 原样返回"""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.toordinal()
+
+
+def _iso(day):
+    return date.fromordinal(int(day)).isoformat()
+
+
+class PointsHistory:
+    """
+    功能描述: 积分历史库（SQLite），每个账号每天一条 (累计积分, 当前积分)，按 (账号, 日期) 建立主键索引；
+              签到过程中先缓存在内存中，每 batch_size 条在一个事务中批量写入；
+              多个分片进程可以同时写入（WAL 模式，写入冲突时等待）
+    参数:
+        path: 数据库文件路径
+        batch_size: 累计多少条记录写入一次
+    返回值: 无
+    异常描述: 数据库无法打开或写入时抛出 sqlite3.Error
+    调用演示:
+        history = PointsHistory("data_/points.sqlite3")
+        history.record("user123", 120, 30)
+        history.close()
+        series = history.load(since="2025-01-01")
+    """
+
+    def __init__(self, path="data_/points.sqlite3", batch_size=200):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._pending = []  # (用户名, 日期序数, 累计积分, 当前积分)
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        功能描述: 根据 config.ini 的 [POINTS] 段打开积分历史库，未启用时返回None
+        参数:
+            config: 已读取配置文件的 ConfigParser
+        返回值: PointsHistory 实例或 None
+        异常描述: 数值配置格式错误时抛出 ValueError，数据库无法打开时抛出 sqlite3.Error
+        调用演示:
+            history = PointsHistory.from_config(config)
+        """
+        if not config.getboolean('POINTS', 'enabled', fallback=True):
+            return None
+        return cls(
+            path=config.get('POINTS', 'path', fallback="data_/points.sqlite3"),
+            batch_size=config.getint('POINTS', 'batch_size', fallback=200),
+        )
+
+    def record(self, username, accrued, total, day=None):
+        """
+        功能描述: 记录一个账号当天的积分，同一账号同一天多次记录时以最后一次为准
+        参数:
+            username: 用户名
+            accrued: 累计积分
+            total: 当前积分
+            day: 日期（date / 'YYYY-MM-DD'），默认今天
+        返回值: 无
+        异常描述: 批量写入失败时抛出 sqlite3.Error
+        调用演示:
+            history.record("user123", 120, 30)
+        """
+        accrued, total = _to_int(accrued), _to_int(total)
+        if accrued is None or total is None:
+            return
+        with self._lock:
+            self._pending.append((username, _day(day) or date.today().toordinal(), accrued, total))
+            if len(self._pending) < self.batch_size:
+                return
+            pending, self._pending = self._pending, []
+        self._write(pending)
+
+    def _write(self, pending):
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR IGNORE INTO accounts (username) VALUES (?)",
+                                         ((username,) for username, _, _, _ in pending))
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO points (account_id, day, accrued, total) "
+                "SELECT id, ?, ?, ? FROM accounts WHERE username = ?",
+                ((day, accrued, total, username) for username, day, accrued, total in pending))
+
+    def flush(self):
+        """写入缓存中的记录"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            self._write(pending)
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def load(self, since=None, until=None, usernames=None):
+        """
+        功能描述: 读取积分历史，按 (账号, 日期) 排序，每列一个数组
+        参数:
+            since / until: 起止日期（含），为空时不限
+            usernames: 只读取这些账号，为空时读取全部账号
+        返回值: PointsSeries 实例
+        异常描述: 没有安装 numpy 时抛出 RuntimeError
+        调用演示:
+            series = history.load(since="2025-01-01", usernames=["user123"])
+        """
+        if np is None:
+            raise RuntimeError("积分历史统计需要安装 numpy")
+        self.flush()
+        sql = "SELECT account_id, day, accrued, total FROM points WHERE day BETWEEN ? AND ?"
+        params = [_day(since) or 0, _day(until) or date.max.toordinal()]
+        if usernames:
+            sql += f" AND account_id IN (SELECT id FROM accounts WHERE username IN ({','.join('?' * len(usernames))}))"
+            params += list(usernames)
+        # 主键就是 (account_id, day)，按主键顺序读取不需要额外排序
+        rows = self._connection.execute(sql + " ORDER BY account_id, day", params)
+        data = np.fromiter(rows, dtype=PointsSeries.DTYPE)
+        names = dict(self._connection.execute("SELECT id, username FROM accounts"))
+        return PointsSeries(data, names)
+
+
+class PointsSeries:
+    """
+    功能描述: 按 (账号, 日期) 排序的积分历史；趋势、逐日增量和积分停止增长的检测都是整列的数组运算，
+              不逐个账号循环，几年的历史、上千个账号也只需要很短时间
+    参数:
+        data: DTYPE 结构的 numpy 数组，已按 (account, day) 排序
+        names: {账号ID: 用户名}
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        series = history.load()
+        trends = series.trends()
+        stalled = series.stalled(min_days=3)
+    """
+
+    DTYPE = [("account", "i8"), ("day", "i8"), ("accrued", "i8"), ("total", "i8")]
+
+    def __init__(self, data, names):
+        self.account = data["account"]
+        self.day = data["day"]
+        self.accrued = data["accrued"]
+        self.total = data["total"]
+        self._names = names
+
+    def __len__(self):
+        return len(self.account)
+
+    def _groups(self):
+        """每个账号在数组中的起止位置 (starts, ends)"""
+        change = np.flatnonzero(self.account[1:] != self.account[:-1]) + 1
+        starts = np.concatenate(([0], change)) if len(self) else np.zeros(0, dtype=np.int64)
+        ends = np.concatenate((change, [len(self)])) if len(self) else np.zeros(0, dtype=np.int64)
+        return starts, ends
+
+    def _usernames(self, account_ids):
+        lookup = np.empty(max(self._names, default=0) + 1, dtype=object)
+        lookup[list(self._names)] = list(self._names.values())
+        return lookup[account_ids]
+
+    def trends(self):
+        """
+        功能描述: 每个账号在时间范围内的积分趋势
+        参数: 无
+        返回值: {列名: 数组}，列为 username / first_day / last_day / records / accrued / total /
+                gained（期间累计积分增加）/ per_day（平均每天增加）
+        异常描述: 无
+        调用演示:
+            trends = series.trends()
+        """
+        starts, ends = self._groups()
+        last = ends - 1
+        gained = self.accrued[last] - self.accrued[starts]
+        span = self.day[last] - self.day[starts]
+        per_day = np.divide(gained, span, out=np.zeros(len(starts)), where=span > 0)
+        return {
+            "username": self._usernames(self.account[starts]),
+            "first_day": self.day[starts],
+            "last_day": self.day[last],
+            "records": ends - starts,
+            "accrued": self.accrued[last],
+            "total": self.total[last],
+            "gained": gained,
+            "per_day": per_day,
+        }
+
+    def daily_deltas(self):
+        """
+        功能描述: 同一账号相邻两条记录之间的积分变化；中间缺了几天时按天数平均
+        参数: 无
+        返回值: {列名: 数组}，列为 username / day / accrued / delta（累计积分变化）/
+                total_delta（当前积分变化）/ gap（距上一条记录的天数）/ per_day
+        异常描述: 无
+        调用演示:
+            deltas = series.daily_deltas()
+        """
+        index = np.flatnonzero(self.account[1:] == self.account[:-1]) + 1
+        delta = self.accrued[index] - self.accrued[index - 1]
+        gap = self.day[index] - self.day[index - 1]
+        return {
+            "username": self._usernames(self.account[index]),
+            "day": self.day[index],
+            "accrued": self.accrued[index],
+            "delta": delta,
+            "total_delta": self.total[index] - self.total[index - 1],
+            "gap": gap,
+            "per_day": delta / gap,
+        }
+
+    def stalled(self, min_days=3, as_of=None):
+        """
+        功能描述: 找出累计积分已有 min_days 天没有增加的账号（签到持续失败，或没有记录到积分）；
+                  账号的第一条记录视为一次增加，只有一条记录的账号从这一天开始计算
+        参数:
+            min_days: 至少多少天没有增加
+            as_of: 计算到哪一天，默认今天
+        返回值: {列名: 数组}，按停止天数从多到少排序，列为 username / last_increase / last_day / accrued / days
+        异常描述: 无
+        调用演示:
+            stalled = series.stalled(min_days=3)
+        """
+        as_of = _day(as_of) or date.today().toordinal()
+        starts, ends = self._groups()
+        increased = np.zeros(len(self), dtype=bool)
+        increased[1:] = (self.account[1:] == self.account[:-1]) & (self.accrued[1:] > self.accrued[:-1])
+        increased[starts] = True
+        last_increase = np.maximum.reduceat(np.where(increased, self.day, -1), starts) if len(starts) else starts
+        days = as_of - last_increase
+        order = np.argsort(-days, kind="stable")
+        order = order[days[order] >= min_days]
+        last = (ends - 1)[order]
+        return {
+            "username": self._usernames(self.account[starts][order]),
+            "last_increase": last_increase[order],
+            "last_day": self.day[last],
+            "accrued": self.accrued[last],
+            "days": days[order],
+        }
+
+
+def _print_table(header, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        sys.stdout.write("  ".join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip() + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="查询积分历史：账号积分趋势、逐日增量和积分停止增长的账号")
+    parser.add_argument("--db", default="data_/points.sqlite3", help="积分历史库路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    trend = subparsers.add_parser("trend", help="每个账号在时间范围内的积分增加和平均每天增加")
+    trend.add_argument("--account", action="append", help="账号（用户名），可重复指定，默认全部账号")
+    trend.add_argument("--since", help="起始日期，如 2025-06-01")
+    trend.add_argument("--until", help="结束日期，如 2025-06-30")
+    trend.add_argument("--top", type=int, default=0, help="按积分增加从少到多只列出前几个账号，0表示全部")
+    deltas = subparsers.add_parser("deltas", help="账号每天的积分变化")
+    deltas.add_argument("--account", action="append", required=True, help="账号（用户名），可重复指定")
+    deltas.add_argument("--since", help="起始日期")
+    deltas.add_argument("--until", help="结束日期")
+    stalled = subparsers.add_parser("stalled", help="累计积分连续几天没有增加的账号")
+    stalled.add_argument("--days", type=int, default=3, help="至少多少天没有增加")
+    stalled.add_argument("--as-of", help="计算到哪一天，默认今天")
+    stalled.add_argument("--since", help="只读取这一天之后的历史，历史很长时加快查询；更早的增加不计入")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"积分历史库不存在: {args.db}")
+    history = PointsHistory(args.db)
+    started = time.perf_counter()
+    try:
+        if args.command == "trend":
+            series = history.load(args.since, args.until, args.account)
+            result = series.trends()
+            order = np.argsort(result["gained"], kind="stable")
+            if args.top:
+                order = order[:args.top]
+            rows = [(result["username"][i], _iso(result["first_day"][i]), _iso(result["last_day"][i]),
+                     result["records"][i], result["accrued"][i], result["total"][i], result["gained"][i],
+                     f"{result['per_day'][i]:.2f}") for i in order]
+            _print_table(("账号", "起始日期", "最后日期", "记录数", "累计积分", "当前积分", "增加", "平均每天"), rows)
+        elif args.command == "deltas":
+            series = history.load(args.since, args.until, args.account)
+            result = series.daily_deltas()
+            rows = [(result["username"][i], _iso(result["day"][i]), result["accrued"][i], result["delta"][i],
+                     result["total_delta"][i], result["gap"][i], f"{result['per_day'][i]:.2f}")
+                    for i in range(len(result["day"]))]
+            _print_table(("账号", "日期", "累计积分", "增加", "当前积分变化", "间隔天数", "平均每天"), rows)
+        else:
+            series = history.load(args.since, args.as_of)
+            result = series.stalled(args.days, args.as_of)
+            rows = [(result["username"][i], _iso(result["last_increase"][i]), _iso(result["last_day"][i]),
+                     result["accrued"][i], result["days"][i]) for i in range(len(result["days"]))]
+            _print_table(("账号", "最后一次增加", "最后记录", "累计积分", "未增加天数"), rows)
+        sys.stdout.write(f"\n共 {len(series)} 条记录，耗时 {time.perf_counter() - started:.3f} 秒\n")
+    except BrokenPipeError:
+        pass
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+import dark_log
+from captcha_solver import JfbymSolver, LocalSolver
+from dark_log import DarkLog
+from http_pool import HttpPool
+from push_ddmail import Dingdingmail
+
+
+class SamplingProfiler:
+    """
+    功能描述: 采样分析器，后台线程每隔 interval 秒记录一次所有线程的调用栈，
+              能覆盖线程池中执行的HTTP请求和验证码识别（cProfile 只统计启用它的线程）；
+              结果可导出为 flamegraph.pl / speedscope 使用的折叠栈格式
+    参数:
+        interval: 采样间隔（秒）
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        sampler = SamplingProfiler(0.005)
+        sampler.start()
+        ...
+        sampler.stop()
+        sampler.write_folded("log_/profile.folded")
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = {}  # 折叠栈 "线程;外层函数;...;内层函数" -> 采样次数
+        self.samples = 0
+        self._frame_names = {}  # 代码对象 -> 显示名称
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _frame_name(self, code):
+        name = self._frame_names.get(code)
+        if name is None:
+            name = self._frame_names[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return name
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            # 线程池中的线程名带序号，去掉序号后同类线程合并统计
+            names = {thread.ident: re.sub(r'_\d+$', '', thread.name) for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_folded(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+    def top(self, limit=30):
+        """返回 (按自身采样数排序, 按包含子调用的采样数排序) 的前 limit 个函数"""
+        own, inclusive = {}, {}
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            own[frames[-1]] = own.get(frames[-1], 0) + count
+            for frame in set(frames):
+                inclusive[frame] = inclusive.get(frame, 0) + count
+        by_count = lambda item: item[1]
+        return (sorted(own.items(), key=by_count, reverse=True)[:limit],
+                sorted(inclusive.items(), key=by_count, reverse=True)[:limit])
+
+
+class SpanTracer:
+    """
+    功能描述: 记录HTTP请求、验证码识别、通知和 DarkLog 调用的实际耗时（wall-clock），
+              通过替换这些方法实现，只在分析模式下安装，平时没有任何开销；
+              结果可导出为 Chrome trace 格式（chrome://tracing 或 https://ui.perfetto.dev 打开）
+    参数: 无
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        tracer = SpanTracer()
+        tracer.install()
+        ...
+        tracer.uninstall()
+        tracer.write_trace("log_/profile_trace.json")
+    """
+
+    # (类, 方法名, 分类)
+    TARGETS = (
+        (HttpPool, "post", "http"),
+        (JfbymSolver, "solve", "solver.jfbym"),
+        (LocalSolver, "solve", "solver.local"),
+        (Dingdingmail, "get_dingding", "notify.dingding"),
+        (Dingdingmail, "get_mail", "notify.mail"),
+        (DarkLog, "_log_with_console_control", "dark_log"),
+        (DarkLog, "exception", "dark_log"),
+        (DarkLog, "log_exception", "dark_log"),
+    )
+
+    def __init__(self):
+        self.spans = []  # (分类, 说明, 线程ID, 开始时间, 耗时)，list.append 本身是线程安全的
+        self._originals = []
+        self._origin = time.perf_counter()
+
+    def _wrap(self, category, func):
+        spans = self.spans
+
+        @functools.wraps(func)
+        def traced(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                detail = ""
+                if category == "http" and len(args) > 1:
+                    detail = urllib.parse.urlsplit(args[1]).path
+                spans.append((category, detail, threading.get_ident(), started, time.perf_counter() - started))
+
+        return traced
+
+    def install(self):
+        for owner, name, category in self.TARGETS:
+            original = owner.__dict__[name]
+            traced = self._wrap(category, original)
+            self._originals.append((owner, name, original))
+            setattr(owner, name, traced)
+        # DarkLog 按文件名跳过自身的调用帧来确定日志的调用位置，包装函数也要跳过
+        dark_log._CODE_INFO[traced.__code__] = (True, "profiler.py", "traced")
+
+    def uninstall(self):
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+
+    def write_trace(self, path):
+        events = []
+        for category, detail, thread, started, duration in self.spans:
+            events.append({
+                "name": f"{category} {detail}".strip(),
+                "cat": category,
+                "ph": "X",
+                "ts": round((started - self._origin) * 1e6, 1),
+                "dur": round(duration * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": thread,
+            })
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self):
+        """按 分类 + 说明 统计次数、总耗时、平均、p95 和最大耗时，按总耗时从大到小排序"""
+        groups = {}
+        for category, detail, _, _, duration in self.spans:
+            groups.setdefault(f"{category} {detail}".strip(), []).append(duration)
+        rows = []
+        for name, durations in groups.items():
+            durations.sort()
+            p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+            rows.append((name, len(durations), sum(durations), sum(durations) / len(durations), p95, durations[-1]))
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows
+
+
+def profile_run(func, output_dir="log_", interval=0.005, top=30):
+    """
+    功能描述: 在采样分析和耗时追踪下执行一次 func，结果写入 output_dir：
+              profile_时间.folded（火焰图折叠栈）、profile_时间_trace.json（Chrome trace）、
+              profile_时间.txt（耗时最多的函数和各类调用的耗时统计）
+    参数:
+        func: 要分析的函数，如 job
+        output_dir: 输出目录
+        interval: 采样间隔（秒）
+        top: 汇总中列出的函数个数
+    返回值: (func 的返回值, 汇总文件路径)
+    异常描述: func 抛出的异常在写完分析结果后继续抛出
+    调用演示:
+        summaries, report = profile_run(job)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    prefix = os.path.join(output_dir, f"profile_{datetime.now():%Y%m%d_%H%M%S}")
+    sampler = SamplingProfiler(interval)
+    tracer = SpanTracer()
+    tracer.install()
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        elapsed = time.perf_counter() - started
+        sampler.stop()
+        tracer.uninstall()
+        sampler.write_folded(prefix + ".folded")
+        tracer.write_trace(prefix + "_trace.json")
+        _write_summary(prefix + ".txt", elapsed, sampler, tracer, top)
+    return result, prefix + ".txt"
+
+
+def _write_summary(path, elapsed, sampler, tracer, top):
+    own, inclusive = sampler.top(top)
+    total = sum(sampler.stacks.values()) or 1
+    lines = [
+        f"总耗时: {elapsed:.3f} 秒，采样 {sampler.samples} 次（间隔 {sampler.interval * 1000:.1f} ms，所有线程共 {total} 个调用栈）",
+        "",
+        "各类调用的实际耗时（多个线程并发时总和可能超过总耗时）:",
+        f"{'调用':<40} {'次数':>8} {'总耗时(s)':>10} {'平均(ms)':>10} {'p95(ms)':>10} {'最大(ms)':>10}",
+    ]
+    for name, count, duration, average, p95, longest in tracer.summary():
+        lines.append(f"{name:<40} {count:>8} {duration:>10.3f} {average * 1000:>10.2f} {p95 * 1000:>10.2f} "
+                     f"{longest * 1000:>10.2f}")
+    lines += ["", f"自身耗时最多的 {top} 个函数（占全部采样的比例）:"]
+    lines += [f"{count / total:>7.1%}  {frame}" for frame, count in own]
+    lines += ["", f"包含子调用耗时最多的 {top} 个函数:"]
+    lines += [f"{count / total:>7.1%}  {frame}" for frame, count in inclusive]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
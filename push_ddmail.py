@@ -7,14 +7,58 @@ import urllib.parse
 import requests
 import logging.handlers
 import inspect
-import configparser
 import traceback
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
+from email.mime.base import MIMEBase
+from email import encoders
+import mimetypes
 import os
+import threading
+from app_config import load_config
 from dark_log import DarkLog
+from smtp_pool import SmtpPool
+
+
+def _attachment_part(path):
+    """按扩展名确定附件类型并编码为base64；smtplib 发送的是完整的邮件字符串，附件会整个读入内存，
+    大小由调用方限制（运行报表超过 [REPORT] max_attachment_mb 时不作为附件）"""
+    ctype, encoding = mimetypes.guess_type(path)
+    if ctype is None or encoding is not None:
+        ctype = "application/octet-stream"
+    maintype, subtype = ctype.split("/", 1)
+    part = MIMEBase(maintype, subtype, name=os.path.basename(path))
+    with open(path, 'rb') as f:
+        part.set_payload(f.read())
+    encoders.encode_base64(part)
+    part['Content-Disposition'] = f'attachment; filename="{os.path.basename(path)}"'
+    return part
+
+
+# 进程内共享的SMTP连接池，邮件配置修改后换一个新的
+_smtp = None
+_smtp_lock = threading.Lock()
+
+
+def _smtp_pool(settings):
+    """返回与当前邮件配置一致的SMTP连接池"""
+    global _smtp
+    config = load_config()
+    pool = SmtpPool(
+        settings.smtp_host, settings.smtp_port, settings.smtp_ssl, settings.sender, settings.password,
+        timeout=config.value('NOTIFY', 'timeout', fallback=10.0),
+        max_connections=config.value('EMAIL', 'smtp_max_connections', fallback=2),
+        idle_timeout=config.value('EMAIL', 'smtp_idle_timeout', fallback=300.0),
+        check_after=config.value('EMAIL', 'smtp_check_after', fallback=10.0),
+        max_messages=config.value('EMAIL', 'smtp_max_messages', fallback=100),
+    )
+    with _smtp_lock:
+        if _smtp is not None and _smtp.key == pool.key:
+            return _smtp
+        if _smtp is not None:
+            _smtp.close()
+        _smtp = pool
+        return pool
 
 
 # logger.set_console_output(False) # 默认打印日志
@@ -25,7 +69,7 @@ class Dingdingmail:
     @staticmethod
     def get_config(value_name):
         """
-        功能描述: 返回config/config.ini中配置文件对于值
+        功能描述: 返回config/config.ini中配置文件对于值，配置文件只解析一次，修改后自动重新读取（见 app_config.load_config）
         参数:
             value_name : 需要获取的字段名
         返回值:
@@ -33,15 +77,7 @@ class Dingdingmail:
         调用演示:
             secret = self.get_config('secret')
         """
-        config = configparser.ConfigParser()
-        config.read('config/config.ini')
-        sections = config.sections()
-        for section in sections:  # 循环[n+1]
-            options = config.options(section)
-            for option in options:  # 循环详细的字段
-                value = config.get(section, option)
-                if value_name == option:
-                    return value
+        return load_config().option(value_name)
 
     def get_dingding(self, title_="", text_=""):
         """
@@ -62,10 +98,11 @@ class Dingdingmail:
             proxylog.get_dingding("测试标题", "这个是测试内容")
         """
         timestamp = str(round(time.time() * 1000))
-        dingding_secret = self.get_config('dingding_secret')
-        dingding_access_token = self.get_config('dingding_access_token')
-        dingding_userid = self.get_config('dingding_userid')
-        if dingding_secret == '' or dingding_access_token == '' or dingding_userid == '':
+        settings = load_config().dingding
+        dingding_secret = settings.secret
+        dingding_access_token = settings.access_token
+        dingding_userid = settings.userid
+        if not settings.enabled:
             self.logger.error(f"配置文件为空,跳过钉钉通知",True)
             return {"code": 404, "data": "配置文件为空,跳过钉钉通知"}
         secret_enc = dingding_secret.encode('utf-8')
@@ -74,7 +111,7 @@ class Dingdingmail:
         hmac_code = hmac.new(secret_enc, string_to_sign_enc, digestmod=hashlib.sha256).digest()
         sign = urllib.parse.quote_plus(base64.b64encode(hmac_code))
 
-        url = f"https://oapi.dingtalk.com/robot/send?access_token={dingding_access_token}&timestamp={timestamp}&sign={sign}"
+        url = f"{settings.base_url}/robot/send?access_token={dingding_access_token}&timestamp={timestamp}&sign={sign}"
         data = {
             "msgtype": "markdown",
             "markdown": {
@@ -89,8 +126,9 @@ class Dingdingmail:
             }
         }
         try:
-            dingding_ = requests.post(url, json=data).json()
-            if dingding_["errcode"] == 300005 or dingding_["errcode"] == 310000:
+            dingding_ = requests.post(url, json=data, timeout=load_config().value('NOTIFY', 'timeout', fallback=10.0)).json()
+            # 300005/310000 为令牌或签名错误，410100 为发送过快被限流，其他非0错误码也视为发送失败
+            if dingding_.get("errcode") != 0:
                 self.logger.error(dingding_,True)
                 return {"code": 403, "data": dingding_}
             self.logger.info(f"Request title: {title_} text:{text_}",False)
@@ -109,13 +147,13 @@ class Dingdingmail:
         参数；
                 subject_text: 邮件主题
                 content_text: 邮件正文
-                xlsx_file: xlsx文件的路径
+                xlsx_file: 附件路径（xlsx、csv、zip 等，按扩展名确定类型）
         :return:
         """
 
         def send_email(sender, password, receiver, subject, content, xlsx_file_path):
             """
-            使用163邮箱发送带有xlsx附件的邮件
+            使用163邮箱发送带有附件的邮件
 
             参数:
                 sender: 发件人邮箱（163邮箱）
@@ -123,7 +161,7 @@ class Dingdingmail:
                 receiver: 收件人邮箱，可以是字符串或列表
                 subject: 邮件主题
                 content: 邮件正文
-                xlsx_file_path: xlsx文件的路径
+                xlsx_file_path: 附件路径
             """
             # 创建邮件对象
             msg = MIMEMultipart()
@@ -141,42 +179,32 @@ class Dingdingmail:
             # 添加邮件正文
             msg.attach(MIMEText(content, 'html', 'utf-8'))
 
-            # 添加xlsx附件
+            # 添加附件
             if xlsx_file_path and os.path.exists(xlsx_file_path):
-                with open(xlsx_file_path, 'rb') as f:
-                    xlsx_part = MIMEApplication(f.read(), Name=os.path.basename(xlsx_file_path))
-
-                # 设置附件头信息
-                xlsx_part['Content-Disposition'] = f'attachment; filename="{os.path.basename(xlsx_file_path)}"'
-                msg.attach(xlsx_part)
+                msg.attach(_attachment_part(xlsx_file_path))
             elif xlsx_file_path:
-                self.logger.warning(f"找不到指定的xlsx文件: {xlsx_file_path}, 邮件将不带附件发送。")
+                self.logger.warning(f"找不到指定的附件: {xlsx_file_path}, 邮件将不带附件发送。")
 
 
-            # 连接163邮箱服务器并发送邮件
+            # 通过复用的已登录连接发送邮件，默认使用163邮箱的SSL端口465
             try:
-                server = smtplib.SMTP_SSL('smtp.163.com', 465)  # 163邮箱使用SSL，端口465
-                server.login(sender, password)  # 登录
-
-                # 发送邮件
+                pool = _smtp_pool(settings)
                 if isinstance(receiver, list):
-                    server.sendmail(sender, receiver, msg.as_string())
+                    pool.send(sender, receiver, msg.as_string())
                 else:
-                    server.sendmail(sender, [receiver], msg.as_string())
-
-                server.quit()  # 关闭连接
+                    pool.send(sender, [receiver], msg.as_string())
                 self.logger.info(f"邮件发送成功!",True)
                 return True
             except Exception as e:
                 self.logger.exception(f"邮件发送失败: {str(e)}",False)
                 return False
-        email_sender = self.get_config('email_sender')
-        email_pass = self.get_config('email_pass')
-        receiver_email = self.get_config('receiver_email')
-        if email_sender == '' or email_pass == '' or receiver_email == '':
+        settings = load_config().email
+        if not settings.enabled:
             self.logger.error(f"配置文件为空,跳过邮件通知",True)
             return {"code": 404, "data": "配置文件为空,跳过邮件通知"}
         else:
-            send_email(email_sender, email_pass, receiver_email, subject_text, content_text, xlsx_file)
+            if send_email(settings.sender, settings.password, settings.receivers, subject_text, content_text, xlsx_file):
+                return {"code": 200, "data": "邮件发送成功"}
+            return {"code": 500, "data": "邮件发送失败"}
         # if email_sender is not None and email_pass is not None and receiver_email is not None:
         #     send_email(email_sender,email_pass,receiver_email,subject_text,content_text,xlsx_file)
@@ -0,0 +1,177 @@
+import random
+import time
+
+import requests
+
+# 签到流程的各个阶段
+STAGE_CAPTCHA = "captcha"
+STAGE_SOLVE = "solve"
+STAGE_LOGIN = "login"
+STAGE_CHECK_IN = "check_in"
+STAGE_POINTS = "points"  # 查询积分，失败不重试，只用于日志和统计
+
+# 失败类型
+TRANSIENT = "transient"  # 网络异常、超时、服务端5xx，稍后重试
+BAD_CAPTCHA = "bad_captcha"  # 验证码识别失败或答案错误，换一张验证码重试
+BAD_CREDENTIALS = "bad_credentials"  # 用户名或密码错误，重试也没用
+FATAL = "fatal"  # 其他不可重试的错误
+
+# 登录失败信息中的关键字，按顺序匹配
+_CAPTCHA_KEYWORDS = ("验证码", "captcha")
+_CREDENTIAL_KEYWORDS = ("密码", "用户名", "账号", "帐号", "用户不存在", "锁定", "禁用", "password", "username")
+
+
+def classify_exception(exc):
+    """
+    功能描述: 判断请求异常是否值得重试
+    参数:
+        exc: 请求过程中捕获的异常
+    返回值: TRANSIENT 或 FATAL
+    异常描述: 无
+    调用演示:
+        kind = classify_exception(e)
+    """
+    if isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return TRANSIENT
+    if isinstance(exc, requests.exceptions.HTTPError):
+        status = exc.response.status_code if exc.response is not None else 500
+        return TRANSIENT if status >= 500 or status == 429 else FATAL
+    # 响应格式不对等其他异常，多半是服务端临时异常返回了错误页面
+    return TRANSIENT
+
+
+def classify_login_failure(data):
+    """
+    功能描述: 根据登录接口返回的内容区分验证码错误和账号密码错误
+    参数:
+        data: 登录接口返回的JSON
+    返回值: BAD_CAPTCHA / BAD_CREDENTIALS / TRANSIENT
+    异常描述: 无
+    调用演示:
+        kind = classify_login_failure({"status": 400, "message": "验证码错误"})
+    """
+    text = f"{data.get('message', '')} {data.get('data', '')}".lower()
+    if any(keyword in text for keyword in _CAPTCHA_KEYWORDS):
+        return BAD_CAPTCHA
+    if any(keyword in text for keyword in _CREDENTIAL_KEYWORDS):
+        return BAD_CREDENTIALS
+    status = data.get("status")
+    if isinstance(status, int) and status >= 500:
+        return TRANSIENT
+    return BAD_CAPTCHA
+
+
+class Deadline:
+    """
+    功能描述: 整个 job() 的截止时间，超过后不再重试、不再开始新账号
+    参数:
+        seconds: 距现在的秒数，小于等于0表示不限时
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        deadline = Deadline(3600)
+        if deadline.expired(): ...
+    """
+
+    def __init__(self, seconds=0):
+        self.at = time.monotonic() + seconds if seconds > 0 else None
+
+    def remaining(self):
+        if self.at is None:
+            return float('inf')
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self):
+        return self.at is not None and time.monotonic() >= self.at
+
+
+class RetryPolicy:
+    """
+    功能描述: 重试策略：指数退避 + 随机抖动，每个阶段单独的失败预算，以及整个任务的截止时间
+    参数:
+        max_attempts: 验证码→登录 整条链路的最大尝试次数
+        base_delay: 第一次重试前的等待秒数，之后每次翻倍
+        max_delay: 单次等待的上限（秒）
+        jitter: 抖动比例（0~1），实际等待在 [delay*(1-jitter), delay] 之间随机
+        stage_budgets: {阶段: 该阶段允许的最大失败次数}
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        policy = RetryPolicy(max_attempts=3, base_delay=2, max_delay=30)
+        retry = policy.start(deadline)
+        if retry.record_failure(STAGE_LOGIN, BAD_CAPTCHA):
+            time.sleep(retry.next_delay())
+    """
+
+    DEFAULT_BUDGETS = {STAGE_CAPTCHA: 3, STAGE_SOLVE: 3, STAGE_LOGIN: 3, STAGE_CHECK_IN: 2}
+
+    def __init__(self, max_attempts=3, base_delay=2.0, max_delay=30.0, jitter=0.5, stage_budgets=None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.stage_budgets = dict(self.DEFAULT_BUDGETS)
+        self.stage_budgets.update(stage_budgets or {})
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        功能描述: 根据 config.ini 的 [RETRY] 段创建重试策略
+        参数:
+            config: 已读取配置文件的 ConfigParser
+        返回值: RetryPolicy 实例
+        异常描述: 配置值不是数字时抛出 ValueError
+        调用演示:
+            policy = RetryPolicy.from_config(config)
+        """
+        budgets = {
+            stage: config.getint('RETRY', f'{stage}_budget', fallback=default)
+            for stage, default in cls.DEFAULT_BUDGETS.items()
+        }
+        return cls(
+            max_attempts=config.getint('RETRY', 'max_attempts', fallback=3),
+            base_delay=config.getfloat('RETRY', 'base_delay', fallback=2.0),
+            max_delay=config.getfloat('RETRY', 'max_delay', fallback=30.0),
+            jitter=config.getfloat('RETRY', 'jitter', fallback=0.5),
+            stage_budgets=budgets,
+        )
+
+    def start(self, deadline=None):
+        """为一个账号创建重试状态"""
+        return RetryState(self, deadline or Deadline())
+
+
+class RetryState:
+    """单个账号的重试状态，记录各阶段的失败次数"""
+
+    def __init__(self, policy, deadline):
+        self.policy = policy
+        self.deadline = deadline
+        self.failures = {}
+        self.last_kind = None
+
+    def record_failure(self, stage, kind):
+        """
+        功能描述: 记录一次失败并判断是否还应重试
+        参数:
+            stage: 失败的阶段
+            kind: 失败类型
+        返回值: True 表示可以重试
+        异常描述: 无
+        调用演示:
+            if not retry.record_failure(STAGE_LOGIN, kind): break
+        """
+        self.last_kind = kind
+        self.failures[stage] = self.failures.get(stage, 0) + 1
+        if kind in (BAD_CREDENTIALS, FATAL):
+            return False
+        if self.failures[stage] >= self.policy.stage_budgets.get(stage, self.policy.max_attempts):
+            return False
+        return not self.deadline.expired()
+
+    def next_delay(self):
+        """按已失败次数计算下次重试前的等待秒数，不会超过截止时间"""
+        attempt = sum(self.failures.values())
+        delay = min(self.policy.max_delay, self.policy.base_delay * (2 ** max(0, attempt - 1)))
+        delay *= random.uniform(1.0 - self.policy.jitter, 1.0)
+        return min(delay, self.deadline.remaining())
@@ -0,0 +1,215 @@
+import csv
+import glob
+import os
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # 没有安装 openpyxl 时只能生成 csv
+    Workbook = None
+
+from dark_log import DarkLog
+from sign_result import TIMED_STAGES
+
+# 报表中记录耗时的阶段，每个阶段一列
+REPORT_STAGES = TIMED_STAGES
+
+COLUMNS = (("username", "status", "checkin_state", "accrued", "total", "attempts", "duration_ms")
+           + tuple(f"{stage}_ms" for stage in REPORT_STAGES) + ("finished_at", "detail"))
+
+# 数值列，生成 xlsx 时转换为数字，便于在表格中排序和求和
+NUMERIC_COLUMNS = frozenset(("accrued", "total", "attempts", "duration_ms") + tuple(f"{stage}_ms" for stage in REPORT_STAGES))
+
+# 分片子进程各自写一个 .part.csv，任务结束后由主进程合并
+PART_SUFFIX = ".part.csv"
+
+
+class ReportWriter:
+    """
+    功能描述: 把每个账号的结果逐行写入报表的分段文件，账号结束时写一行，内存中不保留已写入的行
+    参数:
+        path: 分段文件路径
+    返回值: 无
+    异常描述: 文件无法创建时抛出 OSError
+    调用演示:
+        writer = ReportWriter("data_/reports/report_20250101_090000.part.csv")
+        writer.add(result)
+        writer.close()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+
+    def add(self, result):
+        """
+        功能描述: 写入一个账号的结果，说明列为最后一条签到结果
+        参数:
+            result: 已结束的 AccountResult 实例
+        返回值: 无
+        异常描述: 写入失败时抛出 OSError
+        调用演示:
+            writer.add(result)
+        """
+        accrued, total = result.points or ("", "")
+        row = [result.username, result.status, result.checkin_state or "", accrued, total, result.attempts,
+               result.duration_ms]
+        row += [result.stage_ms.get(stage, "") for stage in REPORT_STAGES]
+        row += [datetime.now().strftime('%Y-%m-%d %H:%M:%S'), result.last_message()]
+        with self._lock:
+            self._writer.writerow(row)
+            self.rows += 1
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def _numeric(value):
+    if value == "":
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() else number
+
+
+class RunReport:
+    """
+    功能描述: 一次签到任务的运行报表：各进程在签到过程中逐行写入分段文件，任务结束后由主进程
+              逐行合并成一个 csv 或 xlsx 文件（openpyxl 只写模式），全程内存占用与账号数无关；
+              csv 超过 compress_over 字节时压缩成 zip，作为每日汇总邮件的附件发送
+    参数:
+        directory: 报表目录
+        fmt: csv / xlsx，没有安装 openpyxl 时 xlsx 改为 csv
+        compress_over: csv 超过多少字节时压缩，0表示不压缩（xlsx 本身已压缩）
+        keep_days: 保留最近几天的报表
+        run_id: 本次任务的标识，分片子进程使用主进程的标识，写入同一组分段文件
+    返回值: 无
+    异常描述: 目录无法创建时抛出 OSError
+    调用演示:
+        report = RunReport("data_/reports")
+        writer = report.writer()
+        writer.add(result)
+        writer.close()
+        path = report.finish()
+    """
+
+    def __init__(self, directory="data_/reports", fmt="csv", compress_over=1024 * 1024, keep_days=30, run_id=None):
+        self.directory = directory
+        self.format = fmt.strip().lower()
+        self.compress_over = compress_over
+        self.keep_days = keep_days
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.logger = DarkLog('run_report')
+        if self.format == "xlsx" and Workbook is None:
+            self.logger.warning("没有安装 openpyxl，运行报表改为 csv 格式")
+            self.format = "csv"
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config, run_id=None):
+        """
+        功能描述: 根据 config.ini 的 [REPORT] 段创建运行报表，未启用时返回None
+        参数:
+            config: 已读取配置文件的 ConfigParser
+            run_id: 本次任务的标识，为空时按当前时间生成
+        返回值: RunReport 实例或 None
+        异常描述: 数值配置格式错误时抛出 ValueError
+        调用演示:
+            report = RunReport.from_config(config)
+        """
+        if not config.getboolean('REPORT', 'enabled', fallback=True):
+            return None
+        return cls(
+            directory=config.get('REPORT', 'directory', fallback="data_/reports"),
+            fmt=config.get('REPORT', 'format', fallback="csv"),
+            compress_over=int(config.getfloat('REPORT', 'compress_over_kb', fallback=1024) * 1024),
+            keep_days=config.getint('REPORT', 'keep_days', fallback=30),
+            run_id=run_id,
+        )
+
+    @property
+    def name(self):
+        return f"report_{self.run_id}"
+
+    def writer(self, shard_index=None):
+        """创建本进程的分段文件，分片子进程按分片序号区分"""
+        suffix = f".shard{shard_index}" if shard_index is not None else ""
+        return ReportWriter(os.path.join(self.directory, self.name + suffix + PART_SUFFIX))
+
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(glob.escape(self.directory), glob.escape(self.name) + "*" + PART_SUFFIX)))
+
+    @staticmethod
+    def _rows(parts):
+        """依次读取各分段文件的数据行，跳过每个文件的表头"""
+        for part in parts:
+            with open(part, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                yield from reader
+
+    def finish(self):
+        """
+        功能描述: 合并各分段文件，按配置生成 csv / xlsx，csv 过大时压缩成 zip；删除分段文件和过期的报表
+        参数: 无
+        返回值: 报表文件路径，没有任何分段文件时返回None
+        异常描述: 读写失败时抛出 OSError
+        调用演示:
+            path = report.finish()
+        """
+        parts = self._parts()
+        if not parts:
+            return None
+        started = time.perf_counter()
+        path = os.path.join(self.directory, f"{self.name}.{self.format}")
+        if self.format == "xlsx":
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet("签到结果")
+            sheet.append(COLUMNS)
+            numeric = [column in NUMERIC_COLUMNS for column in COLUMNS]
+            for row in self._rows(parts):
+                sheet.append([_numeric(value) if is_number else value for value, is_number in zip(row, numeric)])
+            workbook.save(path)
+        else:
+            # 带 BOM，Excel 直接打开时中文不乱码
+            with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+                writer.writerows(self._rows(parts))
+        for part in parts:
+            os.remove(part)
+
+        if self.format == "csv" and self.compress_over and os.path.getsize(path) > self.compress_over:
+            archive = os.path.join(self.directory, f"{self.name}.zip")
+            with zipfile.ZipFile(archive + ".tmp", 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                # ZipFile.write 分块读取，不把整个文件读入内存
+                zf.write(path, os.path.basename(path))
+            os.replace(archive + ".tmp", archive)
+            os.remove(path)
+            path = archive
+        self.logger.info(f"运行报表已生成: {path}（{os.path.getsize(path)} 字节，"
+                         f"耗时 {time.perf_counter() - started:.2f} 秒）")
+        self._remove_expired()
+        return path
+
+    def _remove_expired(self):
+        if self.keep_days <= 0:
+            return
+        oldest = time.time() - self.keep_days * 86400
+        for path in glob.glob(os.path.join(glob.escape(self.directory), "report_*")):
+            try:
+                if os.path.getmtime(path) < oldest:
+                    os.remove(path)
+            except OSError:
+                pass
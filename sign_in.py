@@ -1,35 +1,140 @@
-import requests
 import base64
 import json
-import configparser
+import argparse
+import asyncio
+import functools
+import urllib.parse
+import multiprocessing
+import os
+import sqlite3
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import schedule
 import time
 from datetime import datetime
 import pytz
-from dark_log import DarkLog
+from app_config import ConfigError, load_config
+from dark_log import DarkLog, close_sinks
+from http_pool import HttpPool
+from token_cache import TokenCache
+from captcha_pipeline import CaptchaPipeline
+from captcha_solver import CaptchaSolveError, JfbymSolver, build_solver
+from account_source import ProgressCursor, open_account_source
+from checkpoint import CheckpointJournal
+from metrics import MetricsExporter, metrics
+from retry_policy import (BAD_CAPTCHA, BAD_CREDENTIALS, FATAL, STAGE_CAPTCHA, STAGE_CHECK_IN, STAGE_LOGIN,
+                          STAGE_POINTS, STAGE_SOLVE, TRANSIENT, Deadline, RetryPolicy, classify_exception,
+                          classify_login_failure)
 from push_ddmail import Dingdingmail
+from notify_queue import NotificationDispatcher
+from notify_digest import STATUS_ALREADY, STATUS_FAILED, STATUS_SKIPPED, STATUS_SUCCESS, NotificationDigest
+from run_report import RunReport
+from points_history import PointsHistory
+import sign_result
+from sign_result import CHECKIN_ALREADY, CHECKIN_AUTH_FAILED, CHECKIN_FAILED, CHECKIN_SUCCESS, AccountResult
 from apscheduler.schedulers.blocking import BlockingScheduler
 
 
 
 logger = DarkLog('ez-web_sign_in')
 notifier = Dingdingmail('ez-web_sign_in')
+# 通知发送队列，第一次使用时按 [NOTIFY] 段创建并启动
+outbox = None
+
+
+def get_outbox():
+    """返回本进程的通知发送队列，第一次调用时创建并启动后台发送线程"""
+    global outbox
+    if outbox is None:
+        outbox = NotificationDispatcher.from_config(load_config().parser, notifier)
+        outbox.start()
+    return outbox
+
+# 默认的服务地址，可在 config.ini 中改为本地模拟服务（见 load_test.py）
+MSEC_BASE_URL = "https://msec.nsfocus.com"
+YUNMA_URL = "http://api.jfbym.com/api/YmServer/customApi"
+
+# 签到状态在通知汇总中的分组，其余状态都算失败
+DIGEST_STATUS = {CHECKIN_SUCCESS: STATUS_SUCCESS, CHECKIN_ALREADY: STATUS_ALREADY}
+
+# 日志中各阶段的名称
+STAGE_NAMES = {
+    STAGE_CAPTCHA: "获取验证码",
+    STAGE_SOLVE: "验证码识别",
+    STAGE_LOGIN: "登录",
+    STAGE_CHECK_IN: "签到",
+    STAGE_POINTS: "查询积分",
+}
+
+
+def timed_stage(stage, succeeded=bool):
+    """
+    功能描述: 记录签到各阶段耗时和结果的装饰器，每次调用写一条带 stage / duration_ms / outcome 字段的日志
+              （只写入日志文件，不在控制台显示），供结构化日志统计各阶段的耗时和失败原因
+    参数:
+        stage: 阶段名称，STAGE_* 常量
+        succeeded: 根据返回值判断是否成功的函数
+    返回值: 装饰器
+    异常描述: 无
+    调用演示:
+        @timed_stage(STAGE_LOGIN)
+        def login(self, captcha_id, captcha_answer): ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def stage_call(self, *args):
+            self.last_failure = None
+            started = time.perf_counter()
+            result = func(self, *args)
+            elapsed = time.perf_counter() - started
+            duration_ms = round(elapsed * 1000, 1)
+            self.result.add_duration(stage, duration_ms)
+            if stage == STAGE_CHECK_IN:
+                outcome = result
+            elif succeeded(result):
+                outcome = "ok"
+            else:
+                outcome = self.last_failure or "failed"
+            self.logger.info(f"{STAGE_NAMES[stage]}耗时 {duration_ms} ms，结果: {outcome}", False,
+                             stage=stage, duration_ms=duration_ms, outcome=outcome)
+            metrics.observe("qiandao_stage_duration_seconds", elapsed, stage=stage)
+            metrics.inc("qiandao_stage_outcomes_total", stage=stage, outcome=outcome)
+            return result
+        return stage_call
+    return decorator
+
+
 class AutoQiandao:
-    def __init__(self, username, password, yunma_token):
+    def __init__(self, username, password, yunma_token, http=None, token_cache=None, solver=None,
+                 retry_policy=None, base_url=MSEC_BASE_URL, yunma_url=YUNMA_URL, notify_each=True):
         self.username = username
         self.password = password
-        self.results = []
-        self.max_retries = 3  # 最大重试次数
+        # 每个账号一个日志视图，日志ID为用户名，共享进程内的日志处理器
+        self.logger = DarkLog(username)
+        # 结构化的签到结果，通知和报表需要时才生成文字
+        self.result = AccountResult(username)
+        # 共享的HTTP连接池，job() 中所有账号复用同一个
+        self.http = http or HttpPool()
+        # 登录凭证缓存，为空时每次都走验证码登录
+        self.token_cache = token_cache
+        # 重试策略：指数退避 + 抖动 + 每阶段失败预算
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.max_retries = self.retry_policy.max_attempts  # 最大重试次数
+        self.last_failure = None  # 最近一次失败的类型，供重试策略判断
+        self.checkin_state = None  # 签到的最终状态，没有执行到签到时为None
+        self.solved_by = None  # 最近一次验证码答案来自哪个识别后端，登录结果用于统计识别成功率
+        # 每个账号结束时单独发送通知；job() 中改为任务结束后统一发送汇总（见 notify_digest.py）
+        self.notify_each = notify_each
 
         # M-SEC 网站的 URL
-        self.MSEC_BASE_URL = "https://msec.nsfocus.com"
+        self.MSEC_BASE_URL = base_url.rstrip("/")
         self.CAPTCHA_URL = self.MSEC_BASE_URL + "/backend_api/account/captcha"
         self.LOGIN_URL = self.MSEC_BASE_URL + "/backend_api/account/login"
         self.POINT_URL = self.MSEC_BASE_URL + "/backend_api/point/common/get"
         self.CHECKIN_URL = self.MSEC_BASE_URL + "/backend_api/checkin/checkin"
 
         # 云码平台的 URL 和 Token
-        self.YUNMA_URL = "http://api.jfbym.com/api/YmServer/customApi"
+        self.YUNMA_URL = yunma_url
         self.YUNMA_TOKEN = yunma_token
 
         # 模拟浏览器的 Headers
@@ -37,52 +142,58 @@ class AutoQiandao:
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36",
             "Content-Type": "application/json",
             "Accept": "*/*",
-            "Origin": "https://msec.nsfocus.com",
-            "Referer": "https://msec.nsfocus.com/auth/login",
+            "Origin": self.MSEC_BASE_URL,
+            "Referer": self.MSEC_BASE_URL + "/auth/login",
         }
 
+        # 验证码识别后端，缺省使用云码平台
+        self.solver = solver or JfbymSolver(self.http, self.YUNMA_TOKEN, self.YUNMA_URL)
+
+    @timed_stage(STAGE_CAPTCHA, lambda result: result[0] is not None)
     def get_captcha(self):
-        logger.info("正在获取验证码...")
+        self.logger.info("正在获取验证码...")
         try:
-            response = requests.post(self.CAPTCHA_URL, headers=self.HEADERS, json={})
+            response = self.http.post(self.CAPTCHA_URL, headers=self.HEADERS, json={})
             response.raise_for_status()
             data = response.json()
             if data.get("status") == 200:
                 captcha_id = data["data"]["id"]
                 captcha_base64 = data["data"]["captcha"].split(",")[1]
-                logger.info(f"获取验证码成功，ID: {captcha_id}")
+                self.logger.info(f"获取验证码成功，ID: {captcha_id}")
                 return captcha_id, captcha_base64
             else:
-                logger.error(f"获取验证码失败: {data}")
-                self.results.append(f"获取验证码失败: {data}")
+                self.logger.error(f"获取验证码失败: {data}")
+                self.result.add(sign_result.CAPTCHA_FAILED, data)
+                self.last_failure = TRANSIENT
                 return None, None
         except Exception as e:
-            logger.exception(f"请求验证码时发生错误: {e}")
-            self.results.append(f"请求验证码时发生错误: {e}")
+            self.last_failure = classify_exception(e)
+            self.logger.exception(f"请求验证码时发生错误: {e}")
+            self.result.add(sign_result.CAPTCHA_ERROR, e)
             return None, None
 
+    @timed_stage(STAGE_SOLVE)
     def recognize_captcha(self, captcha_base64):
-        logger.info("正在识别验证码...")
-        payload = {"image": captcha_base64, "token": self.YUNMA_TOKEN, "type": "50103"}
+        self.logger.info("正在识别验证码...")
         try:
-            response = requests.post(self.YUNMA_URL, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            if data.get("code") == 10000:
-                captcha_answer = data["data"]["data"]
-                logger.info(f"验证码识别成功: {captcha_answer}")
-                return captcha_answer
-            else:
-                logger.error(f"验证码识别失败: {data.get('msg')}")
-                # self.results.append(f"验证码识别失败: {data.get('msg')}")
-                return None
+            result = self.solver.solve(captcha_base64)
+            self.logger.info(f"验证码识别成功: {result.answer}（{result.backend}）")
+            self.solved_by = result.backend
+            return result.answer
+        except CaptchaSolveError as e:
+            self.last_failure = BAD_CAPTCHA
+            # 按实际失败的后端统计，auto 模式下是本地或云码平台，而不是 fallback
+            metrics.count_solve(e.backend or self.solver.name, False)
+            self.logger.error(f"验证码识别失败: {e}")
+            return None
         except Exception as e:
-            logger.exception(f"请求验证码识别时发生错误: {e}")
-            # self.results.append(f"请求验证码识别时发生错误: {e}")
+            self.last_failure = classify_exception(e)
+            self.logger.exception(f"请求验证码识别时发生错误: {e}")
             return None
 
+    @timed_stage(STAGE_LOGIN)
     def login(self, captcha_id, captcha_answer):
-        logger.info("正在登录...")
+        self.logger.info("正在登录...")
         payload = {
             "username": self.username,
             "password": self.password,
@@ -90,136 +201,712 @@ class AutoQiandao:
             "captcha_answer": captcha_answer
         }
         try:
-            response = requests.post(self.LOGIN_URL, headers=self.HEADERS, json=payload)
+            response = self.http.post(self.LOGIN_URL, headers=self.HEADERS, json=payload)
             response.raise_for_status()
             data = response.json()
             if data.get("status") == 200:
                 token = data["data"]["token"]
-                logger.info("-------> web登录成功！")
-                self.results.append("-------> web登录成功！")
+                metrics.count_solve(self.solved_by, True)
+                if self.token_cache is not None:
+                    self.token_cache.put(self.username, token)
+                self.logger.info("-------> web登录成功！")
+                self.result.add(sign_result.LOGIN_OK)
                 return token
             else:
-                logger.error(f"登录失败: {data}")
-                self.results.append(f"登录失败: {data}")
+                self.last_failure = classify_login_failure(data)
+                if self.last_failure == BAD_CAPTCHA:
+                    # 答案被网站判定错误，也计入识别失败
+                    metrics.count_solve(self.solved_by, False)
+                self.logger.error(f"登录失败: {data}")
+                self.result.add(sign_result.LOGIN_FAILED, data)
                 return None
         except Exception as e:
-            logger.exception(f"登录时发生错误: {e}")
-            self.results.append(f"登录时发生错误: {e}")
+            self.last_failure = classify_exception(e)
+            self.logger.exception(f"登录时发生错误: {e}")
+            self.result.add(sign_result.LOGIN_ERROR, e)
             return None
 
+    @timed_stage(STAGE_CHECK_IN)
     def check_in(self, auth_token):
-        logger.info("正在执行签到...")
+        """
+        功能描述: 使用登录凭证执行签到
+        参数:
+            auth_token: login() 返回或缓存中的登录凭证
+        返回值:
+            CHECKIN_SUCCESS / CHECKIN_ALREADY / CHECKIN_FAILED / CHECKIN_AUTH_FAILED
+        异常描述: 请求异常记录日志后返回 CHECKIN_FAILED；凭证失效时不记录结果，由调用方重新登录
+        调用演示:
+            state = self.check_in(auth_token)
+        """
+        self.logger.info("正在执行签到...")
         headers = self.HEADERS.copy()
         headers["Authorization"] = auth_token
         try:
-            response = requests.post(self.CHECKIN_URL, headers=headers, json={})
+            response = self.http.post(self.CHECKIN_URL, headers=headers, json={})
+            if response.status_code in (401, 403):
+                self.logger.warning("登录凭证已失效")
+                return CHECKIN_AUTH_FAILED
             response.raise_for_status()
             data = response.json()
             if data.get("status") == 200:
-                logger.info("签到成功！")
-                self.results.append("签到成功！")
+                self.logger.info("签到成功！")
+                self.result.add(sign_result.CHECKIN_OK)
+                return CHECKIN_SUCCESS
+            elif data.get("status") in (401, 403):
+                self.logger.warning(f"登录凭证已失效: {data.get('message')}")
+                return CHECKIN_AUTH_FAILED
             elif data.get("status") == 400 and data.get("message") == "签到失败" and data.get("data") == "今天已经签到过了":
                 message = data.get('message', '未知错误')
                 data = data.get('data', '')
-                logger.error(f"错误: {message}，信息: {data}")
-                self.results.append(f"错误: {message}，信息: {data}")
+                self.logger.error(f"错误: {message}，信息: {data}")
+                self.result.add(sign_result.CHECKIN_ALREADY_DONE, message, data)
+                return CHECKIN_ALREADY
             else:
                 message = data.get('message', '未知错误')
-                logger.error(f"签到失败: {message}")
-                self.results.append(f"签到失败: {message}")
+                self.last_failure = TRANSIENT if isinstance(data.get("status"), int) and data["status"] >= 500 else FATAL
+                self.logger.error(f"签到失败: {message}")
+                self.result.add(sign_result.CHECKIN_REJECTED, message)
+                return CHECKIN_FAILED
         except Exception as e:
-            logger.exception(f"签到时发生错误: {e}")
-            self.results.append(f"签到时发生错误: {e}")
+            self.last_failure = classify_exception(e)
+            self.logger.exception(f"签到时发生错误: {e}")
+            self.result.add(sign_result.CHECKIN_ERROR, e)
+            return CHECKIN_FAILED
 
+    @timed_stage(STAGE_POINTS, lambda result: result is not None)
     def get_points(self, auth_token):
-        logger.info("正在查询积分...")
+        self.logger.info("正在查询积分...")
         headers = self.HEADERS.copy()
         headers["Authorization"] = auth_token
         try:
-            response = requests.post(self.POINT_URL, headers=headers, json={})
+            response = self.http.post(self.POINT_URL, headers=headers, json={})
             response.raise_for_status()
             data = response.json()
             if data.get("status") == 200:
                 accrued = data["data"]["accrued"]
                 total = data["data"]["total"]
                 point_info = f"查询积分成功: 累计积分 {accrued}, 当前积分 {total}"
-                logger.info(point_info)
-                self.results.append(point_info)
+                self.logger.info(point_info)
+                self.result.set_points(accrued, total)
+                return accrued, total
             else:
-                logger.error(f"查询积分失败: {data}")
-                self.results.append(f"查询积分失败: {data}")
+                self.logger.error(f"查询积分失败: {data}")
+                self.result.add(sign_result.POINTS_FAILED, data)
         except Exception as e:
-            logger.exception(f"查询积分时发生错误: {e}")
-            self.results.append(f"查询积分时发生错误: {e}")
+            self.last_failure = classify_exception(e)
+            self.logger.exception(f"查询积分时发生错误: {e}")
+            self.result.add(sign_result.POINTS_ERROR, e)
+        return None
+
+    def _cached_token(self):
+        """取出缓存的登录凭证，没有启用缓存或已过期时返回None"""
+        if self.token_cache is None:
+            return None
+        return self.token_cache.get(self.username)
+
+    def _on_cached_token_rejected(self):
+        self.logger.info("缓存的登录凭证已失效，改用验证码登录")
+        self.token_cache.invalidate(self.username)
+
+    def _check_in_with_retry(self, retry, auth_token):
+        """签到，遇到网络异常等临时错误时按重试策略重试签到这一步"""
+        state = self.check_in(auth_token)
+        while state == CHECKIN_FAILED and retry.record_failure(STAGE_CHECK_IN, self.last_failure):
+            metrics.inc("qiandao_retries_total", stage=STAGE_CHECK_IN)
+            time.sleep(retry.next_delay())
+            state = self.check_in(auth_token)
+        self.checkin_state = state
+        return state
+
+    def _give_up(self, retry):
+        """记录放弃重试的原因"""
+        if retry.last_kind == BAD_CREDENTIALS:
+            self.result.add(sign_result.GAVE_UP_CREDENTIALS)
+        elif retry.deadline.expired():
+            self.result.add(sign_result.GAVE_UP_DEADLINE)
+        else:
+            self.result.add(sign_result.GAVE_UP)
+        self.logger.error(self.result.last_message())
+
+    def run(self, deadline=None):
+        retry = self.retry_policy.start(deadline)
+        cached_token = self._cached_token()
+        if cached_token:
+            self.logger.info("使用缓存的登录凭证签到...")
+            if self._check_in_with_retry(retry, cached_token) != CHECKIN_AUTH_FAILED:
+                self.get_points(cached_token)
+                self.result.add(sign_result.CACHED_TOKEN)
+                if self.notify_each:
+                    self.notify()
+                return self.result
+            self._on_cached_token_rejected()
 
-    def run(self):
         retry_count = 0
         success = False
-        
-        while retry_count < self.max_retries and not success:
+
+        while retry_count < self.max_retries:
             retry_count += 1
-            logger.info(f"开始第 {retry_count} 次尝试...")
-            
+            self.result.attempts = retry_count
+            self.logger.info(f"开始第 {retry_count} 次尝试...")
+
+            failed_stage = None
             captcha_id, captcha_base64 = self.get_captcha()
-            if captcha_id and captcha_base64:
+            if not (captcha_id and captcha_base64):
+                failed_stage = STAGE_CAPTCHA
+            else:
                 captcha_answer = self.recognize_captcha(captcha_base64)
-                if captcha_answer:
+                if not captcha_answer:
+                    failed_stage = STAGE_SOLVE
+                else:
                     auth_token = self.login(captcha_id, captcha_answer)
-                    if auth_token:
-                        self.check_in(auth_token)
-                        self.get_points(auth_token)
-                        success = True
-                        logger.info(f"验证码识别：第 {retry_count} 次尝试成功！")
-                        self.results.append(f"验证码识别：第 {retry_count} 次尝试成功！")
-                        break
-                    else:
-                        logger.warning(f"第 {retry_count} 次登录失败，准备重试...")
-                        if retry_count < self.max_retries:
-                            time.sleep(2)  # 等待2秒后重试
+                    if not auth_token:
+                        failed_stage = STAGE_LOGIN
+
+            if failed_stage is None:
+                if self._check_in_with_retry(retry, auth_token) == CHECKIN_AUTH_FAILED:
+                    self.result.add(sign_result.CHECKIN_TOKEN_INVALID)
+                self.get_points(auth_token)
+                success = True
+                self.logger.info(f"验证码识别：第 {retry_count} 次尝试成功！")
+                self.result.add(sign_result.ATTEMPT_OK)
+                break
+
+            if not retry.record_failure(failed_stage, self.last_failure) or retry_count >= self.max_retries:
+                self.logger.warning(f"第 {retry_count} 次{STAGE_NAMES[failed_stage]}失败")
+                break
+            delay = retry.next_delay()
+            metrics.inc("qiandao_retries_total", stage=failed_stage)
+            self.logger.warning(f"第 {retry_count} 次{STAGE_NAMES[failed_stage]}失败，{delay:.1f} 秒后重试...")
+            time.sleep(delay)
+
+        if not success:
+            self._give_up(retry)
+
+        if self.notify_each:
+            self.notify()
+        return self.result
+
+    def notify(self):
+        """
+        功能描述: 将本账号的签到结果汇总后提交钉钉和邮件通知
+        参数: 无
+        返回值: 无
+        异常描述: 无
+        调用演示:
+            qiandao_task.notify()
+        """
+        # 只交给发送队列，不等待钉钉和邮件服务器响应
+        outbox = get_outbox()
+        outbox.dingding(*self.result.render_markdown())
+        outbox.mail(*self.result.render_html())
+
+
+class HostRateLimiter:
+    """
+    功能描述: 按目标主机限速的异步限流器，同一主机的请求按固定间隔依次放行
+    参数:
+        rate_per_second: 每个主机每秒允许的请求数，小于等于0表示不限速
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        limiter = HostRateLimiter(5)
+        await limiter.acquire("https://msec.nsfocus.com/backend_api/account/captcha")
+    """
+
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = {}  # 主机 -> 下一个可用的时间点
+
+    async def acquire(self, url):
+        if not self.interval:
+            return
+        host = urllib.parse.urlsplit(url).netloc
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # 事件循环单线程执行，读取和预约时间槽之间没有await，无需加锁
+        slot = max(now, self._next_slot.get(host, 0.0))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncAutoQiandao(AutoQiandao):
+    """
+    功能描述: AutoQiandao 的异步版本，阻塞的HTTP请求放到线程池中执行，
+              重试等待使用 asyncio.sleep，多个账号可以在同一个事件循环中并发签到
+    参数:
+        username: M-SEC 用户名
+        password: M-SEC 密码
+        yunma_token: 云码平台 Token
+        rate_limiter: HostRateLimiter 实例，为空时不限速
+        http: HttpPool 实例，为空时单独创建
+        token_cache: TokenCache 实例，为空时不使用凭证缓存
+        solver: CaptchaSolver 实例，为空时使用云码平台
+        retry_policy: RetryPolicy 实例，为空时使用默认策略
+        base_url: M-SEC 网站地址
+        yunma_url: 云码平台识别接口地址
+        notify_each: 是否在账号结束时单独发送通知
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        task = AsyncAutoQiandao(username, password, token, HostRateLimiter(5))
+        result = await task.arun(Deadline(3600))
+    """
+
+    def __init__(self, username, password, yunma_token, rate_limiter=None, http=None, token_cache=None, solver=None,
+                 retry_policy=None, base_url=MSEC_BASE_URL, yunma_url=YUNMA_URL, notify_each=True):
+        super().__init__(username, password, yunma_token, http, token_cache, solver, retry_policy, base_url, yunma_url,
+                         notify_each)
+        self.rate_limiter = rate_limiter or HostRateLimiter(0)
+        self.pipeline = None
+        self._prefetched = None  # 预取中的验证码任务
+
+    async def _call(self, url, func, *args):
+        await self.rate_limiter.acquire(url)
+        return await asyncio.to_thread(func, *args)
+
+    def start_prefetch(self, pipeline):
+        """
+        功能描述: 通过验证码流水线提前获取并识别验证码；有缓存凭证的账号不预取，避免浪费识别费用
+        参数:
+            pipeline: CaptchaPipeline 实例
+        返回值: 无
+        异常描述: 无
+        调用演示:
+            task.start_prefetch(pipeline)
+        """
+        if self._cached_token():
+            return
+        self.pipeline = pipeline
+        self._prefetched = pipeline.prefetch(
+            lambda: self._call(self.CAPTCHA_URL, self.get_captcha),
+            lambda captcha_base64: self._call(self.YUNMA_URL, self.recognize_captcha, captcha_base64),
+        )
+
+    async def _take_prefetched(self):
+        """取出预取的验证码，只能使用一次；没有预取、预取失败或已过期时返回 (None, None)"""
+        pending, self._prefetched = self._prefetched, None
+        if pending is None:
+            return None, None
+        solved = await self.pipeline.take(pending)
+        if solved is None:
+            self.logger.info("预取的验证码不可用，重新获取")
+            return None, None
+        return solved.captcha_id, solved.answer
+
+    async def _acheck_in_with_retry(self, retry, auth_token):
+        state = await self._call(self.CHECKIN_URL, self.check_in, auth_token)
+        while state == CHECKIN_FAILED and retry.record_failure(STAGE_CHECK_IN, self.last_failure):
+            metrics.inc("qiandao_retries_total", stage=STAGE_CHECK_IN)
+            await asyncio.sleep(retry.next_delay())
+            state = await self._call(self.CHECKIN_URL, self.check_in, auth_token)
+        self.checkin_state = state
+        return state
+
+    async def arun(self, deadline=None):
+        retry = self.retry_policy.start(deadline)
+        cached_token = self._cached_token()
+        if cached_token:
+            self.logger.info("使用缓存的登录凭证签到...")
+            if await self._acheck_in_with_retry(retry, cached_token) != CHECKIN_AUTH_FAILED:
+                await self._call(self.POINT_URL, self.get_points, cached_token)
+                self.result.add(sign_result.CACHED_TOKEN)
+                if self.notify_each:
+                    self.notify()
+                return self.result
+            self._on_cached_token_rejected()
+
+        retry_count = 0
+        success = False
+
+        while retry_count < self.max_retries:
+            retry_count += 1
+            self.result.attempts = retry_count
+            self.logger.info(f"开始第 {retry_count} 次尝试...")
+
+            failed_stage = None
+            captcha_id, captcha_answer = await self._take_prefetched()
+            if not captcha_id:
+                captcha_id, captcha_base64 = await self._call(self.CAPTCHA_URL, self.get_captcha)
+                if not (captcha_id and captcha_base64):
+                    failed_stage = STAGE_CAPTCHA
                 else:
-                    logger.warning(f"第 {retry_count} 次验证码识别失败，准备重试...")
-                    if retry_count < self.max_retries:
-                        time.sleep(2)
-            else:
-                logger.warning(f"第 {retry_count} 次获取验证码失败，准备重试...")
-                if retry_count < self.max_retries:
-                    time.sleep(2)
-        
+                    captcha_answer = await self._call(self.YUNMA_URL, self.recognize_captcha, captcha_base64)
+            if failed_stage is None and not captcha_answer:
+                failed_stage = STAGE_SOLVE
+            if failed_stage is None:
+                auth_token = await self._call(self.LOGIN_URL, self.login, captcha_id, captcha_answer)
+                if not auth_token:
+                    failed_stage = STAGE_LOGIN
+
+            if failed_stage is None:
+                if await self._acheck_in_with_retry(retry, auth_token) == CHECKIN_AUTH_FAILED:
+                    self.result.add(sign_result.CHECKIN_TOKEN_INVALID)
+                await self._call(self.POINT_URL, self.get_points, auth_token)
+                success = True
+                self.logger.info(f"验证码识别：第 {retry_count} 次尝试成功！")
+                self.result.add(sign_result.ATTEMPT_OK)
+                break
+
+            if not retry.record_failure(failed_stage, self.last_failure) or retry_count >= self.max_retries:
+                self.logger.warning(f"第 {retry_count} 次{STAGE_NAMES[failed_stage]}失败")
+                break
+            delay = retry.next_delay()
+            metrics.inc("qiandao_retries_total", stage=failed_stage)
+            self.logger.warning(f"第 {retry_count} 次{STAGE_NAMES[failed_stage]}失败，{delay:.1f} 秒后重试...")
+            await asyncio.sleep(delay)  # 等待期间其他账号继续执行
+
         if not success:
-            error_msg = f"经过 {self.max_retries} 次尝试后仍然失败"
-            logger.error(error_msg)
-            self.results.append(error_msg)
-        
-        # 发送通知
-        summary_title = f"M-SEC 签到 - {self.username}"
-        summary_content = "\n\n".join(self.results)
-        notifier.get_dingding(summary_title, summary_content)
-        notifier.get_mail(summary_title, summary_content.replace("\n\n", "<br>"))
+            self._give_up(retry)
+
+        if self.notify_each:
+            self.notify()
+        return self.result
 
-def job():
-    config = configparser.ConfigParser()
-    config.read('config/config.ini')
 
-    usernames = config.get('EZ_WEB', 'usernames').split(',')
-    passwords = config.get('EZ_WEB', 'passwords').split(',')
-    YUNMA_TOKEN = config.get('jfbym', 'Token')
+async def async_job(shard_index=0, shard_count=1, digest=None, report=None):
+    """
+    功能描述: 并发执行所有账号（或其中一个分片）的签到任务
+              并发数和每主机限速在 config.ini 的 [ENGINE] 段配置，
+              连接池大小和超时在 [HTTP] 段配置，所有账号复用同一个连接池，
+              登录凭证缓存在 [TOKEN_CACHE] 段配置，任务结束时写回磁盘，
+              验证码预取和识别后端在 [CAPTCHA] 段配置，后续账号的验证码识别与当前账号的登录签到并行，
+              重试策略和整个任务的截止时间在 [RETRY] 段配置
+              账号来源在 [ACCOUNTS] 段配置，账号逐个读取，中断后当天再次执行会从上次的位置继续，
+              每个账号的签到结果记入 [CHECKPOINT] 段配置的检查点日志，当天已签到的账号再次执行时直接跳过，
+              查询到的积分批量写入 [POINTS] 段配置的积分历史库
+    参数:
+        shard_index: 分片序号，只执行用户名哈希对 shard_count 取余等于 shard_index 的账号
+        shard_count: 分片总数，1表示执行全部账号
+        digest: NotificationDigest 实例，收集各账号的结果，由调用方在任务结束后发送；
+                为空时每个账号结束时单独发送通知
+        report: ReportWriter 实例，每个账号结束时写入一行运行报表，为空时不写
+    返回值:
+        {username: AccountResult} 每个账号的签到结果；配置错误时返回空字典
+    异常描述: 单个账号的异常只记录日志，不影响其他账号
+    调用演示:
+        summaries = asyncio.run(async_job())
+    """
+    app_config = load_config()
+    config = app_config.parser
 
-    # 检查用户名和密码是否匹配
-    if len(usernames) != len(passwords):
-        logger.error("用户名和密码数量不匹配，请检查配置文件。")
-        return
+    YUNMA_TOKEN = app_config.value('jfbym', 'Token', fallback='')
+    base_url = app_config.value('EZ_WEB', 'msec_base_url', fallback='').strip() or MSEC_BASE_URL
+    yunma_url = app_config.value('jfbym', 'api_url', fallback='').strip() or YUNMA_URL
+    concurrency = app_config.value('ENGINE', 'concurrency', fallback=1)
+    host_rate_limit = app_config.value('ENGINE', 'host_rate_limit', fallback=0)
+    if host_rate_limit > 0 and shard_count > 1:
+        # 各分片进程分别限速，按进程数平均分配，所有进程合计不超过配置的速率
+        host_rate_limit /= shard_count
 
-    for username, password in zip(usernames, passwords):
-        logger.info(f"正在为账号: {username.strip()} 执行签到任务...")
-        qiandao_task = AutoQiandao(username.strip(), password.strip(), YUNMA_TOKEN)
-        qiandao_task.run()
+    try:
+        source = open_account_source(config)
+    except (OSError, ValueError) as e:
+        logger.error(f"读取账号失败: {e}")
+        return {}
+
+    rate_limiter = HostRateLimiter(host_rate_limit)
+    http = HttpPool.from_config(config)
+    token_cache = TokenCache.from_config(config)
+    pipeline = CaptchaPipeline.from_config(config)
+    retry_policy = RetryPolicy.from_config(config)
+    deadline = Deadline(app_config.value('RETRY', 'job_deadline', fallback=0))
+    journal = CheckpointJournal.from_config(config, (CHECKIN_SUCCESS, CHECKIN_ALREADY))
+    try:
+        history = PointsHistory.from_config(config)
+    except sqlite3.Error as e:
+        logger.error(f"打开积分历史库失败，本次不记录积分: {e}")
+        history = None
+    progress = None
+    if app_config.value('ACCOUNTS', 'resume', fallback=True):
+        suffix = f".shard{shard_index}" if shard_count > 1 else ""
+        progress = ProgressCursor(f"data_/account_cursor{suffix}.json", source.name)
+        if progress.position:
+            logger.info(f"从上次中断的位置继续读取账号: {progress.position}")
+    solvers = {}
+    summaries = {}
 
+    def solver_for(backend):
+        # 每种识别后端只创建一次，账号可以单独指定后端
+        if backend not in solvers:
+            try:
+                solvers[backend] = build_solver(config, http, YUNMA_TOKEN, backend)
+            except (RuntimeError, ValueError) as e:
+                logger.warning(f"验证码识别后端 {backend or '默认'} 不可用，改用云码平台: {e}")
+                solvers[backend] = JfbymSolver(http, YUNMA_TOKEN, yunma_url)
+        return solvers[backend]
+
+    def collect(result):
+        # 写入运行报表、加入通知汇总；磁盘写满等错误只记录日志，不影响其他账号和任务结束时的汇总
+        summaries[result.username] = result
+        if report is not None:
+            try:
+                report.add(result)
+            except OSError as e:
+                logger.error(f"写入运行报表失败: {result.username}: {e}")
+        if digest is None:
+            return
+        alert = digest.add(result)
+        if alert:
+            logger.warning(f"失败账号数达到告警阈值 {digest.alert_failures}，立即发送告警")
+            try:
+                digest.send_alert(alert)
+            except OSError as e:
+                logger.error(f"提交失败告警失败: {e}")
+
+    def tasks():
+        # 逐个读取账号，不把账号列表整体读入内存
+        for account in source.iter_from(progress.position if progress else None):
+            if not account.enabled:
+                continue
+            # 按用户名哈希分片，续跑时账号仍然落在同一个分片
+            if shard_count > 1 and zlib.crc32(account.username.encode('utf-8')) % shard_count != shard_index:
+                continue
+            if journal is not None and journal.is_done(account.username):
+                logger.info(f"账号 {account.username} 今天已完成签到，跳过")
+                collect(AccountResult.single(account.username, STATUS_SKIPPED, sign_result.SKIPPED_CHECKPOINT))
+                continue
+            if progress is not None:
+                progress.started(account)
+            task = AsyncAutoQiandao(account.username, account.password, YUNMA_TOKEN, rate_limiter, http, token_cache,
+                                    solver_for(account.solver), retry_policy, base_url, yunma_url,
+                                    notify_each=digest is None)
+            task.account = account
+            yield task
+
+    # 所有worker共享同一个迭代器，谁空闲谁取下一个账号；迭代器同时为后面的账号预取验证码
+    accounts = pipeline.iterate(tasks(), lambda task: deadline.expired() or task.start_prefetch(pipeline))
+
+    async def worker():
+        for qiandao_task in accounts:
+            username = qiandao_task.username
+            if deadline.expired():
+                logger.error(f"已超过任务截止时间，跳过账号: {username}")
+                collect(AccountResult.single(username, STATUS_FAILED, sign_result.SKIPPED_DEADLINE))
+                continue
+            logger.info(f"正在为账号: {username} 执行签到任务...")
+            started = time.perf_counter()
+            result = qiandao_task.result
+            try:
+                await qiandao_task.arun(deadline)
+            except Exception as e:
+                logger.exception(f"账号 {username} 签到任务异常: {e}")
+                result.add(sign_result.TASK_ERROR, e)
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            outcome = qiandao_task.checkin_state or CHECKIN_FAILED
+            qiandao_task.logger.info(f"签到任务结束，耗时 {duration_ms} ms，结果: {outcome}", False,
+                                     stage="account", duration_ms=duration_ms, outcome=outcome)
+            metrics.inc("qiandao_accounts_total", outcome=outcome)
+            result.finish(DIGEST_STATUS.get(outcome, STATUS_FAILED), qiandao_task.checkin_state, duration_ms)
+            collect(result)
+            if journal is not None:
+                try:
+                    journal.record(username, qiandao_task.checkin_state, result.last_message())
+                except OSError as e:
+                    logger.error(f"写入检查点失败: {username}: {e}")
+            if history is not None and result.points is not None:
+                try:
+                    history.record(username, *result.points)
+                except sqlite3.Error as e:
+                    logger.error(f"写入积分历史失败: {e}")
+            if progress is not None:
+                try:
+                    progress.finished(qiandao_task.account,
+                                      done=qiandao_task.checkin_state in (CHECKIN_SUCCESS, CHECKIN_ALREADY))
+                except OSError as e:
+                    logger.error(f"保存读取进度失败: {e}")
+
+    # 默认线程池只有 cpu+4 个线程，按并发数和预取数扩容，避免阻塞请求排队
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency * 2 + pipeline.workers, thread_name_prefix="qiandao")
+    loop.set_default_executor(executor)
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        if progress is not None:
+            try:
+                progress.close(completed=not deadline.expired())
+            except OSError as e:
+                logger.error(f"保存读取进度失败: {e}")
+        if journal is not None:
+            try:
+                journal.close()
+            except OSError as e:
+                logger.error(f"写入检查点失败: {e}")
+        if history is not None:
+            try:
+                history.close()
+            except sqlite3.Error as e:
+                logger.error(f"写入积分历史失败: {e}")
+        executor.shutdown(wait=False)
+        http.close()
+        if token_cache is not None:
+            token_cache.flush()
+    return summaries
+
+
+def _run_shard(shard_index, shard_count, report_id=None):
+    """
+    功能描述: 分片工作进程的入口，日志写入该分片自己的文件，连接池等资源在进程内单独创建
+    参数:
+        shard_index: 分片序号
+        shard_count: 分片总数
+        report_id: 主进程运行报表的标识，为空时不写运行报表
+    返回值: (该分片的 {username: AccountResult}, 该分片的指标副本, 该分片的通知汇总条目)
+    异常描述: 无
+    调用演示: 由 sharded_job 在子进程中调用
+    """
+    global logger
+    # 替换本进程共享的文件处理器，之后所有 DarkLog 实例（包括每个账号的）都写入分片自己的文件
+    logger = DarkLog('ez-web_sign_in', file_suffix=f".shard{shard_index}")
+    logger.info(f"分片 {shard_index + 1}/{shard_count} 开始执行")
+    global outbox
+    config = load_config().parser
+    # 子进程只把通知写入待发送目录，由主进程的发送队列发送
+    outbox = NotificationDispatcher.from_config(config, notifier, deliver=False)
+    digest = NotificationDigest.from_config(config, outbox, shard_count)
+    # 分片各自写一个分段文件，由主进程合并
+    report = RunReport.from_config(config, report_id).writer(shard_index) if report_id else None
+    try:
+        summaries = asyncio.run(async_job(shard_index, shard_count, digest, report))
+    finally:
+        if report is not None:
+            report.close()
+        # 子进程退出时不执行 atexit，主动写完队列中的日志
+        close_sinks()
+    return summaries, metrics.snapshot(), digest.entries if digest is not None else []
+
+
+def sharded_job(workers, digest=None, report=None):
+    """
+    功能描述: 把账号按用户名哈希分给 workers 个进程执行，最后合并各进程的签到结果和指标
+              每个进程有自己的事件循环、连接池和日志文件（log_/日期.shardN.log），
+              适合上千个账号时单个进程受 GIL 限制的情况
+    参数:
+        workers: 工作进程数
+        digest: NotificationDigest 实例，合并各进程收集的通知汇总条目
+        report: RunReport 实例，各进程写入它的分段文件，为空时不写运行报表
+    返回值: 合并后的 {username: AccountResult}
+    异常描述: 单个分片进程异常只记录日志，不影响其他分片的结果
+    调用演示:
+        summaries = sharded_job(4)
+    """
+    summaries = {}
+    # spawn 启动的子进程不会继承父进程中日志队列等线程的状态
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        report_id = report.run_id if report is not None else None
+        futures = [executor.submit(_run_shard, index, workers, report_id) for index in range(workers)]
+        for index, future in enumerate(futures):
+            try:
+                shard_summaries, shard_metrics, shard_digest = future.result()
+                summaries.update(shard_summaries)
+                metrics.merge(shard_metrics)
+                if digest is not None:
+                    digest.merge(shard_digest)
+            except Exception as e:
+                logger.exception(f"分片 {index + 1}/{workers} 执行失败: {e}")
+    return summaries
+
+
+def _finish_report(report, config):
+    """合并运行报表，返回 (报表路径, 是否作为邮件附件)；生成失败时返回 (None, False)"""
+    try:
+        path = report.finish()
+    except OSError as e:
+        logger.error(f"生成运行报表失败: {e}")
+        return None, False
+    if path is None:
+        return None, False
+    max_bytes = config.value('REPORT', 'max_attachment_mb', fallback=20.0) * 1024 * 1024
+    if os.path.getsize(path) > max_bytes:
+        logger.warning(f"运行报表 {path} 超过邮件附件大小上限，不作为附件发送")
+        return path, False
+    return path, True
+
+
+def job(workers=None):
+    """
+    功能描述: 执行一次全部账号的签到任务；[ENGINE] 段 workers 大于1时按进程分片执行；
+              [NOTIFY] 段 mode 为 digest（默认）时，所有账号结束后发送一条汇总通知；
+              [REPORT] 段启用时，每个账号的结果、各阶段耗时和积分写入运行报表，作为汇总邮件的附件
+    参数:
+        workers: 签到进程数，为空时使用 [ENGINE] 段的配置
+    返回值: {username: AccountResult}
+    异常描述: 无
+    调用演示:
+        job()
+    """
+    config = load_config()
+    if workers is None:
+        workers = config.value('ENGINE', 'workers', fallback=1)
+
+    digest = NotificationDigest.from_config(config.parser, get_outbox())
+    report = RunReport.from_config(config.parser)
+    started = time.time()
+    if workers > 1:
+        summaries = sharded_job(workers, digest, report)
+    else:
+        writer = report.writer() if report is not None else None
+        try:
+            summaries = asyncio.run(async_job(digest=digest, report=writer))
+        finally:
+            if writer is not None:
+                writer.close()
+    elapsed = time.time() - started
+    report_path, attach = _finish_report(report, config) if report is not None else (None, False)
+    if digest is not None:
+        digest.send(elapsed, report_path, attach)
+    elif attach:
+        # 每个账号已单独通知，报表单独发一封邮件
+        get_outbox().mail(f"M-SEC 签到报表 {datetime.now():%Y-%m-%d}",
+                          f"本次签到共 {len(summaries)} 个账号，耗时 {elapsed:.1f} 秒，明细见附件。", report_path)
+    logger.info(f"签到任务完成: 共 {len(summaries)} 个账号，{max(workers, 1)} 个进程，耗时 {elapsed:.1f} 秒")
+    metrics.set("qiandao_job_duration_seconds", elapsed)
+    metrics.set("qiandao_job_last_run_timestamp_seconds", time.time())
+    exporter = MetricsExporter.from_config(config.parser)
+    if exporter is not None:
+        try:
+            exporter.write_textfile()
+        except OSError as e:
+            logger.error(f"写入指标文件失败: {e}")
+    return summaries
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="M-SEC 自动签到")
+    parser.add_argument("--profile", action="store_true",
+                        help="在单个进程中立即执行一次签到并做性能分析，结果写入 log_/profile_*，不启动定时任务")
+    parser.add_argument("--profile-interval", type=float, default=5.0, help="性能分析的采样间隔（毫秒）")
+    parser.add_argument("--profile-top", type=int, default=30, help="性能分析汇总中列出的函数个数")
+    args = parser.parse_args()
+
+    if args.profile:
+        from profiler import profile_run
+
+        # 分片子进程无法采样，分析模式固定在当前进程中执行
+        _, report_path = profile_run(lambda: job(workers=1), "log_", args.profile_interval / 1000, args.profile_top)
+        logger.info(f"性能分析完成，结果见 {report_path}")
+        get_outbox().flush()
+        raise SystemExit(0)
+
+    # 启动时检查配置，类型或取值错误直接退出，不等到定时任务执行时才失败
+    try:
+        startup_config = load_config()
+    except ConfigError as e:
+        logger.error(str(e))
+        raise SystemExit(1)
+    for message in startup_config.warnings():
+        logger.warning(message)
+
     # 初始化调度器，强制使用北京时间（UTC+8）
     scheduler = BlockingScheduler(timezone='Asia/Shanghai')
 
+    # 调度进程存活期间提供 /metrics 接口
+    metrics_exporter = MetricsExporter.from_config(startup_config.parser)
+    if metrics_exporter is not None:
+        metrics_exporter.start()
+
 
     @scheduler.scheduled_job('cron', hour=9, minute=0, timezone='Asia/Shanghai')  # 显式指定时区
     def scheduled_job():
@@ -227,17 +914,17 @@ if __name__ == "__main__":
             job()
         except Exception as e:
             logger.error(f"定时任务执行失败: {e}")
-            notifier.get_dingding("定时任务执行失败", f"任务执行失败: {e}")
-            notifier.get_mail("定时任务执行失败", f"任务执行失败: {e}")
+            get_outbox().dingding("定时任务执行失败", f"任务执行失败: {e}")
+            get_outbox().mail("定时任务执行失败", f"任务执行失败: {e}")
 
 
     # 获取当前北京时间（避免服务器时区影响）
     beijing_time = datetime.now(pytz.timezone('Asia/Shanghai')).strftime('%Y-%m-%d %H:%M:%S')
 
     logger.info(f"ez - web 脚本初始化成功，任务已设定，将在每天北京时间 09:00 执行。当前时间: {beijing_time}")
-    notifier.get_dingding("脚本初始化成功",
+    get_outbox().dingding("脚本初始化成功",
                           f"ez - web 脚本初始化成功 <br/> 任务已设定，将在每天北京时间 09:00 执行。当前时间: {beijing_time}")
-    notifier.get_mail("ez - web 脚本初始化成功",
+    get_outbox().mail("ez - web 脚本初始化成功",
                       f"ez - web 脚本初始化成功 <br/> 任务已设定，将在每天北京时间 09:00 执行。当前时间: {beijing_time}")
 
     # 首次启动立即执行
@@ -246,8 +933,8 @@ if __name__ == "__main__":
         job()
     except Exception as e:
         logger.error(f"首次任务执行失败: {e}")
-        notifier.get_dingding("首次任务执行失败", f"首次任务执行失败: {e}")
-        notifier.get_mail("首次任务执行失败", f"首次任务执行失败: {e}")
+        get_outbox().dingding("首次任务执行失败", f"首次任务执行失败: {e}")
+        get_outbox().mail("首次任务执行失败", f"首次任务执行失败: {e}")
     logger.info("首次签到任务执行完成，开始等待定时任务...")
 
     # 启动调度器，并处理退出信号
@@ -256,5 +943,7 @@ if __name__ == "__main__":
     except (KeyboardInterrupt, SystemExit):
         scheduler.shutdown()
         logger.info("定时任务已停止")
-        notifier.get_dingding("定时任务已停止", "定时任务已停止")
-        notifier.get_mail("定时任务已停止", "定时任务已停止")
+        get_outbox().dingding("定时任务已停止", "定时任务已停止")
+        get_outbox().mail("定时任务已停止", "定时任务已停止")
+        # 等待通知发出，未发出的留在待发送目录中，下次启动后发送
+        get_outbox().stop(timeout=10)
@@ -0,0 +1,208 @@
+import html
+from array import array
+
+from retry_policy import STAGE_CAPTCHA, STAGE_CHECK_IN, STAGE_LOGIN, STAGE_POINTS, STAGE_SOLVE
+
+# 记录耗时的阶段，AccountResult 按这个顺序在数组中保存各阶段耗时
+TIMED_STAGES = (STAGE_CAPTCHA, STAGE_SOLVE, STAGE_LOGIN, STAGE_CHECK_IN, STAGE_POINTS)
+_STAGE_INDEX = {stage: index for index, stage in enumerate(TIMED_STAGES)}
+
+# check_in 的返回状态，即 AccountResult.checkin_state
+CHECKIN_SUCCESS = "success"
+CHECKIN_ALREADY = "already"  # 今天已经签到过了
+CHECKIN_FAILED = "failed"
+CHECKIN_AUTH_FAILED = "auth_failed"  # 登录凭证无效或已过期
+
+# 结果代码：每条结果只保存代码和参数，需要显示时才按 MESSAGES 中的模板生成文字；
+# 模板中的 {accrued} / {total} / {attempts} 取自账号结果本身，不在每条结果中重复保存
+CAPTCHA_FAILED = "captcha_failed"
+CAPTCHA_ERROR = "captcha_error"
+LOGIN_OK = "login_ok"
+LOGIN_FAILED = "login_failed"
+LOGIN_ERROR = "login_error"
+CHECKIN_OK = "checkin_ok"
+CHECKIN_ALREADY_DONE = "checkin_already"
+CHECKIN_REJECTED = "checkin_rejected"
+CHECKIN_ERROR = "checkin_error"
+CHECKIN_TOKEN_INVALID = "checkin_token_invalid"
+POINTS_OK = "points_ok"
+POINTS_FAILED = "points_failed"
+POINTS_ERROR = "points_error"
+CACHED_TOKEN = "cached_token"
+ATTEMPT_OK = "attempt_ok"
+GAVE_UP = "gave_up"
+GAVE_UP_CREDENTIALS = "gave_up_credentials"
+GAVE_UP_DEADLINE = "gave_up_deadline"
+SKIPPED_CHECKPOINT = "skipped_checkpoint"
+SKIPPED_DEADLINE = "skipped_deadline"
+TASK_ERROR = "task_error"
+
+MESSAGES = {
+    CAPTCHA_FAILED: "获取验证码失败: {}",
+    CAPTCHA_ERROR: "请求验证码时发生错误: {}",
+    LOGIN_OK: "-------> web登录成功！",
+    LOGIN_FAILED: "登录失败: {}",
+    LOGIN_ERROR: "登录时发生错误: {}",
+    CHECKIN_OK: "签到成功！",
+    CHECKIN_ALREADY_DONE: "错误: {}，信息: {}",
+    CHECKIN_REJECTED: "签到失败: {}",
+    CHECKIN_ERROR: "签到时发生错误: {}",
+    CHECKIN_TOKEN_INVALID: "签到失败: 登录凭证无效",
+    POINTS_OK: "查询积分成功: 累计积分 {accrued}, 当前积分 {total}",
+    POINTS_FAILED: "查询积分失败: {}",
+    POINTS_ERROR: "查询积分时发生错误: {}",
+    CACHED_TOKEN: "使用缓存的登录凭证，跳过验证码登录",
+    ATTEMPT_OK: "验证码识别：第 {attempts} 次尝试成功！",
+    GAVE_UP: "经过 {attempts} 次尝试后仍然失败",
+    GAVE_UP_CREDENTIALS: "用户名或密码错误，停止重试",
+    GAVE_UP_DEADLINE: "已超过任务截止时间，第 {attempts} 次尝试后停止",
+    SKIPPED_CHECKPOINT: "今天已完成签到（检查点记录），跳过",
+    SKIPPED_DEADLINE: "已超过任务截止时间，未执行签到",
+    TASK_ERROR: "签到任务异常: {}",
+}
+
+# 每条结果所属的阶段，不属于某个阶段的（放弃重试、跳过等）为None
+CODE_STAGES = {
+    CAPTCHA_FAILED: STAGE_CAPTCHA, CAPTCHA_ERROR: STAGE_CAPTCHA,
+    LOGIN_OK: STAGE_LOGIN, LOGIN_FAILED: STAGE_LOGIN, LOGIN_ERROR: STAGE_LOGIN,
+    CHECKIN_OK: STAGE_CHECK_IN, CHECKIN_ALREADY_DONE: STAGE_CHECK_IN, CHECKIN_REJECTED: STAGE_CHECK_IN,
+    CHECKIN_ERROR: STAGE_CHECK_IN, CHECKIN_TOKEN_INVALID: STAGE_CHECK_IN,
+    POINTS_OK: STAGE_POINTS, POINTS_FAILED: STAGE_POINTS, POINTS_ERROR: STAGE_POINTS,
+}
+
+
+def _compact(value):
+    # 异常对象会引用调用栈，响应字典可能很大，只保留生成文字所需的字符串
+    return value if isinstance(value, (str, int, float)) else str(value)
+
+
+class StageResult:
+    """
+    功能描述: 一条带参数的签到结果，只保存结果代码和模板参数，message() 时才生成文字；
+              不带参数的结果在 AccountResult 中直接保存结果代码，不单独创建对象
+    参数:
+        code: 结果代码（本模块的常量）
+        args: 模板参数
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        entry = StageResult(LOGIN_FAILED, ("验证码错误",))
+        print(entry.stage, entry.message())
+    """
+
+    __slots__ = ("code", "args")
+
+    def __init__(self, code, args=()):
+        self.code = code
+        self.args = args
+
+    @property
+    def stage(self):
+        return CODE_STAGES.get(self.code)
+
+    def message(self, **fields):
+        return MESSAGES[self.code].format(*self.args, **fields)
+
+    def __repr__(self):
+        return f"StageResult({self.code!r}, {self.args!r})"
+
+
+class AccountResult:
+    """
+    功能描述: 一个账号的签到结果：汇总状态、签到状态、积分、尝试次数、总耗时和各阶段耗时，
+              以及按时间顺序的各条结果（结果代码或 StageResult）；钉钉 markdown 和邮件 HTML 只在发送通知时生成。
+              上千个账号的结果都保留到任务结束，每个账号只占几百字节
+    参数:
+        username: 用户名
+    返回值: 无
+    异常描述: 无
+    调用演示:
+        result = AccountResult("user123")
+        result.set_points(120, 30)
+        result.finish("success", "success", 812.5)
+        title, text = result.render_markdown()
+    """
+
+    __slots__ = ("username", "status", "checkin_state", "accrued", "total", "attempts", "duration_ms", "_stage_ms",
+                 "entries")
+
+    def __init__(self, username):
+        self.username = username
+        self.status = None  # 汇总中的状态（notify_digest 的 STATUS_* 常量），账号结束时填写
+        self.checkin_state = None  # check_in 返回的最终状态，没有执行到签到时为None
+        self.accrued = None  # 累计积分，没有查询到时为None
+        self.total = None  # 当前积分
+        self.attempts = 0  # 验证码登录的尝试次数，使用缓存凭证时为0
+        self.duration_ms = 0.0
+        self._stage_ms = None  # 按 TIMED_STAGES 顺序的各阶段累计耗时（毫秒），第一次记录时创建
+        self.entries = []  # 不带参数的结果只保存结果代码，带参数的保存 StageResult
+
+    @classmethod
+    def single(cls, username, status, code, *args):
+        """只有一条结果的账号（跳过、超过截止时间等）"""
+        result = cls(username)
+        result.status = status
+        result.add(code, *args)
+        return result
+
+    def add(self, code, *args):
+        """追加一条结果，参数转换成字符串或数字保存"""
+        self.entries.append(StageResult(code, tuple(_compact(arg) for arg in args)) if args else code)
+
+    def add_duration(self, stage, duration_ms):
+        if self._stage_ms is None:
+            self._stage_ms = array('d', bytes(8 * len(TIMED_STAGES)))
+        self._stage_ms[_STAGE_INDEX[stage]] += duration_ms
+
+    @property
+    def stage_ms(self):
+        """{阶段: 累计耗时（毫秒）}，只包含执行过的阶段"""
+        if self._stage_ms is None:
+            return {}
+        return {stage: round(ms, 1) for stage, ms in zip(TIMED_STAGES, self._stage_ms) if ms}
+
+    def set_points(self, accrued, total):
+        """记录查询到的积分，同时追加一条查询积分成功的结果"""
+        self.accrued = accrued
+        self.total = total
+        self.entries.append(POINTS_OK)
+
+    @property
+    def points(self):
+        """(累计积分, 当前积分)，没有查询到时为None"""
+        return None if self.accrued is None else (self.accrued, self.total)
+
+    def finish(self, status, checkin_state, duration_ms):
+        """账号结束时填写汇总状态、签到状态和总耗时"""
+        self.status = status
+        self.checkin_state = checkin_state
+        self.duration_ms = duration_ms
+
+    def _message(self, entry):
+        fields = {"accrued": self.accrued, "total": self.total, "attempts": self.attempts}
+        if isinstance(entry, str):
+            return MESSAGES[entry].format(**fields)
+        return entry.message(**fields)
+
+    def messages(self):
+        return [self._message(entry) for entry in self.entries]
+
+    def last_message(self):
+        return self._message(self.entries[-1]) if self.entries else ""
+
+    def detail(self):
+        """汇总中每个账号一行：查询到积分时显示积分，否则显示最后一条结果"""
+        if self.accrued is not None and self.checkin_state in (CHECKIN_SUCCESS, CHECKIN_ALREADY):
+            return f"累计积分 {self.accrued}, 当前积分 {self.total}"
+        return self.last_message()
+
+    def render_markdown(self):
+        """单个账号的钉钉通知 (标题, 内容)"""
+        return f"M-SEC 签到 - {self.username}", "\n\n".join(self.messages())
+
+    def render_html(self):
+        """单个账号的邮件通知 (主题, HTML 正文)"""
+        return f"M-SEC 签到 - {self.username}", "<br>".join(html.escape(message) for message in self.messages())
+
+    def __repr__(self):
+        return f"AccountResult({self.username!r}, status={self.status!r}, entries={len(self.entries)})"
@@ -0,0 +1,162 @@
+import smtplib
+import ssl
+import threading
+import time
+
+from metrics import metrics
+
+# 服务器拒绝了收件人、发件人或邮件内容（SMTPSenderRefused / SMTPDataError 等都是 SMTPResponseException），
+# 连接本身仍然可用，放回连接池
+_REJECTED_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException)
+# 连接层面的错误：连接已断开或不可用，复用的连接遇到时换一个新连接重发
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError, ssl.SSLError)
+
+
+class SmtpPool:
+    """
+    功能描述: 复用已登录的SMTP连接发送邮件，多封邮件共用一次 TLS 握手和 AUTH 登录；
+              连接空闲超过 check_after 秒后先用 NOOP 检查是否仍可用，空闲超过 idle_timeout 秒或
+              已发送 max_messages 封后关闭重建；复用的连接发送时断开，自动重新连接并重发一次
+    参数:
+        host: SMTP 服务器地址
+        port: 端口
+        use_ssl: True 时使用 SMTP_SSL（如465端口），否则使用明文 SMTP，服务器支持时升级为 STARTTLS
+        username: 登录用户名（发件人邮箱）
+        password: 授权码
+        timeout: 连接和读写超时（秒）
+        max_connections: 最多同时保持的连接数
+        idle_timeout: 空闲超过多少秒的连接直接关闭
+        check_after: 空闲超过多少秒的连接复用前先发 NOOP 检查
+        max_messages: 每个连接最多发送多少封邮件后重建
+    返回值: 无
+    异常描述: send() 登录失败抛出 smtplib.SMTPAuthenticationError，收件人被拒绝等错误原样抛出
+    调用演示:
+        pool = SmtpPool("smtp.163.com", 465, True, "sender@163.com", "授权码")
+        pool.send("sender@163.com", ["ops@example.com"], msg.as_string())
+        pool.close()
+    """
+
+    def __init__(self, host, port=465, use_ssl=True, username="", password="", timeout=10.0, max_connections=2,
+                 idle_timeout=300.0, check_after=10.0, max_messages=100):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.max_messages = max(1, max_messages)
+        self._idle = []  # [连接, 最后一次使用的时间, 已发送的邮件数]
+        self._slots = threading.BoundedSemaphore(max(1, max_connections))
+        self._lock = threading.Lock()
+        self._closed = False  # close() 之后归还的连接直接关闭，不再放回连接池
+
+    @property
+    def key(self):
+        """连接参数，配置修改后据此判断是否需要换一个连接池"""
+        return self.host, self.port, self.use_ssl, self.username, self.password, self.timeout
+
+    def _connect(self):
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if not self.use_ssl:
+                server.ehlo()
+                if server.has_extn("starttls"):
+                    server.starttls()
+                    server.ehlo()
+            server.login(self.username, self.password)
+        except Exception:
+            self._quit(server)
+            raise
+        metrics.inc("qiandao_smtp_connections_total")
+        return [server, time.monotonic(), 0]
+
+    @staticmethod
+    def _quit(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _healthy(self, entry):
+        idle = time.monotonic() - entry[1]
+        if idle > self.idle_timeout or entry[2] >= self.max_messages:
+            return False
+        if idle <= self.check_after:
+            return True
+        try:
+            return entry[0].noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self):
+        """取一个可用的空闲连接，没有时返回None"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                entry = self._idle.pop()
+            if self._healthy(entry):
+                return entry
+            self._quit(entry[0])
+
+    def send(self, sender, receivers, message):
+        """
+        功能描述: 发送一封邮件
+        参数:
+            sender: 发件人
+            receivers: 收件人列表
+            message: 完整的邮件内容（msg.as_string()）
+        返回值: 被拒绝的收件人 {收件人: (错误码, 信息)}，全部成功时为空字典
+        异常描述: 连接或登录失败、全部收件人被拒绝、服务器拒收邮件时抛出 smtplib.SMTPException / OSError
+        调用演示:
+            pool.send("sender@163.com", ["ops@example.com"], msg.as_string())
+        """
+        with self._slots:
+            entry = self._acquire()
+            reused = entry is not None
+            if entry is None:
+                entry = self._connect()
+            try:
+                refused = self._sendmail(entry, sender, receivers, message)
+            except _CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                # 复用的连接可能已被服务器关闭，重新连接后再发一次
+                entry = self._connect()
+                refused = self._sendmail(entry, sender, receivers, message)
+            self._release(entry)
+            return refused
+
+    def _sendmail(self, entry, sender, receivers, message):
+        """用一个连接发送邮件：被拒收时连接放回连接池，其他错误关闭连接后原样抛出"""
+        try:
+            refused = entry[0].sendmail(sender, receivers, message)
+        except _REJECTED_ERRORS:
+            self._release(entry)
+            raise
+        except Exception:
+            self._quit(entry[0])
+            raise
+        entry[2] += 1
+        return refused
+
+    def _release(self, entry):
+        entry[1] = time.monotonic()
+        with self._lock:
+            if not self._closed:
+                self._idle.append(entry)
+                return
+        self._quit(entry[0])
+
+    def close(self):
+        """关闭所有空闲连接，正在使用的连接在归还时关闭"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._quit(entry[0])
@@ -0,0 +1,145 @@
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，不做跨进程加锁
+    fcntl = None
+
+
+class TokenCache:
+    """
+    功能描述: 按用户名保存登录凭证的本地缓存，带过期时间，写文件时先写临时文件再原子替换
+              下次运行先用缓存的凭证签到，失效后才走验证码登录流程
+    参数:
+        path: 缓存文件路径
+        ttl: 凭证有效期（秒）；凭证是带 exp 字段的JWT时以两者中较早的为准
+    返回值: 无
+    异常描述: 缓存文件损坏时按空缓存处理，不抛出异常
+    调用演示:
+        cache = TokenCache("data_/token_cache.json", ttl=20 * 3600)
+        token = cache.get("user123")
+        cache.put("user123", "eyJhbGciOi...")
+        cache.flush()
+    """
+
+    def __init__(self, path="data_/token_cache.json", ttl=20 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._entries = None  # username -> {"token": ..., "expires_at": ...}，首次访问时加载
+        self._changes = {}  # 本进程修改过的条目，username -> 条目或None（已删除）
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        功能描述: 根据 config.ini 的 [TOKEN_CACHE] 段创建缓存，未启用时返回None
+        参数:
+            config: 已读取配置文件的 ConfigParser
+        返回值: TokenCache 实例或 None
+        异常描述: 无
+        调用演示:
+            token_cache = TokenCache.from_config(config)
+        """
+        if not config.getboolean('TOKEN_CACHE', 'enabled', fallback=True):
+            return None
+        return cls(
+            path=config.get('TOKEN_CACHE', 'path', fallback="data_/token_cache.json"),
+            ttl=config.getfloat('TOKEN_CACHE', 'ttl_hours', fallback=20) * 3600,
+        )
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def _jwt_expiry(token):
+        """解析JWT载荷中的 exp 字段，不是JWT时返回None"""
+        try:
+            payload = token.split('.')[1]
+            payload += '=' * (-len(payload) % 4)
+            exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+            return float(exp) if exp else None
+        except (IndexError, ValueError, TypeError, AttributeError):
+            return None
+
+    def get(self, username):
+        """返回未过期的缓存凭证，不存在或已过期时返回None"""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(username)
+            if not entry:
+                return None
+            if entry.get("expires_at", 0) <= time.time():
+                del self._entries[username]
+                self._changes[username] = None
+                return None
+            return entry.get("token")
+
+    def put(self, username, token):
+        expires_at = time.time() + self.ttl
+        jwt_exp = self._jwt_expiry(token)
+        if jwt_exp:
+            expires_at = min(expires_at, jwt_exp)
+        with self._lock:
+            self._load()
+            self._entries[username] = self._changes[username] = {"token": token, "expires_at": expires_at}
+
+    def invalidate(self, username):
+        with self._lock:
+            self._load()
+            if self._entries.pop(username, None) is not None:
+                self._changes[username] = None
+
+    def flush(self):
+        """
+        功能描述: 将修改写回磁盘；多进程分片运行时先加文件锁、重新读取磁盘上的内容，
+                  只合并本进程修改过的条目，再写同目录下的临时文件，fsync 后用 os.replace 原子替换
+        参数: 无
+        返回值: 无
+        异常描述: 写入失败时抛出 OSError，原缓存文件保持不变
+        调用演示:
+            cache.flush()
+        """
+        with self._lock:
+            if not self._changes:
+                return
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            with open(self.path + ".lock", 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._entries = None
+                self._load()
+                for username, entry in self._changes.items():
+                    if entry is None:
+                        self._entries.pop(username, None)
+                    else:
+                        self._entries[username] = entry
+                self._write()
+            self._changes = {}
+
+    def _write(self):
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(prefix=".token_cache.", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise